@@ -7,11 +7,24 @@ Solves: BR2 (Adaptive Practice Delivery), BR3 (Efficiency of Practice)
 Research Source: Paper 6.pdf - Algorithm 1
 """
 
+import hashlib
+import json
 import numpy as np
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Sequence
+from collections.abc import Sequence as SequenceABC
 from dataclasses import dataclass
 from enum import Enum
 
+from ai_engine.prerequisite_graph import PrerequisiteGraph
+
+# Lagrange multipliers on cognitive load tried at once by session packing
+PACKING_MULTIPLIERS = np.r_[0.0, np.geomspace(0.05, 20.0, 15)]
+
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(start, start + length) for each pair"""
+    offsets = np.cumsum(lengths) - lengths
+    return np.arange(int(lengths.sum())) + np.repeat(starts - offsets, lengths)
+
 # ============================================================================
 # COGNITIVE LOAD MANAGEMENT (BR2)
 # ============================================================================
@@ -53,6 +66,246 @@ class ContentItem:
         if self.prerequisites is None:
             self.prerequisites = []
 
+@dataclass
+class ContentBatch:
+    """
+    Struct-of-arrays view of content items for vectorized ZPD scoring
+    
+    concept_ids holds every concept referenced (item concepts and
+    prerequisites); items refer to it by code. Prerequisites are stored
+    CSR-style: item i's prerequisite codes are
+    prerequisite_codes[prerequisite_indptr[i]:prerequisite_indptr[i + 1]].
+    """
+    concept_ids: List[str]
+    concept_codes: np.ndarray         # (N,) int32
+    difficulty: np.ndarray            # (N,) float64
+    weight: np.ndarray                # (N,) float64
+    scaffolding: np.ndarray           # (N,) bool
+    prerequisite_indptr: np.ndarray   # (N + 1,) int64
+    prerequisite_codes: np.ndarray    # (P,) int32
+    
+    @classmethod
+    def from_columns(
+        cls,
+        concepts: Sequence[str],
+        difficulty: Sequence[float],
+        weight: Sequence[float],
+        scaffolding: Sequence[bool],
+        prerequisites: Sequence[Sequence[str]]
+    ) -> 'ContentBatch':
+        codes: Dict[str, int] = {}
+        concept_codes = np.array(
+            [codes.setdefault(c, len(codes)) for c in concepts], dtype=np.int32
+        ).reshape(-1)
+        prerequisite_codes = np.array(
+            [codes.setdefault(p, len(codes)) for prereqs in prerequisites for p in prereqs],
+            dtype=np.int32
+        ).reshape(-1)
+        prerequisite_indptr = np.zeros(len(concept_codes) + 1, dtype=np.int64)
+        np.cumsum([len(prereqs) for prereqs in prerequisites], out=prerequisite_indptr[1:])
+        
+        return cls(
+            concept_ids=list(codes),
+            concept_codes=concept_codes,
+            difficulty=np.asarray(difficulty, dtype=np.float64).reshape(-1),
+            weight=np.asarray(weight, dtype=np.float64).reshape(-1),
+            scaffolding=np.asarray(scaffolding, dtype=bool).reshape(-1),
+            prerequisite_indptr=prerequisite_indptr,
+            prerequisite_codes=prerequisite_codes
+        )
+    
+    @classmethod
+    def from_items(cls, items: Sequence[ContentItem]) -> 'ContentBatch':
+        return cls.from_columns(
+            [item.concept_id for item in items],
+            [item.difficulty for item in items],
+            [item.weight for item in items],
+            [item.scaffolding_available for item in items],
+            [item.prerequisites for item in items]
+        )
+    
+    def __len__(self) -> int:
+        return len(self.concept_codes)
+    
+    def concept_values(self, values: Dict[str, float], default: float) -> np.ndarray:
+        """Per-concept vector of a student's values (mastery, velocity, ...)"""
+        return np.array([values.get(c, default) for c in self.concept_ids], dtype=np.float64)
+
+class ContentIndex:
+    """
+    Content library indexed by concept and sorted by difficulty
+    
+    Item attributes are NumPy arrays ordered by (concept, difficulty), so
+    each concept's items are one contiguous slice and a difficulty band is
+    two binary searches. Built once per library version and shared
+    read-only between requests.
+    
+    With a prerequisite_graph, ZPD scoring through the index also gates
+    items whose concept is locked by the concept DAG.
+    """
+    
+    def __init__(
+        self,
+        items: Iterable[ContentItem],
+        prerequisite_graph: Optional[PrerequisiteGraph] = None
+    ):
+        self.prerequisite_graph = prerequisite_graph
+        items = list(items)
+        concept_ids = sorted({item.concept_id for item in items})
+        codes = {concept_id: code for code, concept_id in enumerate(concept_ids)}
+        
+        concept_codes = np.array([codes[item.concept_id] for item in items], dtype=np.int32)
+        difficulty = np.array([item.difficulty for item in items], dtype=np.float64)
+        order = np.lexsort((difficulty, concept_codes))
+        
+        self.item_ids = [items[i].item_id for i in order]
+        self.concept_codes = concept_codes[order]
+        self.difficulty = difficulty[order]
+        self.weight = np.array([items[i].weight for i in order], dtype=np.float64)
+        self.estimated_time = np.array([items[i].estimated_time for i in order], dtype=np.int32)
+        self.scaffolding = np.array([items[i].scaffolding_available for i in order], dtype=bool)
+        self.prerequisites = [tuple(items[i].prerequisites) for i in order]
+        
+        self._concept_ids = concept_ids
+        self._offsets = np.searchsorted(self.concept_codes, np.arange(len(concept_ids) + 1))
+        self._codes = codes
+        self._batch: Optional[ContentBatch] = None
+        self._graph_codes: Optional[np.ndarray] = None
+        self._content_version: Optional[str] = None
+        
+        # (concept, difficulty rank) keys, sorted like the items, so one
+        # searchsorted finds a difficulty bound in every concept at once
+        self._difficulty_values = np.unique(self.difficulty)
+        self._keys = (
+            self.concept_codes.astype(np.int64) * len(self._difficulty_values)
+            + np.searchsorted(self._difficulty_values, self.difficulty)
+        )
+    
+    def __len__(self) -> int:
+        return len(self.item_ids)
+    
+    def concept_ids(self) -> List[str]:
+        return list(self._concept_ids)
+    
+    def concept_slice(self, concept_id: str) -> slice:
+        """Positions of a concept's items (empty if it has none)"""
+        code = self._codes.get(concept_id)
+        if code is None:
+            return slice(0, 0)
+        return slice(int(self._offsets[code]), int(self._offsets[code + 1]))
+    
+    def band(self, concept_id: str, low: float, high: float) -> np.ndarray:
+        """Positions of a concept's items with low <= difficulty <= high"""
+        span = self.concept_slice(concept_id)
+        difficulty = self.difficulty[span]
+        start = span.start + np.searchsorted(difficulty, low, side='left')
+        stop = span.start + np.searchsorted(difficulty, high, side='right')
+        return np.arange(start, stop)
+    
+    def as_batch(self) -> ContentBatch:
+        """
+        The whole library as a ContentBatch, in index order (built once)
+        
+        Concept codes are shared with the index: the first
+        len(concept_ids()) batch concepts are the index concepts, followed
+        by concepts that only appear as prerequisites.
+        """
+        if self._batch is None:
+            codes = dict(self._codes)
+            prerequisite_codes = np.array(
+                [codes.setdefault(p, len(codes)) for prereqs in self.prerequisites for p in prereqs],
+                dtype=np.int32
+            ).reshape(-1)
+            prerequisite_indptr = np.zeros(len(self) + 1, dtype=np.int64)
+            np.cumsum([len(prereqs) for prereqs in self.prerequisites], out=prerequisite_indptr[1:])
+            
+            self._batch = ContentBatch(
+                concept_ids=list(codes),
+                concept_codes=self.concept_codes,
+                difficulty=self.difficulty,
+                weight=self.weight,
+                scaffolding=self.scaffolding,
+                prerequisite_indptr=prerequisite_indptr,
+                prerequisite_codes=prerequisite_codes
+            )
+        return self._batch
+    
+    def graph_codes(self) -> np.ndarray:
+        """prerequisite_graph index of each as_batch() concept (-1 if absent)"""
+        if self._graph_codes is None:
+            self._graph_codes = self.prerequisite_graph.concepts.lookup_many(
+                self.as_batch().concept_ids
+            )
+        return self._graph_codes
+    
+    def content_version(self) -> str:
+        """
+        Content hash of the items and the prerequisite graph (computed once)
+        
+        Equal libraries hash equally across rebuilds and processes, so the
+        value can key cached session plans.
+        """
+        if self._content_version is None:
+            digest = hashlib.sha256()
+            digest.update('\x1f'.join(self.item_ids).encode())
+            digest.update('\x1f'.join(self._concept_ids).encode())
+            for column in (self.concept_codes, self.difficulty, self.weight,
+                           self.estimated_time, self.scaffolding):
+                digest.update(np.ascontiguousarray(column).tobytes())
+            digest.update(repr(self.prerequisites).encode())
+            graph = self.prerequisite_graph
+            if graph is not None:
+                digest.update('\x1f'.join(graph.concepts.concept_id(i) for i in range(len(graph))).encode())
+                for column in (graph.indptr, graph.indices, graph.weights):
+                    digest.update(column.tobytes())
+            self._content_version = digest.hexdigest()
+        return self._content_version
+    
+    def concept_bounds(self, thresholds: np.ndarray, side: str = 'left') -> np.ndarray:
+        """
+        Per concept, the position of its first item with difficulty >=
+        threshold (side='left') or > threshold (side='right')
+        
+        thresholds is aligned with concept_ids(); like np.searchsorted
+        applied to every concept slice.
+        """
+        ranks = np.searchsorted(self._difficulty_values, thresholds, side=side)
+        codes = np.arange(len(self._concept_ids), dtype=np.int64)
+        return np.searchsorted(self._keys, codes * len(self._difficulty_values) + ranks)
+    
+    def item(self, position: int) -> ContentItem:
+        return ContentItem(
+            item_id=self.item_ids[position],
+            concept_id=self._concept_ids[int(self.concept_codes[position])],
+            difficulty=float(self.difficulty[position]),
+            weight=float(self.weight[position]),
+            estimated_time=int(self.estimated_time[position]),
+            scaffolding_available=bool(self.scaffolding[position]),
+            prerequisites=list(self.prerequisites[position])
+        )
+
+class IndexedItems(SequenceABC):
+    """
+    ContentItems at given positions of a ContentIndex, created on first access
+    
+    Lets the selection walks read a long ranked candidate list while only
+    materializing the items they actually visit.
+    """
+    
+    def __init__(self, content_index: ContentIndex, positions: np.ndarray):
+        self.content_index = content_index
+        self.positions = positions
+        self._items: Dict[int, ContentItem] = {}
+    
+    def __len__(self) -> int:
+        return len(self.positions)
+    
+    def __getitem__(self, i: int) -> ContentItem:
+        item = self._items.get(i)
+        if item is None:
+            item = self._items[i] = self.content_index.item(int(self.positions[i]))
+        return item
+
 class AdaptivePracticeEngine:
     """
     Adaptive Learning with Feedback Loops
@@ -64,8 +317,17 @@ class AdaptivePracticeEngine:
     4. Adjust content difficulty dynamically
     """
     
-    def __init__(self, config: CognitiveLoadConfig = CognitiveLoadConfig()):
+    def __init__(
+        self,
+        config: CognitiveLoadConfig = CognitiveLoadConfig(),
+        packing_pool_size: int = 64,
+        rng: Optional[np.random.Generator] = None
+    ):
         self.config = config
+        self.packing_pool_size = packing_pool_size  # Candidates packed exactly
+        # Session IDs are drawn from here; inject a seeded generator for
+        # reproducible runs. The global NumPy RNG is never touched.
+        self.rng = rng if rng is not None else np.random.default_rng()
         self.beta1 = 0.9  # Exponential decay for knowledge state
         self.gamma = 0.1  # Scaling factor for difficulty adjustment
         self.alpha = 0.01  # Learning rate
@@ -85,31 +347,54 @@ class AdaptivePracticeEngine:
         total_load = 0.0
         
         for item in content_items:
-            # Get student proficiency for this concept (0-1 scale)
-            ki = student_mastery.get(item.concept_id, 0.3) / 100.0
-            
-            # L(t) contribution from this item
-            load_contribution = item.weight * item.difficulty * (1 - ki)
-            total_load += load_contribution
+            total_load += self._item_load(item, student_mastery)
         
         # Normalize by number of items
         return total_load / len(content_items) if content_items else 0.0
     
+    def _item_load(self, item: ContentItem, student_mastery: Dict[str, float]) -> float:
+        """One item's contribution λi · Di · (1 - ki(t)) to L(t)"""
+        # Get student proficiency for this concept (0-1 scale)
+        ki = student_mastery.get(item.concept_id, 0.3) / 100.0
+        
+        return item.weight * item.difficulty * (1 - ki)
+    
     def select_next_content(
         self,
         available_content: List[ContentItem],
         student_mastery: Dict[str, float],
         learning_velocity: Dict[str, float],
-        session_time_remaining: int = 30
+        session_time_remaining: int = 30,
+        content_index: Optional[ContentIndex] = None,
+        packing: str = 'greedy',
+        due_reviews: Optional[Dict[str, float]] = None
     ) -> List[ContentItem]:
         """
         BR2: Select content that keeps student in Zone of Proximal Development
         BR3: Skip mastered content, focus on gaps
         
         Algorithm from Paper 6.pdf - Steps 5-7
+        
+        With a content_index, candidates are taken from each concept's ZPD
+        band (zpd_candidates) instead of scanning available_content.
+        packing='optimal' packs the ranked candidates into the time budget
+        (_pack_within_budget) instead of walking them greedily.
+        due_reviews ({concept_id: review mastery}, see
+        ai_engine/spaced_repetition.py) brings mastered concepts that are
+        due for review back as light review.
         """
-        selected_items = []
-        current_time = 0
+        if packing not in ('greedy', 'optimal'):
+            raise ValueError(f"Unknown packing mode: {packing}")
+        
+        student_mastery = self._with_reviews(student_mastery, due_reviews)
+        
+        if content_index is not None:
+            ranked, scores = self._rank_index_candidates(
+                content_index, student_mastery, learning_velocity
+            )
+            return self._select_ranked(
+                ranked, scores, student_mastery, session_time_remaining, packing
+            )
         
         # Filter based on BR3 efficiency rules
         filtered_content = self._filter_by_mastery(
@@ -117,6 +402,20 @@ class AdaptivePracticeEngine:
             student_mastery
         )
         
+        if packing == 'optimal':
+            scores = self.score_zpd_batch(
+                ContentBatch.from_items(filtered_content),
+                student_mastery,
+                learning_velocity
+            )
+            order = np.argsort(-scores, kind='stable')
+            return self._pack_within_budget(
+                [filtered_content[i] for i in order],
+                scores[order],
+                student_mastery,
+                session_time_remaining
+            )
+        
         # Sort by priority (ZPD targeting)
         prioritized = self._prioritize_by_zpd(
             filtered_content,
@@ -124,45 +423,379 @@ class AdaptivePracticeEngine:
             learning_velocity
         )
         
+        return self._select_within_budget(
+            prioritized,
+            student_mastery,
+            session_time_remaining
+        )
+    
+    def _with_reviews(
+        self,
+        student_mastery: Dict[str, float],
+        due_reviews: Optional[Dict[str, float]]
+    ) -> Dict[str, float]:
+        """Mastery with due concepts lowered to their review mastery"""
+        if not due_reviews:
+            return student_mastery
+        merged = dict(student_mastery)
+        for concept_id, review_mastery in due_reviews.items():
+            merged[concept_id] = min(merged.get(concept_id, review_mastery), review_mastery)
+        return merged
+    
+    def _rank_index_candidates(
+        self,
+        content_index: ContentIndex,
+        student_mastery: Dict[str, float],
+        learning_velocity: Dict[str, float]
+    ) -> tuple:
+        """
+        zpd_candidates in ZPD order without building every ContentItem
+        
+        Returns: (IndexedItems, their scores), highest score first
+        """
+        batch = content_index.as_batch()
+        mastery = batch.concept_values(student_mastery, 30.0)
+        positions = self._zpd_candidate_positions(
+            content_index, mastery[:len(content_index.concept_ids())]
+        )
+        scores = self.score_zpd_pairs(
+            batch,
+            np.zeros(len(positions), dtype=np.int64),
+            positions,
+            mastery[None, :],
+            batch.concept_values(student_mastery, 0.0)[None, :],
+            batch.concept_values(learning_velocity, 0.0)[None, :],
+            self._locked_concepts(content_index, [student_mastery])
+        )
+        order = np.argsort(-scores, kind='stable')
+        return IndexedItems(content_index, positions[order]), scores[order]
+    
+    def _locked_concepts(
+        self,
+        content_index: ContentIndex,
+        student_mastery: Sequence[Dict[str, float]]
+    ) -> Optional[np.ndarray]:
+        """
+        Per student, the index's concepts locked by its prerequisite graph
+        
+        Returns: (S, C) bool aligned with content_index.as_batch().concept_ids,
+        or None when the index has no graph
+        """
+        graph = content_index.prerequisite_graph
+        if graph is None or len(graph) == 0:
+            return None
+        
+        mastery = np.array(
+            [graph.mastery_vector(values) for values in student_mastery], dtype=np.float64
+        ).reshape(len(student_mastery), len(graph))
+        codes = content_index.graph_codes()
+        return graph.locked(mastery)[:, np.maximum(codes, 0)] & (codes >= 0)
+    
+    def _select_ranked(
+        self,
+        ranked: Sequence[ContentItem],
+        scores: np.ndarray,
+        student_mastery: Dict[str, float],
+        session_time_remaining: int,
+        packing: str
+    ) -> List[ContentItem]:
+        """Session content from ranked candidates, by the packing mode"""
+        if packing == 'optimal':
+            return self._pack_within_budget(
+                ranked, scores, student_mastery, session_time_remaining
+            )
+        return self._select_within_budget(ranked, student_mastery, session_time_remaining)
+    
+    def _select_within_budget(
+        self,
+        prioritized: Iterable[ContentItem],
+        student_mastery: Dict[str, float],
+        session_time_remaining: int
+    ) -> List[ContentItem]:
+        """
+        Walk ranked candidates, keeping items while time and load allow
+        
+        The load of the selection is kept as a running sum, so each
+        candidate is checked in O(1): L = (total + item) / (count + 1)
+        """
+        selected_items = []
+        current_time = 0
+        total_load = 0.0
+        
         # Select items while maintaining optimal cognitive load
+        
         for item in prioritized:
             if current_time + item.estimated_time > session_time_remaining:
                 break
             
             # Calculate projected cognitive load
-            projected_items = selected_items + [item]
-            projected_load = self.calculate_cognitive_load(
-                projected_items,
-                student_mastery
-            )
+            item_load = self._item_load(item, student_mastery)
+            projected_load = (total_load + item_load) / (len(selected_items) + 1)
             
             # Check if load is within optimal range
             if projected_load <= self.config.max_load:
                 selected_items.append(item)
+                total_load += item_load
                 current_time += item.estimated_time
             else:
                 # Try with scaffolding to reduce difficulty
                 if item.scaffolding_available:
-                    scaffolded = ContentItem(
-                        item_id=item.item_id + "_scaffolded",
-                        concept_id=item.concept_id,
-                        difficulty=item.difficulty * 0.7,  # Reduce difficulty
-                        weight=item.weight,
-                        estimated_time=item.estimated_time + 2,  # Scaffolding takes time
-                        scaffolding_available=False
-                    )
-                    projected_items = selected_items + [scaffolded]
-                    projected_load = self.calculate_cognitive_load(
-                        projected_items,
-                        student_mastery
-                    )
+                    scaffolded = self._scaffolded(item)
+                    item_load = self._item_load(scaffolded, student_mastery)
+                    projected_load = (total_load + item_load) / (len(selected_items) + 1)
                     
                     if projected_load <= self.config.max_load:
                         selected_items.append(scaffolded)
+                        total_load += item_load
                         current_time += scaffolded.estimated_time
         
         return selected_items
     
+    def _pack_within_budget(
+        self,
+        ranked: Sequence[ContentItem],
+        scores: np.ndarray,
+        student_mastery: Dict[str, float],
+        session_time_remaining: int
+    ) -> List[ContentItem]:
+        """
+        BR3: Best-value packing of ranked candidates into the time budget
+        
+        0/1 knapsack over estimated_time: maximizes the total ZPD score
+        (scores[i] for ranked[i], scaffolded or not) while keeping the
+        session's average cognitive load within max_load. The load
+        constraint enters the value through a Lagrange multiplier; one DP
+        over time runs for every multiplier in PACKING_MULTIPLIERS at once
+        and the best feasible packing wins.
+        
+        Only the top packing_pool_size candidates are packed exactly; the
+        rest of the ranking then fills leftover time greedily. A greedy fill
+        of the whole ranking is also tried, so the result is never worth
+        less than the greedy walk's.
+        
+        Returns: selected items in ranking order
+        """
+        budget = int(session_time_remaining)
+        max_load = self.config.max_load
+        if isinstance(ranked, IndexedItems):
+            durations = ranked.content_index.estimated_time[ranked.positions]
+        else:
+            durations = np.array([item.estimated_time for item in ranked], dtype=np.int64)
+        fits = np.flatnonzero(durations <= budget).tolist()
+        pool = fits[:self.packing_pool_size]
+        
+        # Per candidate: the item as is, then its scaffolded variant
+        options = []
+        for i in pool:
+            variants = [ranked[i]]
+            if ranked[i].scaffolding_available:
+                variants.append(self._scaffolded(ranked[i]))
+            options.append([
+                (variant, variant.estimated_time, self._item_load(variant, student_mastery))
+                for variant in variants
+            ])
+        
+        # dp[m, t]: best penalized value within t minutes under multiplier m;
+        # choice records the variant taken (0 = none) for backtracking
+        multipliers = PACKING_MULTIPLIERS[:, None]
+        dp = np.zeros((len(PACKING_MULTIPLIERS), budget + 1))
+        choice = np.zeros((len(pool), len(PACKING_MULTIPLIERS), budget + 1), dtype=np.int8)
+        
+        for g, i in enumerate(pool):
+            best = dp.copy()
+            for o, (_, duration, load) in enumerate(options[g], start=1):
+                if duration > budget:
+                    continue
+                candidate = dp[:, :budget + 1 - duration] + (scores[i] - multipliers * (load - max_load))
+                better = candidate > best[:, duration:]
+                np.copyto(best[:, duration:], candidate, where=better)
+                np.copyto(choice[g, :, duration:], o, where=better)
+            dp = best
+        
+        # The empty packing is always feasible (every candidate may be over max_load)
+        packings = [{}]
+        for m in range(len(PACKING_MULTIPLIERS)):
+            packing, remaining = {}, budget
+            for g in range(len(pool) - 1, -1, -1):
+                o = choice[g, m, remaining]
+                if o:
+                    packing[pool[g]] = options[g][o - 1]
+                    remaining -= options[g][o - 1][1]
+            
+            loads = [load for _, _, load in packing.values()]
+            if not loads or sum(loads) / len(loads) <= max_load:
+                packings.append(packing)
+        
+        def worth(packing):
+            return (
+                sum(scores[i] for i in packing),
+                sum(duration for _, duration, _ in packing.values())
+            )
+        
+        best_packing = max(packings, key=worth)
+        shortest = int(durations[fits].min()) if fits else budget + 1
+        candidates = [
+            self._fill_budget(ranked, fits, shortest, best_packing, student_mastery, budget),
+            self._fill_budget(ranked, fits, shortest, {}, student_mastery, budget)
+        ]
+        selection = max(candidates, key=worth)
+        return [selection[i][0] for i in sorted(selection)]
+    
+    def _fill_budget(
+        self,
+        ranked: Sequence[ContentItem],
+        positions: List[int],
+        shortest: int,
+        packing: Dict[int, tuple],
+        student_mastery: Dict[str, float],
+        budget: int
+    ) -> Dict[int, tuple]:
+        """
+        Add candidates in ranking order to a packing while time and load
+        allow, skipping (not stopping at) items that do not fit; stops once
+        not even the shortest candidate fits
+        """
+        packing = dict(packing)
+        used = sum(duration for _, duration, _ in packing.values())
+        total_load = sum(load for _, _, load in packing.values())
+        
+        for i in positions:
+            if budget - used < shortest:
+                break
+            if i in packing:
+                continue
+            
+            item = ranked[i]
+            variants = [item, self._scaffolded(item)] if item.scaffolding_available else [item]
+            for variant in variants:
+                if used + variant.estimated_time > budget:
+                    continue
+                load = self._item_load(variant, student_mastery)
+                if (total_load + load) / (len(packing) + 1) <= self.config.max_load:
+                    packing[i] = (variant, variant.estimated_time, load)
+                    used += variant.estimated_time
+                    total_load += load
+                    break
+        
+        return packing
+    
+    def select_next_item(
+        self,
+        available_content: List[ContentItem],
+        student_mastery: Dict[str, float],
+        learning_velocity: Dict[str, float],
+        content_index: Optional[ContentIndex] = None
+    ) -> Optional[ContentItem]:
+        """
+        BR2: Single next item for a student (the first item of a session)
+        
+        Same filtering, ZPD ranking and load check as select_next_content,
+        stopping at the first item that fits.
+        """
+        if content_index is not None:
+            prioritized, _ = self._rank_index_candidates(
+                content_index, student_mastery, learning_velocity
+            )
+        else:
+            prioritized = self._prioritize_by_zpd(
+                self._filter_by_mastery(available_content, student_mastery),
+                student_mastery,
+                learning_velocity
+            )
+        
+        for item in prioritized:
+            if self._item_load(item, student_mastery) <= self.config.max_load:
+                return item
+            if item.scaffolding_available:
+                scaffolded = self._scaffolded(item)
+                if self._item_load(scaffolded, student_mastery) <= self.config.max_load:
+                    return scaffolded
+        
+        return None
+    
+    def zpd_candidates(
+        self,
+        content_index: ContentIndex,
+        student_mastery: Dict[str, float]
+    ) -> List[ContentItem]:
+        """
+        BR2, BR3: Per-concept candidates from the ZPD band of a content index
+        
+        For each concept that is not mastered, takes the items with
+        difficulty in [mastery, mastery + 0.5] (the bands _prioritize_by_zpd
+        scores above "too easy / too difficult"), at most as many as
+        _filter_by_mastery would keep, preferring items nearest the sweet
+        spot (mastery + 0.2). A concept with nothing in its band contributes
+        its items nearest the sweet spot instead.
+        """
+        concept_mastery = np.array(
+            [student_mastery.get(c, 30.0) for c in content_index.concept_ids()],
+            dtype=np.float64
+        )
+        positions = self._zpd_candidate_positions(content_index, concept_mastery)
+        return [content_index.item(int(p)) for p in positions]
+    
+    def _zpd_candidate_positions(
+        self,
+        content_index: ContentIndex,
+        concept_mastery: np.ndarray
+    ) -> np.ndarray:
+        """
+        zpd_candidates as index positions, for all concepts at once
+        
+        concept_mastery is aligned with content_index.concept_ids().
+        Returns positions in index order.
+        """
+        if len(content_index) == 0:
+            return np.zeros(0, dtype=np.int64)
+        
+        level = concept_mastery / 100.0
+        limit = np.where(concept_mastery >= 60.0, 2, 10)
+        first, end = content_index._offsets[:-1], content_index._offsets[1:]
+        
+        # ZPD band, or the whole concept when the band is empty
+        low = content_index.concept_bounds(level, 'left')
+        high = content_index.concept_bounds(level + 0.5, 'right')
+        has_band = high > low
+        start = np.where(has_band, low, first)
+        stop = np.where(concept_mastery < 85.0, np.where(has_band, high, end), start)
+        
+        # The `limit` items nearest the sweet spot lie within `limit`
+        # positions either side of it (difficulty is sorted per concept)
+        target = np.clip(content_index.concept_bounds(level + 0.2, 'left'), start, stop)
+        left = np.maximum(start, target - limit)
+        right = np.minimum(stop, target + limit)
+        
+        # Equal difficulties tie on distance and the lowest position wins, so
+        # a window starting inside a run of equal difficulties is widened to
+        # the start of the run
+        has_left = left < target
+        run_start = content_index.concept_bounds(
+            content_index.difficulty[np.where(has_left, left, 0)], 'left'
+        )
+        left = np.where(has_left, np.maximum(start, run_start), left)
+        
+        positions = _ranges(left, right - left)
+        codes = content_index.concept_codes[positions]
+        distance = np.abs(content_index.difficulty[positions] - (level[codes] + 0.2))
+        order = np.lexsort((positions, distance, codes))
+        
+        sorted_codes = codes[order]
+        rank = np.arange(len(order)) - np.searchsorted(sorted_codes, sorted_codes, side='left')
+        keep = rank < limit[sorted_codes]
+        return np.sort(positions[order][keep])
+    
+    def _scaffolded(self, item: ContentItem) -> ContentItem:
+        """Easier scaffolded variant of an item"""
+        return ContentItem(
+            item_id=item.item_id + "_scaffolded",
+            concept_id=item.concept_id,
+            difficulty=item.difficulty * 0.7,  # Reduce difficulty
+            weight=item.weight,
+            estimated_time=item.estimated_time + 2,  # Scaffolding takes time
+            scaffolding_available=False
+        )
+    
     def _filter_by_mastery(
         self,
         content: List[ContentItem],
@@ -214,47 +847,124 @@ class AdaptivePracticeEngine:
         2. Not too far above (frustration)
         3. Aligned with learning trajectory
         """
-        scored_content = []
+        order = self.rank_zpd_batch(
+            ContentBatch.from_items(content),
+            student_mastery,
+            learning_velocity
+        )
+        return [content[i] for i in order]
+    
+    def score_zpd_batch(
+        self,
+        batch: ContentBatch,
+        student_mastery: Dict[str, float],
+        learning_velocity: Dict[str, float]
+    ) -> np.ndarray:
+        """
+        BR2: ZPD score for every item in a batch
         
-        for item in content:
-            mastery = student_mastery.get(item.concept_id, 30.0) / 100.0
-            velocity = learning_velocity.get(item.concept_id, 0.0)
-            
-            # Calculate ZPD score
-            # Ideal: difficulty slightly above mastery
-            zpd_distance = item.difficulty - mastery
-            
-            if 0.1 <= zpd_distance <= 0.3:
-                # Sweet spot: challenging but achievable
-                zpd_score = 1.0
-            elif 0.0 <= zpd_distance < 0.1:
-                # Too easy: still beneficial but lower priority
-                zpd_score = 0.6
-            elif 0.3 < zpd_distance <= 0.5:
-                # Challenging: needs scaffolding
-                zpd_score = 0.7 if item.scaffolding_available else 0.3
-            else:
-                # Too difficult or too easy
-                zpd_score = 0.2
-            
-            # Boost score for concepts with positive learning velocity
-            if velocity > 0:
-                zpd_score *= 1.2
-            
-            # Prioritize prerequisite completion
-            prereq_mastery = [
-                student_mastery.get(prereq, 0.0) 
-                for prereq in item.prerequisites
+        Returns: scores, shape (N,)
+        """
+        return self.score_zpd_pairs(
+            batch,
+            np.zeros(len(batch), dtype=np.int64),
+            np.arange(len(batch)),
+            batch.concept_values(student_mastery, 30.0)[None, :],
+            batch.concept_values(student_mastery, 0.0)[None, :],
+            batch.concept_values(learning_velocity, 0.0)[None, :]
+        )
+    
+    def score_zpd_pairs(
+        self,
+        batch: ContentBatch,
+        rows: np.ndarray,
+        positions: np.ndarray,
+        mastery: np.ndarray,
+        prerequisite_mastery: np.ndarray,
+        velocity: np.ndarray,
+        locked: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        BR2: ZPD scores of (student, item) pairs for many students at once
+        
+        Pair j scores item positions[j] of the batch for student rows[j].
+        The student matrices are (S, C), aligned with batch.concept_ids:
+        mastery with unknown concepts at 30, prerequisite_mastery with
+        unknown at 0 (the prerequisite gate), velocity with unknown at 0,
+        and optionally locked, concepts locked by the prerequisite DAG,
+        which are gated like items with a weak prerequisite.
+        
+        Returns: scores, shape (len(positions),)
+        """
+        codes = batch.concept_codes[positions]
+        
+        # Calculate ZPD score
+        # Ideal: difficulty slightly above mastery
+        zpd_distance = batch.difficulty[positions] - mastery[rows, codes] / 100.0
+        
+        zpd_score = np.select(
+            [
+                (zpd_distance >= 0.1) & (zpd_distance <= 0.3),   # Sweet spot
+                (zpd_distance >= 0.0) & (zpd_distance < 0.1),    # Too easy
+                (zpd_distance > 0.3) & (zpd_distance <= 0.5)     # Challenging
+            ],
+            [
+                1.0,
+                0.6,
+                np.where(batch.scaffolding[positions], 0.7, 0.3) # Needs scaffolding
+            ],
+            default=0.2                                          # Too difficult or too easy
+        )
+        
+        # Boost score for concepts with positive learning velocity
+        zpd_score = zpd_score * np.where(velocity[rows, codes] > 0, 1.2, 1.0)
+        
+        # Deprioritize if any prerequisite is below 60 (unknown = 0)
+        gated = np.zeros(len(positions), dtype=bool) if locked is None else locked[rows, codes]
+        counts = np.diff(batch.prerequisite_indptr)[positions]
+        has_prerequisites = counts > 0
+        if has_prerequisites.any():
+            prerequisites = batch.prerequisite_codes[
+                _ranges(batch.prerequisite_indptr[positions], counts)
             ]
-            if prereq_mastery and min(prereq_mastery) < 60.0:
-                zpd_score *= 0.5  # Deprioritize if prerequisites not met
-            
-            scored_content.append((zpd_score, item))
+            values = prerequisite_mastery[np.repeat(rows, counts), prerequisites]
+            weakest = np.full(len(positions), np.inf)
+            weakest[has_prerequisites] = np.minimum.reduceat(
+                values, (np.cumsum(counts) - counts)[has_prerequisites]
+            )
+            gated |= weakest < 60.0
+        
+        if gated.any():
+            zpd_score = zpd_score * np.where(gated, 0.5, 1.0)
+        
+        return zpd_score
+    
+    def rank_zpd_batch(
+        self,
+        batch: ContentBatch,
+        student_mastery: Dict[str, float],
+        learning_velocity: Dict[str, float],
+        top_k: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        BR2: Item positions by ZPD score, highest first
+        
+        Equal scores keep their input order. With top_k, only the best
+        top_k are returned (argpartition, ties at the cut resolved by input
+        order), identical to the first top_k of the full ranking.
+        """
+        scores = self.score_zpd_batch(batch, student_mastery, learning_velocity)
         
-        # Sort by ZPD score (highest first)
-        scored_content.sort(key=lambda x: x[0], reverse=True)
+        if top_k is None or top_k >= len(scores):
+            return np.argsort(-scores, kind='stable')
+        if top_k <= 0:
+            return np.zeros(0, dtype=np.int64)
         
-        return [item for score, item in scored_content]
+        cutoff = scores[np.argpartition(-scores, top_k - 1)[top_k - 1]]
+        above = np.flatnonzero(scores > cutoff)
+        tied = np.flatnonzero(scores == cutoff)[:top_k - len(above)]
+        top = np.concatenate([above, tied])
+        return top[np.argsort(-scores[top], kind='stable')]
     
     def adjust_difficulty(
         self,
@@ -291,23 +1001,182 @@ class AdaptivePracticeEngine:
         student_mastery: Dict[str, float],
         learning_velocity: Dict[str, float],
         available_content: List[ContentItem],
-        session_duration: int = 30
+        session_duration: int = 30,
+        content_index: Optional[ContentIndex] = None,
+        packing: str = 'greedy',
+        session_key: Optional[str] = None,
+        due_reviews: Optional[Dict[str, float]] = None
     ) -> Dict:
         """
         Generate a complete adaptive practice session
         
+        session_key (see session_key()) becomes the session_id, so identical
+        requests produce identical plans; without it a new ID is drawn
+        from self.rng.
+        
         Returns BR2-compliant session plan
         """
         selected_content = self.select_next_content(
             available_content,
             student_mastery,
             learning_velocity,
-            session_duration
+            session_duration,
+            content_index,
+            packing,
+            due_reviews
         )
         
+        return self._session_plan(
+            session_key or self._session_id(student_id),
+            student_id,
+            selected_content,
+            student_mastery,
+            self._with_reviews(student_mastery, due_reviews)
+        )
+    
+    def session_key(
+        self,
+        student_id: str,
+        student_mastery: Dict[str, float],
+        learning_velocity: Dict[str, float],
+        content_version: str,
+        session_duration: int,
+        packing: str = 'greedy',
+        due_reviews: Optional[Dict[str, float]] = None
+    ) -> str:
+        """
+        Content hash of everything a session plan depends on
+        
+        Selection is deterministic, so requests with the same key get the
+        same plan: (student, mastery and velocity snapshot, due reviews,
+        content version, duration, packing).
+        """
+        snapshot = json.dumps(
+            [
+                student_id,
+                sorted((c, float(m)) for c, m in student_mastery.items()),
+                sorted((c, float(v)) for c, v in learning_velocity.items()),
+                sorted((c, float(r)) for c, r in (due_reviews or {}).items()),
+                content_version,
+                int(session_duration),
+                packing
+            ],
+            separators=(',', ':')
+        )
+        return hashlib.sha256(snapshot.encode()).hexdigest()[:32]
+    
+    def _session_id(self, student_id: str) -> str:
+        return f"{student_id}_{int(self.rng.integers(1 << 48)):012x}"
+    
+    def generate_class_sessions(
+        self,
+        student_ids: Sequence[str],
+        student_mastery: Sequence[Dict[str, float]],
+        learning_velocity: Sequence[Dict[str, float]],
+        content_index: ContentIndex,
+        session_duration: int = 30,
+        packing: str = 'greedy',
+        due_reviews: Optional[Sequence[Dict[str, float]]] = None
+    ) -> List[Dict]:
+        """
+        BR2: Practice sessions for a whole class from one shared library
+        
+        student_mastery[i] / learning_velocity[i] belong to student_ids[i].
+        Mastery is laid out as a students x concepts matrix, each student's
+        ZPD candidates are drawn from the shared index and all (student,
+        candidate) pairs are scored in one vectorized pass; ranking and the
+        load-budgeted selection then run per student. Each
+        plan equals generate_practice_session with the same content_index,
+        packing and due_reviews[i].
+        
+        Returns: session plans, in student_ids order
+        """
+        if packing not in ('greedy', 'optimal'):
+            raise ValueError(f"Unknown packing mode: {packing}")
+        
+        selection_mastery = list(student_mastery)
+        if due_reviews is not None:
+            selection_mastery = [
+                self._with_reviews(values, reviews)
+                for values, reviews in zip(student_mastery, due_reviews)
+            ]
+        
+        batch = content_index.as_batch()
+        mastery = self._concept_matrix(batch.concept_ids, selection_mastery, 30.0)
+        prerequisite_mastery = self._concept_matrix(batch.concept_ids, selection_mastery, 0.0)
+        velocity = self._concept_matrix(batch.concept_ids, learning_velocity, 0.0)
+        index_concepts = len(content_index.concept_ids())
+        
+        candidates = [
+            self._zpd_candidate_positions(content_index, mastery[row, :index_concepts])
+            for row in range(len(student_ids))
+        ]
+        
+        # One scoring pass over every (student, candidate) pair of the class
+        counts = np.array([len(positions) for positions in candidates], dtype=np.int64)
+        scores = np.split(
+            self.score_zpd_pairs(
+                batch,
+                np.repeat(np.arange(len(student_ids)), counts),
+                np.concatenate(candidates) if candidates else np.zeros(0, dtype=np.int64),
+                mastery,
+                prerequisite_mastery,
+                velocity,
+                self._locked_concepts(content_index, selection_mastery)
+            ),
+            np.cumsum(counts)[:-1]
+        )
+        
+        plans = []
+        for row, student_id in enumerate(student_ids):
+            order = np.argsort(-scores[row], kind='stable')
+            selected_content = self._select_ranked(
+                IndexedItems(content_index, candidates[row][order]),
+                scores[row][order],
+                selection_mastery[row],
+                session_duration,
+                packing
+            )
+            plans.append(self._session_plan(
+                self._session_id(student_id), student_id, selected_content,
+                student_mastery[row], selection_mastery[row]
+            ))
+        return plans
+    
+    def _concept_matrix(
+        self,
+        concept_ids: List[str],
+        values: Sequence[Dict[str, float]],
+        default: float
+    ) -> np.ndarray:
+        """(students, concepts) matrix of per-student values"""
+        columns = {concept_id: j for j, concept_id in enumerate(concept_ids)}
+        matrix = np.full((len(values), len(concept_ids)), default, dtype=np.float64)
+        for i, student_values in enumerate(values):
+            for concept_id, value in student_values.items():
+                j = columns.get(concept_id)
+                if j is not None:
+                    matrix[i, j] = value
+        return matrix
+    
+    def _session_plan(
+        self,
+        session_id: str,
+        student_id: str,
+        selected_content: List[ContentItem],
+        student_mastery: Dict[str, float],
+        selection_mastery: Optional[Dict[str, float]] = None
+    ) -> Dict:
+        """
+        BR2-compliant session plan for selected content
+        
+        selection_mastery: mastery the content was selected at (due reviews
+        lowered), used for the cognitive load; concepts_covered reports the
+        student's actual mastery
+        """
         cognitive_load = self.calculate_cognitive_load(
             selected_content,
-            student_mastery
+            selection_mastery if selection_mastery is not None else student_mastery
         )
         
         # Generate session summary
@@ -327,7 +1196,7 @@ class AdaptivePracticeEngine:
             concept_coverage[concept_id]['avg_difficulty'] /= count
         
         return {
-            'session_id': f"{student_id}_{np.random.randint(10000)}",
+            'session_id': session_id,
             'student_id': student_id,
             'content_items': [
                 {
@@ -0,0 +1,221 @@
+"""
+AMEP BKT Parameter Fitting
+Fits per-concept BKT parameters (P(L0), P(T), P(G), P(S)) from response logs
+
+Solves: BR1 (Personalized Mastery) - replaces the single global parameter
+set with parameters learned for each concept
+
+Method: Coarse-to-fine grid search maximizing the log-likelihood of every
+student's response sequence under the BKT forward pass. The forward pass is
+vectorized over (parameter grid × students), so each grid evaluation is one
+NumPy pass per time step.
+"""
+
+import os
+import numpy as np
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from ai_engine.knowledge_tracing import BKTParameters
+
+# Search bounds per parameter (p_l0, p_t, p_g, p_s).
+# Guess and slip are capped below 0.5 to keep the model identifiable.
+PARAMETER_BOUNDS = np.array([
+    [0.01, 0.99],   # p_l0
+    [0.01, 0.99],   # p_t
+    [0.01, 0.45],   # p_g
+    [0.01, 0.45],   # p_s
+])
+
+# Upper bound on grid_size × students evaluated in one block
+_MAX_BLOCK_CELLS = 2_000_000
+
+@dataclass
+class BKTFitResult:
+    """Fitted BKT parameters for one concept"""
+    concept_id: str
+    params: BKTParameters
+    log_likelihood: float
+    n_students: int
+    n_responses: int
+
+# ============================================================================
+# FORWARD PASS
+# ============================================================================
+
+def pack_sequences(
+    sequences: Sequence[Sequence[bool]]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pack ragged per-student response sequences into a padded matrix
+
+    Students are ordered by sequence length (longest first) so that the
+    students still active at step t are always the leading rows.
+
+    Returns: (observations (S, T) bool, lengths (S,) int)
+    """
+    lengths = np.array([len(seq) for seq in sequences], dtype=np.int64)
+    order = np.argsort(-lengths, kind='stable')
+    lengths = lengths[order]
+
+    max_len = int(lengths[0]) if len(lengths) else 0
+    observations = np.zeros((len(sequences), max_len), dtype=bool)
+    for row, idx in enumerate(order):
+        observations[row, :lengths[row]] = np.asarray(sequences[idx], dtype=bool)
+
+    return observations, lengths
+
+def sequence_log_likelihood(
+    observations: np.ndarray,
+    lengths: np.ndarray,
+    grid: np.ndarray
+) -> np.ndarray:
+    """
+    Total log-likelihood of all sequences for every parameter row in grid
+
+    observations, lengths: output of pack_sequences
+    grid: candidate parameters, shape (G, 4) as (p_l0, p_t, p_g, p_s)
+
+    Returns: log-likelihood per grid row, shape (G,)
+    """
+    grid = np.atleast_2d(np.asarray(grid, dtype=np.float64))
+    total = np.zeros(len(grid))
+
+    n_students = observations.shape[0]
+    if n_students == 0:
+        return total
+
+    # Evaluate in blocks of grid rows to bound temporary array size
+    block = max(1, _MAX_BLOCK_CELLS // n_students)
+    for start in range(0, len(grid), block):
+        total[start:start + block] = _forward_log_likelihood(
+            observations, lengths, grid[start:start + block]
+        )
+
+    return total
+
+def _forward_log_likelihood(
+    observations: np.ndarray,
+    lengths: np.ndarray,
+    grid: np.ndarray
+) -> np.ndarray:
+    """BKT forward pass over (grid × students), same update as BKTEngine"""
+    p_l0, p_t, p_g, p_s = (grid[:, i:i + 1] for i in range(4))
+
+    p_l = np.repeat(p_l0, observations.shape[0], axis=1)
+    log_likelihood = np.zeros(len(grid))
+
+    # Number of students whose sequence is longer than t
+    active_counts = np.searchsorted(-lengths, -np.arange(observations.shape[1]), side='left')
+
+    for t in range(observations.shape[1]):
+        active = int(active_counts[t])
+        state = p_l[:, :active]
+        correct = observations[:active, t]
+
+        # P(correct) = P(L)(1 - P(S)) + (1 - P(L)) × P(G)
+        known_evidence = np.where(correct, state * (1 - p_s), state * p_s)
+        p_correct = state * (1 - p_s) + (1 - state) * p_g
+        p_observed = np.where(correct, p_correct, 1 - p_correct)
+
+        log_likelihood += np.log(np.maximum(p_observed, 1e-12)).sum(axis=1)
+
+        posterior = known_evidence / np.maximum(p_observed, 1e-12)
+        p_l[:, :active] = posterior + (1 - posterior) * p_t
+
+    return log_likelihood
+
+# ============================================================================
+# GRID SEARCH
+# ============================================================================
+
+def fit_bkt_parameters(
+    sequences: Sequence[Sequence[bool]],
+    coarse_steps: int = 5,
+    refine_rounds: int = 5
+) -> Tuple[BKTParameters, float]:
+    """
+    Fit BKT parameters for one concept by coarse-to-fine grid search
+
+    1. Evaluate a coarse_steps^4 grid spanning PARAMETER_BOUNDS
+    2. Repeatedly evaluate the 3^4 neighbourhood of the best point,
+       halving the step each round
+
+    Returns: (best parameters, log-likelihood at the best parameters)
+    """
+    observations, lengths = pack_sequences(sequences)
+
+    axes = [np.linspace(lo, hi, coarse_steps) for lo, hi in PARAMETER_BOUNDS]
+    grid = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 4)
+
+    scores = sequence_log_likelihood(observations, lengths, grid)
+    best = grid[int(np.argmax(scores))]
+    best_score = float(np.max(scores))
+
+    step = (PARAMETER_BOUNDS[:, 1] - PARAMETER_BOUNDS[:, 0]) / (coarse_steps - 1)
+    offsets = np.stack(
+        np.meshgrid(*([np.array([-1.0, 0.0, 1.0])] * 4), indexing='ij'),
+        axis=-1
+    ).reshape(-1, 4)
+
+    for _ in range(refine_rounds):
+        step = step / 2
+        grid = np.clip(
+            best + offsets * step,
+            PARAMETER_BOUNDS[:, 0],
+            PARAMETER_BOUNDS[:, 1]
+        )
+        scores = sequence_log_likelihood(observations, lengths, grid)
+        idx = int(np.argmax(scores))
+        if scores[idx] > best_score:
+            best, best_score = grid[idx], float(scores[idx])
+
+    params = BKTParameters(
+        p_l0=round(float(best[0]), 4),
+        p_t=round(float(best[1]), 4),
+        p_g=round(float(best[2]), 4),
+        p_s=round(float(best[3]), 4)
+    )
+    return params, best_score
+
+def fit_concept(
+    concept_id: str,
+    sequences: Sequence[Sequence[bool]]
+) -> BKTFitResult:
+    """Fit one concept and package the result (process pool task)"""
+    params, log_likelihood = fit_bkt_parameters(sequences)
+    return BKTFitResult(
+        concept_id=concept_id,
+        params=params,
+        log_likelihood=log_likelihood,
+        n_students=len(sequences),
+        n_responses=int(sum(len(seq) for seq in sequences))
+    )
+
+def fit_concepts_parallel(
+    concept_sequences: Iterable[Tuple[str, List[List[bool]]]],
+    max_workers: Optional[int] = None
+) -> Iterator[BKTFitResult]:
+    """
+    Fit many concepts across all cores
+
+    concept_sequences is consumed lazily and at most 2 × max_workers
+    concepts are in flight, so a district-wide stream never has to be
+    held in memory. Results are yielded as they complete.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_in_flight = 2 * max_workers
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        pending = set()
+        for concept_id, sequences in concept_sequences:
+            pending.add(pool.submit(fit_concept, concept_id, sequences))
+
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+        for future in pending:
+            yield future.result()
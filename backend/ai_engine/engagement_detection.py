@@ -11,7 +11,7 @@ Research Sources:
 """
 
 import numpy as np
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Sequence
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from enum import Enum
@@ -64,6 +64,92 @@ class ExplicitSignals:
     participation_rate: float  # Percentage of activities completed
     quiz_accuracy: float  # 0.0 to 1.0
 
+# Descriptions of count-based behaviors
+_BEHAVIOR_DESCRIPTIONS = {
+    DisengagementBehavior.QUICK_GUESS: 'Student answering without thinking (< 3 seconds)',
+    DisengagementBehavior.BOTTOM_OUT_HINT: 'Student using all hints without attempting (giving up)',
+    DisengagementBehavior.MANY_ATTEMPTS: 'Random clicking/guessing on multiple questions',
+    DisengagementBehavior.LOW_LOGIN_FREQUENCY: 'Only {value} logins in past week'
+}
+
+# Levels by code, as returned by EngagementDetectionEngine.score_engagement_batch
+ENGAGEMENT_LEVELS = list(EngagementLevel)
+
+# Score penalty per disengagement behavior severity
+SEVERITY_PENALTIES = {'MONITOR': 5, 'AT_RISK': 10, 'CRITICAL': 20}
+
+# Class engagement index change (points) that counts as a trend
+TREND_THRESHOLD = 2.0
+
+@dataclass
+class ImplicitSignalBatch:
+    """
+    Struct-of-arrays view of ImplicitSignals for N students
+    
+    response_times is reduced to its mean per student (NaN when a student
+    has none), computed with np.mean like the scalar path.
+    """
+    login_frequency: np.ndarray           # (N,) float64
+    avg_session_duration: np.ndarray      # (N,) float64
+    time_on_task: np.ndarray              # (N,) float64
+    interaction_count: np.ndarray         # (N,) float64
+    avg_response_time: np.ndarray         # (N,) float64, NaN = no responses
+    task_completion_rate: np.ndarray      # (N,) float64
+    reattempt_rate: np.ndarray            # (N,) float64
+    optional_resource_usage: np.ndarray   # (N,) float64
+    discussion_participation: np.ndarray  # (N,) float64
+    
+    @classmethod
+    def from_columns(cls, **columns: Sequence[float]) -> 'ImplicitSignalBatch':
+        return cls(**{
+            name: np.asarray(values, dtype=np.float64).reshape(-1)
+            for name, values in columns.items()
+        })
+    
+    @classmethod
+    def from_signals(cls, signals: Sequence[ImplicitSignals]) -> 'ImplicitSignalBatch':
+        return cls.from_columns(
+            login_frequency=[s.login_frequency for s in signals],
+            avg_session_duration=[s.avg_session_duration for s in signals],
+            time_on_task=[s.time_on_task for s in signals],
+            interaction_count=[s.interaction_count for s in signals],
+            avg_response_time=[np.mean(s.response_times) if s.response_times else np.nan for s in signals],
+            task_completion_rate=[s.task_completion_rate for s in signals],
+            reattempt_rate=[s.reattempt_rate for s in signals],
+            optional_resource_usage=[s.optional_resource_usage for s in signals],
+            discussion_participation=[s.discussion_participation for s in signals]
+        )
+    
+    def __len__(self) -> int:
+        return len(self.login_frequency)
+
+@dataclass
+class ExplicitSignalBatch:
+    """Struct-of-arrays view of ExplicitSignals for N students"""
+    poll_responses: np.ndarray       # (N,) float64
+    understanding_level: np.ndarray  # (N,) float64
+    participation_rate: np.ndarray   # (N,) float64
+    quiz_accuracy: np.ndarray        # (N,) float64
+    
+    @classmethod
+    def from_columns(cls, **columns: Sequence[float]) -> 'ExplicitSignalBatch':
+        return cls(**{
+            name: np.asarray(values, dtype=np.float64).reshape(-1)
+            for name, values in columns.items()
+        })
+    
+    @classmethod
+    def from_signals(cls, signals: Sequence[ExplicitSignals]) -> 'ExplicitSignalBatch':
+        return cls.from_columns(
+            poll_responses=[s.poll_responses for s in signals],
+            understanding_level=[s.understanding_level for s in signals],
+            participation_rate=[s.participation_rate for s in signals],
+            quiz_accuracy=[s.quiz_accuracy for s in signals]
+        )
+    
+    def __len__(self) -> int:
+        return len(self.poll_responses)
+
 class EngagementDetectionEngine:
     """
     Sensorless Engagement Monitoring System
@@ -98,6 +184,34 @@ class EngagementDetectionEngine:
         
         Returns list of detected behaviors with severity
         """
+        return self._detect_behaviors(
+            recent_responses, implicit_signals.login_frequency, implicit_signals.avg_session_duration
+        )
+    
+    def detect_disengagement_behaviors_batch(
+        self,
+        recent_responses: Sequence[List[Dict]],
+        implicit: ImplicitSignalBatch
+    ) -> List[List[Dict[str, any]]]:
+        """
+        BR4: detect_disengagement_behaviors for N students, with the weekly
+        measures read from the signal columns
+        """
+        return [
+            self._detect_behaviors(responses, int(login_frequency), avg_session_duration)
+            for responses, login_frequency, avg_session_duration in zip(
+                recent_responses,
+                implicit.login_frequency.tolist(),
+                implicit.avg_session_duration.tolist()
+            )
+        ]
+    
+    def _detect_behaviors(
+        self,
+        recent_responses: List[Dict],
+        login_frequency: int,
+        avg_session_duration: float
+    ) -> List[Dict[str, any]]:
         behaviors = []
         
         # 1. Quick Guess Detection
@@ -105,52 +219,24 @@ class EngagementDetectionEngine:
             1 for r in recent_responses 
             if r.get('response_time', float('inf')) < self.QUICK_GUESS_THRESHOLD
         )
-        if quick_guesses >= 3:
-            behaviors.append({
-                'type': DisengagementBehavior.QUICK_GUESS,
-                'severity': 'MONITOR' if quick_guesses < 5 else 'AT_RISK',
-                'count': quick_guesses,
-                'description': 'Student answering without thinking (< 3 seconds)',
-                'detected_at': datetime.now().isoformat()
-            })
+        self._add_behavior(behaviors, DisengagementBehavior.QUICK_GUESS, quick_guesses)
         
         # 2. Bottom-out Hint Detection
         bottom_out_hints = sum(
             1 for r in recent_responses
             if r.get('hints_used', 0) >= self.MAX_HINTS
         )
-        if bottom_out_hints >= 2:
-            behaviors.append({
-                'type': DisengagementBehavior.BOTTOM_OUT_HINT,
-                'severity': 'AT_RISK',
-                'count': bottom_out_hints,
-                'description': 'Student using all hints without attempting (giving up)',
-                'detected_at': datetime.now().isoformat()
-            })
+        self._add_behavior(behaviors, DisengagementBehavior.BOTTOM_OUT_HINT, bottom_out_hints)
         
         # 3. Many Attempts Detection
         many_attempts = sum(
             1 for r in recent_responses
             if r.get('attempts', 1) > self.MANY_ATTEMPTS_THRESHOLD
         )
-        if many_attempts >= 3:
-            behaviors.append({
-                'type': DisengagementBehavior.MANY_ATTEMPTS,
-                'severity': 'MONITOR',
-                'count': many_attempts,
-                'description': 'Random clicking/guessing on multiple questions',
-                'detected_at': datetime.now().isoformat()
-            })
+        self._add_behavior(behaviors, DisengagementBehavior.MANY_ATTEMPTS, many_attempts)
         
         # 4. Low Login Frequency
-        if implicit_signals.login_frequency < self.MIN_LOGIN_FREQUENCY:
-            behaviors.append({
-                'type': DisengagementBehavior.LOW_LOGIN_FREQUENCY,
-                'severity': 'AT_RISK' if implicit_signals.login_frequency < 2 else 'MONITOR',
-                'count': implicit_signals.login_frequency,
-                'description': f'Only {implicit_signals.login_frequency} logins in past week',
-                'detected_at': datetime.now().isoformat()
-            })
+        self._add_behavior(behaviors, DisengagementBehavior.LOW_LOGIN_FREQUENCY, login_frequency)
         
         # 5. Declining Performance
         if recent_responses:
@@ -163,28 +249,78 @@ class EngagementDetectionEngine:
                 r['is_correct'] for r in recent_responses[mid:]
             ])
             decline = first_half_accuracy - second_half_accuracy
-            
-            if decline > 0.2:  # 20% decline
-                behaviors.append({
-                    'type': DisengagementBehavior.DECLINING_PERFORMANCE,
-                    'severity': 'AT_RISK',
-                    'decline_percentage': round(decline * 100, 1),
-                    'description': f'Performance declined by {round(decline * 100, 1)}%',
-                    'detected_at': datetime.now().isoformat()
-                })
+            self._add_behavior(behaviors, DisengagementBehavior.DECLINING_PERFORMANCE, decline)
         
         # 6. Session Duration Analysis
-        if implicit_signals.avg_session_duration < self.MIN_SESSION_DURATION:
-            behaviors.append({
-                'type': DisengagementBehavior.LONG_INACTIVITY,
-                'severity': 'MONITOR',
-                'avg_duration': implicit_signals.avg_session_duration,
-                'description': f'Very short sessions ({implicit_signals.avg_session_duration:.1f} min avg)',
-                'detected_at': datetime.now().isoformat()
-            })
+        self._add_behavior(behaviors, DisengagementBehavior.LONG_INACTIVITY, avg_session_duration)
         
         return behaviors
     
+    def behavior_severity(self, behavior: DisengagementBehavior, value: float) -> Optional[str]:
+        """
+        Severity of a behavior from its measure, None if not detected
+        
+        value: QUICK_GUESS / BOTTOM_OUT_HINT / MANY_ATTEMPTS - responses
+        showing it; LOW_LOGIN_FREQUENCY - logins in the past week;
+        DECLINING_PERFORMANCE - first-half minus second-half accuracy;
+        LONG_INACTIVITY - average session duration (minutes)
+        """
+        if behavior == DisengagementBehavior.QUICK_GUESS:
+            if value >= 3:
+                return 'MONITOR' if value < 5 else 'AT_RISK'
+        elif behavior == DisengagementBehavior.BOTTOM_OUT_HINT:
+            if value >= 2:
+                return 'AT_RISK'
+        elif behavior == DisengagementBehavior.MANY_ATTEMPTS:
+            if value >= 3:
+                return 'MONITOR'
+        elif behavior == DisengagementBehavior.LOW_LOGIN_FREQUENCY:
+            if value < self.MIN_LOGIN_FREQUENCY:
+                return 'AT_RISK' if value < 2 else 'MONITOR'
+        elif behavior == DisengagementBehavior.DECLINING_PERFORMANCE:
+            if value > 0.2:  # 20% decline
+                return 'AT_RISK'
+        elif behavior == DisengagementBehavior.LONG_INACTIVITY:
+            if value < self.MIN_SESSION_DURATION:
+                return 'MONITOR'
+        return None
+    
+    def behavior_record(
+        self,
+        behavior: DisengagementBehavior,
+        severity: str,
+        value: float
+    ) -> Dict[str, any]:
+        """Detected behavior as reported by detect_disengagement_behaviors"""
+        if behavior == DisengagementBehavior.DECLINING_PERFORMANCE:
+            return {
+                'type': behavior,
+                'severity': severity,
+                'decline_percentage': round(value * 100, 1),
+                'description': f'Performance declined by {round(value * 100, 1)}%',
+                'detected_at': datetime.now().isoformat()
+            }
+        if behavior == DisengagementBehavior.LONG_INACTIVITY:
+            return {
+                'type': behavior,
+                'severity': severity,
+                'avg_duration': value,
+                'description': f'Very short sessions ({value:.1f} min avg)',
+                'detected_at': datetime.now().isoformat()
+            }
+        return {
+            'type': behavior,
+            'severity': severity,
+            'count': value,
+            'description': _BEHAVIOR_DESCRIPTIONS[behavior].format(value=value),
+            'detected_at': datetime.now().isoformat()
+        }
+    
+    def _add_behavior(self, behaviors: List[Dict], behavior: DisengagementBehavior, value: float):
+        severity = self.behavior_severity(behavior, value)
+        if severity is not None:
+            behaviors.append(self.behavior_record(behavior, severity, value))
+    
     def calculate_engagement_score(
         self,
         implicit_signals: ImplicitSignals,
@@ -236,6 +372,101 @@ class EngagementDetectionEngine:
             )
         }
     
+    def score_engagement_batch(
+        self,
+        implicit: ImplicitSignalBatch,
+        explicit: ExplicitSignalBatch,
+        disengagement_behaviors: Optional[Sequence[List[Dict]]] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        BR4: calculate_engagement_score for N students in one pass
+        
+        disengagement_behaviors[i] are student i's detected behaviors
+        (None = none detected). Values equal the scalar path before
+        rounding; engagement_level holds codes into ENGAGEMENT_LEVELS.
+        
+        Returns: {engagement_score, implicit_component, explicit_component,
+                  penalty_applied, behaviors_detected, engagement_level},
+                 each shape (N,)
+        """
+        n = len(implicit)
+        if len(explicit) != n:
+            raise ValueError("implicit and explicit signal batches differ in length")
+        
+        implicit_score = self._calculate_implicit_scores(implicit)
+        explicit_score = self._calculate_explicit_scores(explicit)
+        
+        # Weighted combination
+        base_score = (
+            implicit_score * self.weights['implicit'] +
+            explicit_score * self.weights['explicit']
+        )
+        
+        # Behavior counts per severity, one bincount each
+        behaviors = disengagement_behaviors or [[]] * n
+        counts = np.array([len(b) for b in behaviors], dtype=np.int64)
+        rows = np.repeat(np.arange(n), counts)
+        severities = np.array([b['severity'] for student in behaviors for b in student], dtype=object)
+        severity_counts = {
+            severity: np.bincount(rows[severities == severity], minlength=n)
+            for severity in SEVERITY_PENALTIES
+        }
+        penalty = sum(
+            SEVERITY_PENALTIES[severity] * count for severity, count in severity_counts.items()
+        )
+        
+        final_score = np.maximum(0, base_score - penalty)
+        
+        return {
+            'engagement_score': final_score,
+            'implicit_component': implicit_score,
+            'explicit_component': explicit_score,
+            'penalty_applied': penalty,
+            'behaviors_detected': counts,
+            'engagement_level': self._classify_engagement_batch(
+                final_score, severity_counts['AT_RISK'], severity_counts['CRITICAL']
+            )
+        }
+    
+    def calculate_engagement_scores(
+        self,
+        implicit: ImplicitSignalBatch,
+        explicit: ExplicitSignalBatch,
+        disengagement_behaviors: Optional[Sequence[List[Dict]]] = None
+    ) -> List[Dict[str, any]]:
+        """
+        BR4: calculate_engagement_score results for N students
+        
+        Scores come from score_engagement_batch; only rounding and the
+        recommendations are done per student.
+        """
+        scores = self.score_engagement_batch(implicit, explicit, disengagement_behaviors)
+        behaviors = disengagement_behaviors or [[]] * len(implicit)
+        
+        return [
+            {
+                'engagement_score': round(final_score, 2),
+                'implicit_component': round(implicit_score, 2),
+                'explicit_component': round(explicit_score, 2),
+                'engagement_level': ENGAGEMENT_LEVELS[level].value,
+                'penalty_applied': penalty,
+                'behaviors_detected': detected,
+                'recommendations': self._generate_recommendations(
+                    ENGAGEMENT_LEVELS[level],
+                    student_behaviors
+                )
+            }
+            for final_score, implicit_score, explicit_score, level, penalty, detected, student_behaviors in zip(
+                scores['engagement_score'].tolist(),
+                scores['implicit_component'].tolist(),
+                scores['explicit_component'].tolist(),
+                scores['engagement_level'].tolist(),
+                scores['penalty_applied'].tolist(),
+                scores['behaviors_detected'].tolist(),
+                behaviors
+            )
+        ]
+    
     def _calculate_implicit_score(self, signals: ImplicitSignals) -> float:
         """
         Calculate score from implicit indicators
@@ -280,6 +511,42 @@ class EngagementDetectionEngine:
         
         return implicit_score
     
+    def _calculate_implicit_scores(self, signals: ImplicitSignalBatch) -> np.ndarray:
+        """_calculate_implicit_score over a batch (same operations, same order)"""
+        login_score = np.minimum(100, (signals.login_frequency / 7) * 100)
+        duration_score = np.minimum(100, (signals.avg_session_duration / 30) * 100)
+        time_on_task_score = np.minimum(100, (signals.time_on_task / 120) * 100)
+        interaction_score = np.minimum(100, (signals.interaction_count / 50) * 100)
+        
+        avg_response_time = signals.avg_response_time
+        with np.errstate(invalid='ignore'):
+            response_time_score = np.select(
+                [
+                    np.isnan(avg_response_time),
+                    avg_response_time < 3,     # Too fast = guessing
+                    avg_response_time < 30     # Optimal
+                ],
+                [50, 50, 100],
+                default=np.maximum(0, 100 - (avg_response_time - 30) * 2)
+            )
+        
+        completion_score = signals.task_completion_rate * 100
+        reattempt_score = np.minimum(100, signals.reattempt_rate * 150)
+        resource_score = np.minimum(100, (signals.optional_resource_usage / 5) * 100)
+        discussion_score = np.minimum(100, (signals.discussion_participation / 3) * 100)
+        
+        return (
+            login_score * 0.15 +
+            duration_score * 0.15 +
+            time_on_task_score * 0.15 +
+            interaction_score * 0.1 +
+            response_time_score * 0.1 +
+            completion_score * 0.2 +
+            reattempt_score * 0.05 +
+            resource_score * 0.05 +
+            discussion_score * 0.05
+        )
+    
     def _calculate_explicit_score(self, signals: ExplicitSignals) -> float:
         """Calculate score from explicit indicators (polls, self-reports)"""
         poll_score = min(100, (signals.poll_responses / 5) * 100)  # 5/week ideal
@@ -296,6 +563,44 @@ class EngagementDetectionEngine:
         
         return explicit_score
     
+    def _calculate_explicit_scores(self, signals: ExplicitSignalBatch) -> np.ndarray:
+        """_calculate_explicit_score over a batch"""
+        poll_score = np.minimum(100, (signals.poll_responses / 5) * 100)
+        understanding_score = (signals.understanding_level / 5) * 100
+        participation_score = signals.participation_rate * 100
+        accuracy_score = signals.quiz_accuracy * 100
+        
+        return (
+            poll_score * 0.2 +
+            understanding_score * 0.3 +
+            participation_score * 0.3 +
+            accuracy_score * 0.2
+        )
+    
+    def _classify_engagement_batch(
+        self,
+        scores: np.ndarray,
+        at_risk_behaviors: np.ndarray,
+        critical_behaviors: np.ndarray
+    ) -> np.ndarray:
+        """_classify_engagement as ENGAGEMENT_LEVELS codes, first match wins"""
+        code = {level: i for i, level in enumerate(ENGAGEMENT_LEVELS)}
+        return np.select(
+            [
+                (critical_behaviors > 0) | (scores < 30),
+                (at_risk_behaviors >= 2) | (scores < 50),
+                (at_risk_behaviors == 1) | (scores < 65),
+                scores < 75
+            ],
+            [
+                code[EngagementLevel.CRITICAL],
+                code[EngagementLevel.AT_RISK],
+                code[EngagementLevel.MONITOR],
+                code[EngagementLevel.PASSIVE]
+            ],
+            default=code[EngagementLevel.ENGAGED]
+        ).astype(np.int8)
+    
     def _classify_engagement(
         self, 
         score: float, 
@@ -359,14 +664,31 @@ class EngagementDetectionEngine:
         
         return recommendations
     
+    def engagement_trend(self, class_index: float, baseline_index: Optional[float]) -> str:
+        """
+        BR6: Class trend against an earlier class engagement index
+        
+        Returns: 'improving', 'declining' or 'stable' (also without a baseline)
+        """
+        if baseline_index is None:
+            return "stable"
+        change = class_index - baseline_index
+        if change >= TREND_THRESHOLD:
+            return "improving"
+        if change <= -TREND_THRESHOLD:
+            return "declining"
+        return "stable"
+    
     def analyze_class_engagement(
         self,
-        student_engagements: List[Dict]
+        student_engagements: List[Dict],
+        baseline_index: Optional[float] = None
     ) -> Dict[str, any]:
         """
         BR6: Class-level engagement analysis for teacher dashboard
         
-        Aggregates individual student engagement into class metrics
+        Aggregates individual student engagement into class metrics;
+        baseline_index is the class index of an earlier snapshot (trend)
         """
         if not student_engagements:
             return {
@@ -393,8 +715,8 @@ class EngagementDetectionEngine:
         # Alert counts
         alert_count = distribution['AT_RISK'] + distribution['CRITICAL']
         
-        # Trend analysis (if historical data available)
-        trend = "stable"  # Would compare to previous period
+        # Trend against the earlier snapshot
+        trend = self.engagement_trend(class_index, baseline_index)
         
         return {
             'class_engagement_index': round(class_index, 2),
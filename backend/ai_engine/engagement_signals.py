@@ -0,0 +1,331 @@
+"""
+AMEP Implicit Signal Materialization
+Rolling 7-day ImplicitSignals per student, maintained from engagement events
+
+Solves: BR4 (Inclusive Engagement Capture) - EngagementDetectionEngine
+expects fully computed weekly signals; recomputing them means scanning a
+week of ENGAGEMENT_LOGS per student
+
+Each student has up to `window_days` tumbling daily buckets of counters
+(UTC days) and their running totals. An event adds to its day's bucket and
+to the totals; when a new day starts, the buckets that fell out of the
+window are subtracted from the totals. Reading the signals is O(1).
+
+The window is the current day plus the `window_days - 1` before it, so
+"past 7 days" has day granularity.
+
+Windows live in one process and only see the events that process's writer
+delivers. With several API processes behind a load balancer, set
+`reseed_after` so each window is rebuilt from ENGAGEMENT_LOGS (which holds
+every process's events) once it is that many seconds old.
+"""
+
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from ai_engine.engagement_detection import ImplicitSignals, ImplicitSignalBatch
+
+# Counter indexes
+(
+    LOGINS,
+    SESSIONS,
+    SESSION_MINUTES,
+    TASK_MINUTES,
+    INTERACTIONS,
+    RESPONSES,
+    TIMED_RESPONSES,
+    RESPONSE_SECONDS,
+    REATTEMPTS,
+    TASKS_STARTED,
+    TASKS_COMPLETED,
+    OPTIONAL_RESOURCES,
+    DISCUSSION_POSTS
+) = range(13)
+
+_COUNTERS = 13
+
+def event_counts(event: Dict) -> List[tuple]:
+    """(counter, amount) pairs an engagement log event contributes"""
+    event_type = event['event_type']
+    if event_type == 'login':
+        return [(LOGINS, 1)]
+    if event_type == 'logout':
+        return [(SESSIONS, 1), (SESSION_MINUTES, event.get('duration') or 0.0)]
+    if event_type == 'click':
+        return [(INTERACTIONS, 1)]
+    if event_type == 'response':
+        counts = [(INTERACTIONS, 1), (RESPONSES, 1)]
+        if event.get('response_time') is not None:
+            counts += [(TIMED_RESPONSES, 1), (RESPONSE_SECONDS, event['response_time'])]
+        if (event.get('attempts') or 1) > 1:
+            counts.append((REATTEMPTS, 1))
+        return counts
+    if event_type == 'resource_access':
+        counts = [(INTERACTIONS, 1)]
+        if event.get('optional'):
+            counts.append((OPTIONAL_RESOURCES, 1))
+        return counts
+    if event_type == 'time_on_task':
+        return [(TASK_MINUTES, event.get('duration') or 0.0)]
+    if event_type == 'task_start':
+        return [(TASKS_STARTED, 1)]
+    if event_type == 'task_complete':
+        return [(TASKS_COMPLETED, 1)]
+    if event_type == 'discussion_post':
+        return [(DISCUSSION_POSTS, 1)]
+    # Hints are covered by the responses they belong to
+    return []
+
+class _SignalWindow:
+    """Daily buckets and running totals of one student"""
+
+    __slots__ = ('buckets', 'totals')
+
+    def __init__(self):
+        self.buckets = deque()  # [day ordinal, counters], oldest first
+        self.totals = [0.0] * _COUNTERS
+
+    def advance(self, day: int, window_days: int):
+        """Subtract the buckets that fall out of the window ending at `day`"""
+        cutoff = day - window_days
+        while self.buckets and self.buckets[0][0] <= cutoff:
+            expired = self.buckets.popleft()[1]
+            for i in range(_COUNTERS):
+                self.totals[i] -= expired[i]
+        if not self.buckets:
+            # Drop accumulated rounding error along with the last bucket
+            self.totals = [0.0] * _COUNTERS
+
+    def bucket(self, day: int) -> Optional[list]:
+        """Counters of `day`, created if it is newer than every bucket"""
+        if not self.buckets or self.buckets[-1][0] < day:
+            counters = [0.0] * _COUNTERS
+            self.buckets.append([day, counters])
+            return counters
+        for bucket_day, counters in reversed(self.buckets):
+            if bucket_day == day:
+                return counters
+            if bucket_day < day:
+                break
+        # A late event for a day that had no events: keep buckets in order
+        index = next(i for i, (bucket_day, _) in enumerate(self.buckets) if bucket_day > day)
+        counters = [0.0] * _COUNTERS
+        self.buckets.insert(index, [day, counters])
+        return counters
+
+    @property
+    def latest_day(self) -> Optional[int]:
+        return self.buckets[-1][0] if self.buckets else None
+
+class ImplicitSignalMaterializer:
+    """
+    ImplicitSignals per student over a rolling window of daily buckets
+
+    Events are engagement log documents (see EngagementEvent); timestamps
+    are naive UTC. Signal definitions over the window:
+    - login_frequency: logins
+    - avg_session_duration: logout durations / logouts
+    - time_on_task: time_on_task durations (minutes)
+    - interaction_count: clicks, responses and resource accesses
+    - response_times: the mean response time (one value), empty without
+      timed responses
+    - task_completion_rate: tasks completed / started, capped at 1
+    - reattempt_rate: responses with more than one attempt / responses
+    - optional_resource_usage: accesses of optional resources
+    - discussion_participation: discussion posts
+    """
+
+    def __init__(self, window_days: int = 7, reseed_after: Optional[float] = None):
+        """
+        reseed_after: seconds after which a student's window is replayed
+                      from storage again (multi-process deployments); None
+                      replays only during the first window after a start
+        """
+        if window_days < 1:
+            raise ValueError("window_days must be at least 1")
+        self.window_days = window_days
+        self.reseed_after = reseed_after
+        self.started_at = datetime.utcnow()
+        self._students: Dict[str, _SignalWindow] = {}
+        self._seeded: Dict[str, float] = {}  # student_id -> monotonic seed time
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._students)
+
+    def __contains__(self, student_id: str) -> bool:
+        return student_id in self._students
+
+    # ------------------------------------------------------------------------
+    # Events
+    # ------------------------------------------------------------------------
+
+    def process(self, event: Dict):
+        with self._lock:
+            self._apply(event)
+
+    def process_many(self, events: Iterable[Dict]):
+        """Apply events (any order within the window)"""
+        with self._lock:
+            for event in events:
+                self._apply(event)
+
+    def needs_history(self, student_id: str, now: Optional[datetime] = None) -> bool:
+        """
+        True when live events alone are incomplete: the student was not
+        seeded with warm_start while the window predates this materializer,
+        or (with reseed_after) the last seed is older than reseed_after
+        """
+        seeded_at = self._seeded.get(student_id)
+        if self.reseed_after is not None:
+            return seeded_at is None or time.monotonic() - seeded_at >= self.reseed_after
+        day = (now or datetime.utcnow()).toordinal()
+        return day - self.started_at.toordinal() < self.window_days and seeded_at is None
+
+    def warm_start(self, student_id: str, events: Iterable[Dict]):
+        """
+        Rebuild a student's window from stored events (e.g. ENGAGEMENT_LOGS
+        of the past window after a restart); replaces what was tracked
+
+        Live events must not be delivered between reading `events` and
+        this call (see EngagementLogWriter.holding_delivery), or they are
+        counted twice or lost with the replaced window.
+        """
+        window = _SignalWindow()
+        with self._lock:
+            self._students[student_id] = window
+            self._seeded[student_id] = time.monotonic()
+            for event in events:
+                self._add(window, event)
+
+    def sweep(self, now: Optional[datetime] = None):
+        """
+        Expire old buckets of every student and forget inactive students,
+        along with seed records needs_history no longer consults (run
+        periodically)
+        """
+        day = (now or datetime.utcnow()).toordinal()
+        with self._lock:
+            for student_id in list(self._students):
+                window = self._students[student_id]
+                window.advance(day, self.window_days)
+                if not window.buckets:
+                    del self._students[student_id]
+
+            first_window = day - self.started_at.toordinal() < self.window_days
+            stale_after = time.monotonic() - (self.reseed_after or 0.0)
+            for student_id in list(self._seeded):
+                if self.reseed_after is not None:
+                    forget = self._seeded[student_id] <= stale_after
+                else:
+                    forget = not first_window
+                if forget or student_id not in self._students:
+                    del self._seeded[student_id]
+
+    def forget(self, student_id: str):
+        with self._lock:
+            self._students.pop(student_id, None)
+            self._seeded.pop(student_id, None)
+
+    # ------------------------------------------------------------------------
+    # Signals
+    # ------------------------------------------------------------------------
+
+    def totals(self, student_id: str, now: Optional[datetime] = None) -> List[float]:
+        """Raw window counters of one student (zeros when untracked)"""
+        day = (now or datetime.utcnow()).toordinal()
+        with self._lock:
+            window = self._students.get(student_id)
+            if window is None:
+                return [0.0] * _COUNTERS
+            window.advance(day, self.window_days)
+            return list(window.totals)
+
+    def signals(self, student_id: str, now: Optional[datetime] = None) -> ImplicitSignals:
+        """Weekly ImplicitSignals of one student, ready for EngagementDetectionEngine"""
+        totals = self.totals(student_id, now)
+        return ImplicitSignals(
+            login_frequency=int(round(totals[LOGINS])),
+            avg_session_duration=totals[SESSION_MINUTES] / totals[SESSIONS] if totals[SESSIONS] >= 1 else 0.0,
+            time_on_task=max(0.0, totals[TASK_MINUTES]),
+            interaction_count=int(round(totals[INTERACTIONS])),
+            response_times=(
+                [totals[RESPONSE_SECONDS] / totals[TIMED_RESPONSES]]
+                if totals[TIMED_RESPONSES] >= 1 else []
+            ),
+            task_completion_rate=self._completion_rate(totals[TASKS_COMPLETED], totals[TASKS_STARTED]),
+            reattempt_rate=totals[REATTEMPTS] / totals[RESPONSES] if totals[RESPONSES] >= 1 else 0.0,
+            optional_resource_usage=int(round(totals[OPTIONAL_RESOURCES])),
+            discussion_participation=int(round(totals[DISCUSSION_POSTS]))
+        )
+
+    def signal_batch(
+        self,
+        student_ids: List[str],
+        now: Optional[datetime] = None
+    ) -> ImplicitSignalBatch:
+        """Weekly signals of many students as columns, for score_engagement_batch"""
+        day = (now or datetime.utcnow()).toordinal()
+        totals = np.zeros((len(student_ids), _COUNTERS))
+        with self._lock:
+            for row, student_id in enumerate(student_ids):
+                window = self._students.get(student_id)
+                if window is not None:
+                    window.advance(day, self.window_days)
+                    totals[row] = window.totals
+        totals = np.maximum(totals, 0.0)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sessions, responses = totals[:, SESSIONS], totals[:, RESPONSES]
+            timed, started = totals[:, TIMED_RESPONSES], totals[:, TASKS_STARTED]
+            completed = totals[:, TASKS_COMPLETED]
+            return ImplicitSignalBatch.from_columns(
+                login_frequency=np.round(totals[:, LOGINS]),
+                avg_session_duration=np.where(sessions >= 1, totals[:, SESSION_MINUTES] / sessions, 0.0),
+                time_on_task=totals[:, TASK_MINUTES],
+                interaction_count=np.round(totals[:, INTERACTIONS]),
+                avg_response_time=np.where(timed >= 1, totals[:, RESPONSE_SECONDS] / timed, np.nan),
+                task_completion_rate=np.where(
+                    started >= 1, np.minimum(1.0, completed / started), (completed >= 1).astype(np.float64)
+                ),
+                reattempt_rate=np.where(responses >= 1, totals[:, REATTEMPTS] / responses, 0.0),
+                optional_resource_usage=np.round(totals[:, OPTIONAL_RESOURCES]),
+                discussion_participation=np.round(totals[:, DISCUSSION_POSTS])
+            )
+
+    # ------------------------------------------------------------------------
+    # Internals (callers hold self._lock)
+    # ------------------------------------------------------------------------
+
+    def _apply(self, event: Dict):
+        window = self._students.get(event['student_id'])
+        if window is None:
+            window = self._students[event['student_id']] = _SignalWindow()
+        self._add(window, event)
+
+    def _add(self, window: _SignalWindow, event: Dict):
+        counts = event_counts(event)
+        if not counts:
+            return
+        # A future timestamp must not move the window past today
+        now = datetime.utcnow()
+        day = min(event.get('timestamp') or now, now).toordinal()
+        latest = window.latest_day
+        if latest is not None and day <= latest - self.window_days:
+            return  # Older than the window
+        window.advance(day, self.window_days)
+        counters = window.bucket(day)
+        for index, amount in counts:
+            counters[index] += amount
+            window.totals[index] += amount
+
+    @staticmethod
+    def _completion_rate(completed: float, started: float) -> float:
+        if started >= 1:
+            return min(1.0, completed / started)
+        return 1.0 if completed >= 1 else 0.0
@@ -0,0 +1,347 @@
+"""
+AMEP Streaming Disengagement Detection
+Incremental version of EngagementDetectionEngine.detect_disengagement_behaviors
+for live classrooms
+
+Solves: BR4 (Inclusive Engagement Capture), BR6 (Actionable Teacher Feedback)
+
+Per student, the detector keeps:
+- A ring buffer of the last `window_size` responses with running counts of
+  quick guesses, bottom-out hints and many-attempt responses, and the
+  correct count of each half of the window (the declining-performance
+  comparison)
+- The login and session-end timestamps of the past week, with a running
+  sum of session durations
+
+Each event updates the counters in O(1) (amortized, for expiring logins and
+sessions) and re-evaluates only the behaviors it can affect; a change is
+emitted only when a behavior's severity flips. Severities are the same as
+detect_disengagement_behaviors over the buffered window.
+
+sweep() (run periodically) re-evaluates the weekly behaviors of students
+who sent nothing, and forgets students with no events in the past week.
+"""
+
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+from ai_engine.engagement_detection import DisengagementBehavior, EngagementDetectionEngine
+
+_RESPONSE_BEHAVIORS = (
+    DisengagementBehavior.QUICK_GUESS,
+    DisengagementBehavior.BOTTOM_OUT_HINT,
+    DisengagementBehavior.MANY_ATTEMPTS,
+    DisengagementBehavior.DECLINING_PERFORMANCE
+)
+
+class _StudentStream:
+    """Ring buffer and running counters of one student"""
+
+    __slots__ = (
+        'correct', 'flags', 'head', 'size', 'first_size', 'first_correct', 'total_correct',
+        'counts', 'pending_hints', 'logins', 'sessions', 'session_minutes',
+        'seeded', 'severities', 'last_event'
+    )
+
+    # Bits of `flags`, indexes into `counts`
+    QUICK, BOTTOM_OUT, MANY = 0, 1, 2
+
+    def __init__(self, window_size: int):
+        self.correct = [0] * window_size
+        self.flags = [0] * window_size
+        self.head = 0
+        self.size = 0
+        self.first_size = 0       # Responses in the first half of the window
+        self.first_correct = 0
+        self.total_correct = 0
+        self.counts = [0, 0, 0]
+        self.pending_hints = 0    # Hints requested since the last response
+        self.logins = deque()
+        self.sessions = deque()   # (ended_at, minutes)
+        self.session_minutes = 0.0
+        self.seeded = False
+        self.severities: Dict[DisengagementBehavior, Optional[str]] = {}
+        self.last_event = datetime.utcnow()
+
+    def push(self, correct: int, flags: int):
+        capacity = len(self.correct)
+        if self.size == capacity:
+            # Evict the oldest response (always in the first half)
+            old_correct, old_flags = self.correct[self.head], self.flags[self.head]
+            self.total_correct -= old_correct
+            self.first_correct -= old_correct
+            self.first_size -= 1
+            for bit in range(3):
+                self.counts[bit] -= (old_flags >> bit) & 1
+            self.head = (self.head + 1) % capacity
+            self.size -= 1
+
+        slot = (self.head + self.size) % capacity
+        self.correct[slot], self.flags[slot] = correct, flags
+        self.size += 1
+        self.total_correct += correct
+        for bit in range(3):
+            self.counts[bit] += (flags >> bit) & 1
+
+        # The first half holds the oldest size // 2 responses
+        target = self.size // 2
+        while self.first_size < target:
+            self.first_correct += self.correct[(self.head + self.first_size) % capacity]
+            self.first_size += 1
+        while self.first_size > target:
+            self.first_size -= 1
+            self.first_correct -= self.correct[(self.head + self.first_size) % capacity]
+
+    def decline(self) -> float:
+        """First-half minus second-half accuracy (nan while the first half is empty)"""
+        if self.first_size == 0:
+            return float('nan')
+        return (
+            self.first_correct / self.first_size
+            - (self.total_correct - self.first_correct) / (self.size - self.first_size)
+        )
+
+    def expire(self, cutoff: datetime):
+        while self.logins and self.logins[0] <= cutoff:
+            self.logins.popleft()
+        while self.sessions and self.sessions[0][0] <= cutoff:
+            self.session_minutes -= self.sessions.popleft()[1]
+        if not self.sessions:
+            self.session_minutes = 0.0
+
+class StreamingDisengagementDetector:
+    """
+    Disengagement behavior flags maintained per event
+
+    Event types (event['event_type']):
+    - 'response': is_correct, response_time, attempts, hints_used (default:
+      hints requested since the previous response)
+    - 'hint': a hint requested for the current question
+    - 'login'
+    - 'logout': duration (session length, minutes)
+
+    Login frequency and session duration cover the past week, so they are
+    only evaluated for students seeded with their history (warm_start) or
+    once the detector itself has run for a week.
+    """
+
+    def __init__(
+        self,
+        engine: Optional[EngagementDetectionEngine] = None,
+        window_size: int = 20,
+        activity_window: timedelta = timedelta(days=7),
+        on_change: Optional[Callable[[List[Dict]], None]] = None
+    ):
+        """
+        engine: thresholds and behavior records (default EngagementDetectionEngine())
+        window_size: responses kept per student (the recent_responses window)
+        on_change: called with the changes of every event that flips a behavior
+        """
+        if window_size < 2:
+            raise ValueError("window_size must be at least 2")
+        self.engine = engine or EngagementDetectionEngine()
+        self.window_size = window_size
+        self.activity_window = activity_window
+        self.on_change = on_change
+        self.started_at = datetime.utcnow()
+
+        self._students: Dict[str, _StudentStream] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._students)
+
+    # ------------------------------------------------------------------------
+    # Events
+    # ------------------------------------------------------------------------
+
+    def process(self, event: Dict) -> List[Dict]:
+        """Apply one event; returns the behavior changes it caused"""
+        with self._lock:
+            changes = self._apply(event)
+        if changes and self.on_change:
+            self.on_change(changes)
+        return changes
+
+    def process_many(self, events: Iterable[Dict]) -> List[Dict]:
+        """Apply events in order; returns all changes"""
+        with self._lock:
+            changes = [change for event in events for change in self._apply(event)]
+        if changes and self.on_change:
+            self.on_change(changes)
+        return changes
+
+    def warm_start(
+        self,
+        student_id: str,
+        recent_responses: Iterable[Dict] = (),
+        logins: Iterable[datetime] = (),
+        sessions: Iterable[tuple] = ()
+    ) -> List[Dict]:
+        """
+        Seed a student from stored history (oldest first) so weekly
+        behaviors are evaluated from the first live event
+
+        sessions: (ended_at, minutes) pairs
+        """
+        with self._lock:
+            stream = self._stream(student_id)
+            stream.seeded = True
+            for response in recent_responses:
+                self._push_response(stream, response)
+            stream.logins.extend(logins)
+            for ended_at, minutes in sessions:
+                stream.sessions.append((ended_at, float(minutes)))
+                stream.session_minutes += float(minutes)
+            changes = self._evaluate(student_id, stream, _RESPONSE_BEHAVIORS, datetime.utcnow())
+        if changes and self.on_change:
+            self.on_change(changes)
+        return changes
+
+    def sweep(self, now: Optional[datetime] = None) -> List[Dict]:
+        """
+        Expire week-old logins and sessions of every student, then forget
+        students without an event in the past week
+
+        Login frequency can drop without any new event; run periodically.
+        A forgotten student's last changes (e.g. LOW_LOGIN_FREQUENCY) are
+        still reported.
+        """
+        now = now or datetime.utcnow()
+        with self._lock:
+            changes = []
+            idle = []
+            for student_id, stream in self._students.items():
+                changes.extend(self._evaluate(student_id, stream, (), now))
+                if now - stream.last_event >= self.activity_window:
+                    idle.append(student_id)
+            for student_id in idle:
+                del self._students[student_id]
+        if changes and self.on_change:
+            self.on_change(changes)
+        return changes
+
+    def forget(self, student_id: str):
+        with self._lock:
+            self._students.pop(student_id, None)
+
+    # ------------------------------------------------------------------------
+    # Current state
+    # ------------------------------------------------------------------------
+
+    def behaviors(self, student_id: str) -> List[Dict]:
+        """Currently detected behaviors, as detect_disengagement_behaviors reports them"""
+        with self._lock:
+            stream = self._students.get(student_id)
+            if stream is None:
+                return []
+            return [
+                self.engine.behavior_record(behavior, severity, self._value(stream, behavior))
+                for behavior, severity in stream.severities.items()
+                if severity is not None
+            ]
+
+    # ------------------------------------------------------------------------
+    # Internals (callers hold self._lock)
+    # ------------------------------------------------------------------------
+
+    def _stream(self, student_id: str) -> _StudentStream:
+        stream = self._students.get(student_id)
+        if stream is None:
+            stream = self._students[student_id] = _StudentStream(self.window_size)
+        return stream
+
+    def _apply(self, event: Dict) -> List[Dict]:
+        student_id = event['student_id']
+        event_type = event['event_type']
+        # A future timestamp must not expire the current week
+        received = datetime.utcnow()
+        now = min(event.get('timestamp') or received, received)
+        stream = self._stream(student_id)
+        stream.last_event = max(stream.last_event, now)
+
+        if event_type == 'response':
+            self._push_response(stream, event)
+            affected = _RESPONSE_BEHAVIORS
+        elif event_type == 'hint':
+            stream.pending_hints += 1
+            affected = ()
+        elif event_type == 'login':
+            stream.logins.append(now)
+            affected = ()
+        elif event_type == 'logout':
+            minutes = float(event.get('duration') or 0.0)
+            stream.sessions.append((now, minutes))
+            stream.session_minutes += minutes
+            affected = ()
+        else:
+            raise ValueError(f"Unknown engagement event type: {event_type}")
+
+        return self._evaluate(student_id, stream, affected, now)
+
+    def _push_response(self, stream: _StudentStream, response: Dict):
+        engine = self.engine
+        hints_used = response.get('hints_used')
+        if hints_used is None:
+            hints_used = stream.pending_hints
+        stream.pending_hints = 0
+
+        flags = (
+            (response.get('response_time', float('inf')) < engine.QUICK_GUESS_THRESHOLD) << _StudentStream.QUICK
+            | (hints_used >= engine.MAX_HINTS) << _StudentStream.BOTTOM_OUT
+            | (response.get('attempts', 1) > engine.MANY_ATTEMPTS_THRESHOLD) << _StudentStream.MANY
+        )
+        stream.push(int(bool(response['is_correct'])), flags)
+
+    def _value(self, stream: _StudentStream, behavior: DisengagementBehavior) -> float:
+        if behavior == DisengagementBehavior.QUICK_GUESS:
+            return stream.counts[_StudentStream.QUICK]
+        if behavior == DisengagementBehavior.BOTTOM_OUT_HINT:
+            return stream.counts[_StudentStream.BOTTOM_OUT]
+        if behavior == DisengagementBehavior.MANY_ATTEMPTS:
+            return stream.counts[_StudentStream.MANY]
+        if behavior == DisengagementBehavior.DECLINING_PERFORMANCE:
+            return stream.decline()
+        if behavior == DisengagementBehavior.LOW_LOGIN_FREQUENCY:
+            return len(stream.logins)
+        return stream.session_minutes / len(stream.sessions)
+
+    def _evaluate(
+        self,
+        student_id: str,
+        stream: _StudentStream,
+        affected: Iterable[DisengagementBehavior],
+        now: datetime
+    ) -> List[Dict]:
+        """Re-evaluate the affected behaviors plus the weekly ones; report flips"""
+        stream.expire(now - self.activity_window)
+        behaviors = list(affected)
+        if stream.seeded or now - self.started_at >= self.activity_window:
+            behaviors.append(DisengagementBehavior.LOW_LOGIN_FREQUENCY)
+            behaviors.append(DisengagementBehavior.LONG_INACTIVITY)
+
+        changes = []
+        for behavior in behaviors:
+            # Session duration is unknown while no session has ended in the window
+            if behavior == DisengagementBehavior.LONG_INACTIVITY and not stream.sessions:
+                value, severity = None, None
+            else:
+                value = self._value(stream, behavior)
+                severity = self.engine.behavior_severity(behavior, value)
+            previous = stream.severities.get(behavior)
+            if severity == previous:
+                continue
+            stream.severities[behavior] = severity
+            if severity is None:
+                change = {
+                    'type': behavior,
+                    'severity': None,
+                    'detected_at': now.isoformat()
+                }
+            else:
+                change = self.engine.behavior_record(behavior, severity, value)
+            change.update(student_id=student_id, previous_severity=previous, active=severity is not None)
+            changes.append(change)
+        return changes
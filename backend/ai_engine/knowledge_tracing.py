@@ -9,11 +9,15 @@ Research Sources:
 - Paper 6.pdf: Adaptive Learning Pathways
 """
 
+import threading
 import numpy as np
-from typing import Dict, List, Tuple, Optional
+from array import array
+from typing import Callable, Dict, Iterable, List, Tuple, Optional, Sequence, Union
 from dataclasses import dataclass
 from enum import Enum
 
+from utils.cache import LRUCache
+
 # ============================================================================
 # LAYER 1: BAYESIAN KNOWLEDGE TRACING (BKT) - For Interpretability
 # ============================================================================
@@ -48,75 +52,221 @@ class BKTEngine:
     def update_mastery(
         self, 
         current_mastery: float, 
-        is_correct: bool
+        is_correct: bool,
+        params: Optional[BKTParameters] = None
     ) -> float:
         """
         Update mastery probability based on student response
         
+        params: per-concept fitted parameters (defaults to self.params)
+        
         Returns: Updated mastery score (0-100 scale)
         """
+        params = params or self.params
         p_l = current_mastery / 100.0  # Convert to probability
         
         if is_correct:
             # P(L|correct) using Bayes' theorem
-            numerator = p_l * (1 - self.params.p_s)
+            numerator = p_l * (1 - params.p_s)
             denominator = (
-                p_l * (1 - self.params.p_s) + 
-                (1 - p_l) * self.params.p_g
+                p_l * (1 - params.p_s) + 
+                (1 - p_l) * params.p_g
             )
             p_l_given_correct = numerator / denominator if denominator > 0 else p_l
             
             # Apply learning transition
-            p_l_new = p_l_given_correct + (1 - p_l_given_correct) * self.params.p_t
+            p_l_new = p_l_given_correct + (1 - p_l_given_correct) * params.p_t
         else:
             # P(L|incorrect) using Bayes' theorem
-            numerator = p_l * self.params.p_s
+            numerator = p_l * params.p_s
             denominator = (
-                p_l * self.params.p_s + 
-                (1 - p_l) * (1 - self.params.p_g)
+                p_l * params.p_s + 
+                (1 - p_l) * (1 - params.p_g)
             )
             p_l_given_incorrect = numerator / denominator if denominator > 0 else p_l
             
             # Apply learning transition
-            p_l_new = p_l_given_incorrect + (1 - p_l_given_incorrect) * self.params.p_t
+            p_l_new = p_l_given_incorrect + (1 - p_l_given_incorrect) * params.p_t
         
         # Convert back to 0-100 scale
         return min(100.0, max(0.0, p_l_new * 100))
 
+    def update_mastery_batch(
+        self,
+        current_mastery: np.ndarray,
+        is_correct: np.ndarray,
+        params: Optional[Union[BKTParameters, Sequence[BKTParameters]]] = None
+    ) -> np.ndarray:
+        """
+        Vectorized update_mastery over many (student, concept) pairs at once
+
+        current_mastery: mastery values on the 0-100 scale, shape (N,)
+        is_correct: correctness flags, shape (N,)
+        params: one BKTParameters for every row, or one per row (e.g. the
+                fitted parameters of each row's concept). Defaults to
+                self.params.
+
+        Returns: Updated mastery scores (0-100 scale), shape (N,)
+        """
+        p_l = np.asarray(current_mastery, dtype=np.float64) / 100.0
+        correct = np.asarray(is_correct, dtype=bool)
+        p_t, p_g, p_s = self._parameter_arrays(params, p_l.shape)
+
+        # Both Bayes branches share the form a / (a + b); select per row
+        evidence_known = np.where(correct, 1 - p_s, p_s)
+        evidence_unknown = np.where(correct, p_g, 1 - p_g)
+        numerator = p_l * evidence_known
+        denominator = numerator + (1 - p_l) * evidence_unknown
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            p_l_posterior = np.where(
+                denominator > 0,
+                numerator / denominator,
+                p_l
+            )
+
+        # Apply learning transition
+        p_l_new = p_l_posterior + (1 - p_l_posterior) * p_t
+
+        return np.clip(p_l_new * 100, 0.0, 100.0)
+
+    def _parameter_arrays(
+        self,
+        params: Optional[Union[BKTParameters, Sequence[BKTParameters]]],
+        shape: Tuple[int, ...]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Broadcast BKT parameters to per-row (p_t, p_g, p_s) arrays"""
+        if params is None:
+            params = self.params
+
+        if isinstance(params, BKTParameters):
+            return (
+                np.full(shape, params.p_t),
+                np.full(shape, params.p_g),
+                np.full(shape, params.p_s)
+            )
+
+        if len(params) != int(np.prod(shape)):
+            raise ValueError(
+                f"Expected {int(np.prod(shape))} BKTParameters, got {len(params)}"
+            )
+
+        return (
+            np.array([p.p_t for p in params], dtype=np.float64).reshape(shape),
+            np.array([p.p_g for p in params], dtype=np.float64).reshape(shape),
+            np.array([p.p_s for p in params], dtype=np.float64).reshape(shape)
+        )
+
 # ============================================================================
 # LAYER 2: DEEP KNOWLEDGE TRACING (DKT) - Simulated with Pattern Recognition
 # ============================================================================
 
+@dataclass
+class DKTWeights:
+    """
+    Trained LSTM weights for DKT inference
+    
+    Gates are stacked in PyTorch order (input, forget, cell, output).
+    Input x(t) is the standard DKT one-hot of (skill, correctness):
+    index = skill + num_skills × is_correct
+    
+    Skill i is the i-th concept of the training vocabulary (skills);
+    a single-skill model needs no vocabulary.
+    """
+    W_x: np.ndarray   # (4H, 2 × num_skills) input-to-gates
+    W_h: np.ndarray   # (4H, H) hidden-to-gates
+    b: np.ndarray     # (4H,) gate bias
+    W_y: np.ndarray   # (num_skills, H) hidden-to-output
+    b_y: np.ndarray   # (num_skills,) output bias
+    skills: Optional['ConceptIndex'] = None   # concept_id -> skill index
+    
+    @classmethod
+    def load(cls, path: str) -> 'DKTWeights':
+        """
+        Load weights from an .npz file with keys W_x, W_h, b, W_y, b_y and
+        concept_ids (the concept of each skill, in skill order)
+        """
+        with np.load(path) as data:
+            weights = cls(**{
+                key: data[key].astype(np.float32)
+                for key in ('W_x', 'W_h', 'b', 'W_y', 'b_y')
+            })
+            concept_ids = [str(c) for c in data['concept_ids']] if 'concept_ids' in data else None
+        
+        hidden = weights.hidden_size
+        if weights.W_h.shape != (4 * hidden, hidden) or weights.b.shape != (4 * hidden,):
+            raise ValueError(f"Inconsistent LSTM weight shapes in {path}")
+        if weights.W_x.shape != (4 * hidden, 2 * weights.num_skills):
+            raise ValueError(f"W_x must have shape (4H, 2 × num_skills) in {path}")
+        if concept_ids is not None:
+            if len(set(concept_ids)) != weights.num_skills or len(concept_ids) != weights.num_skills:
+                raise ValueError(f"concept_ids must list num_skills distinct concepts in {path}")
+            weights.skills = ConceptIndex()
+            for concept_id in concept_ids:
+                weights.skills.intern(concept_id)
+        elif weights.num_skills > 1:
+            raise ValueError(f"Multi-skill weights need concept_ids (skill order) in {path}")
+        return weights
+    
+    def skill_index(self, concept_id: Optional[str]) -> int:
+        """Skill of a concept, -1 if the model was not trained on it"""
+        if self.skills is None:
+            return 0
+        return self.skills.lookup(concept_id) if concept_id is not None else -1
+    
+    @property
+    def hidden_size(self) -> int:
+        return self.W_y.shape[1]
+    
+    @property
+    def num_skills(self) -> int:
+        return self.W_y.shape[0]
+
 class DKTEngine:
     """
     Deep Knowledge Tracing (Simplified LSTM Logic)
     
-    In production, this would use PyTorch/TensorFlow LSTM networks.
-    For prototype: Pattern-based simulation that captures temporal dependencies.
+    With weights_path set, predictions come from a real LSTM (NumPy inference
+    over DKTWeights). Otherwise a pattern-based simulation that captures
+    temporal dependencies is used.
     
     Formula concept from Paper 2105_15106v4.pdf:
     h(t) = tanh(W_hs·x(t) + W_hh·h(t-1) + b_h)
     y(t) = σ(W_yh·h(t) + b_y)
     """
     
-    def __init__(self, sequence_length: int = 10):
+    def __init__(self, sequence_length: int = 10, weights_path: Optional[str] = None):
         self.sequence_length = sequence_length
         self.history_weight = 0.7  # Weight for historical performance
         self.trend_weight = 0.3    # Weight for recent trend
+        self.weights = DKTWeights.load(weights_path) if weights_path else None
     
     def analyze_pattern(
         self, 
-        response_history: List[Dict[str, any]]
+        response_history: List[Dict[str, any]],
+        concept_id: Optional[str] = None
     ) -> Dict[str, float]:
         """
         Analyze response patterns to predict mastery
         
+        concept_id: concept the history belongs to; with weights loaded the
+                    LSTM predicts its skill (concepts outside the training
+                    vocabulary use the pattern model)
+        
         Returns: {
             'predicted_mastery': float,
             'confidence': float,
             'learning_velocity': float
         }
         """
+        if self.weights is not None:
+            skill = self.weights.skill_index(concept_id)
+            if skill >= 0:
+                return self.analyze_batch([response_history], [skill])[0]
+        return self._pattern_analysis(response_history)
+    
+    def _pattern_analysis(self, response_history: List[Dict[str, any]]) -> Dict[str, float]:
+        """Pattern-based simulation used without (applicable) LSTM weights"""
         if not response_history:
             return {
                 'predicted_mastery': 30.0,
@@ -164,11 +314,456 @@ class DKTEngine:
             'confidence': confidence,
             'learning_velocity': velocity
         }
+    
+    def analyze_state(self, state: 'DKTState', concept_id: Optional[str] = None) -> Dict[str, float]:
+        """
+        Same result as analyze_pattern over the state's window, in O(1)
+        
+        Uses the running sums kept by DKTState instead of rescanning the
+        response history.
+        """
+        if self.weights is not None and self.weights.skill_index(concept_id) >= 0:
+            return self.analyze_pattern(state.as_history(), concept_id)
+        
+        n = state.count
+        if n == 0:
+            return {
+                'predicted_mastery': 30.0,
+                'confidence': 0.3,
+                'learning_velocity': 0.0
+            }
+        
+        overall_accuracy = state.sum_correct / n * 100
+        
+        if n >= 3:
+            mid = n // 2
+            first_half = state.first_half_correct / mid
+            second_half = (state.sum_correct - state.first_half_correct) / (n - mid)
+            velocity = (second_half - first_half) * 100
+        else:
+            velocity = 0.0
+        
+        avg_time = state.sum_time / n
+        time_factor = max(0, min(20, 20 - avg_time/2))
+        
+        predicted_mastery = min(100, (
+            overall_accuracy * self.history_weight +
+            (50 + velocity * 2) * self.trend_weight +
+            time_factor
+        ))
+        
+        return {
+            'predicted_mastery': predicted_mastery,
+            'confidence': min(1.0, n / self.sequence_length),
+            'learning_velocity': velocity
+        }
+    
+    def analyze_batch(
+        self,
+        histories: List[List[Dict[str, any]]],
+        skill_ids: Optional[List[int]] = None,
+        concept_ids: Optional[List[str]] = None
+    ) -> List[Dict[str, float]]:
+        """
+        Analyze many students' histories in one call (e.g. a whole class)
+        
+        Uses the LSTM when weights are loaded; confidence and learning
+        velocity keep the same definitions as analyze_pattern.
+        
+        skill_ids / concept_ids: skill, or concept mapped to its skill, to
+                   predict for each history (default: skill 0 of a
+                   single-skill model). Histories whose concept is not in
+                   the training vocabulary use the pattern model.
+        """
+        if self.weights is None:
+            return [self._pattern_analysis(history) for history in histories]
+        
+        if skill_ids is None:
+            skill_ids = [
+                self.weights.skill_index(concept_id)
+                for concept_id in (concept_ids or [None] * len(histories))
+            ]
+        skill_ids = np.asarray(skill_ids, dtype=np.int64)
+        known = np.flatnonzero(skill_ids >= 0)
+        
+        predictions = np.zeros(len(histories))
+        if len(known):
+            predictions[known] = self.predict_batch(
+                [histories[i] for i in known], skill_ids[known]
+            ) * 100
+        
+        results = []
+        for history, prediction, skill in zip(histories, predictions, skill_ids):
+            if skill < 0:
+                results.append(self._pattern_analysis(history))
+                continue
+            if not history:
+                results.append({
+                    'predicted_mastery': 30.0,
+                    'confidence': 0.3,
+                    'learning_velocity': 0.0
+                })
+                continue
+            
+            recent = history[-self.sequence_length:]
+            accuracies = [r['is_correct'] for r in recent]
+            if len(accuracies) >= 3:
+                first_half = np.mean(accuracies[:len(accuracies)//2])
+                second_half = np.mean(accuracies[len(accuracies)//2:])
+                velocity = (second_half - first_half) * 100
+            else:
+                velocity = 0.0
+            
+            results.append({
+                'predicted_mastery': float(prediction),
+                'confidence': min(1.0, len(recent) / self.sequence_length),
+                'learning_velocity': velocity
+            })
+        
+        return results
+    
+    def predict_batch(
+        self,
+        histories: List[List[Dict[str, any]]],
+        skill_ids: Optional[List[int]] = None
+    ) -> np.ndarray:
+        """
+        LSTM forward pass over B students × T steps
+        
+        Ragged histories are right-padded; padded steps are masked so each
+        student's state stops updating after its last real response.
+        
+        skill_ids: target skill of each history (default 0). A response is
+        encoded at its 'skill_index', else its 'concept_id''s skill, else
+        the history's target skill.
+        
+        Returns: P(correct on next item of the target skill), shape (B,)
+        """
+        if self.weights is None:
+            raise RuntimeError("DKT weights not loaded (set weights_path)")
+        
+        weights = self.weights
+        targets = (
+            np.zeros(len(histories), dtype=np.int64) if skill_ids is None
+            else np.asarray(skill_ids, dtype=np.int64)
+        )
+        inputs, mask = self._encode_batch(histories, targets)
+        batch_size, steps = inputs.shape
+        hidden = weights.hidden_size
+        
+        # x(t) is one-hot, so W_x·x(t) is a column lookup for all steps at once
+        input_gates = weights.W_x.T[inputs] + weights.b     # (B, T, 4H)
+        W_h_T = weights.W_h.T
+        
+        h = np.zeros((batch_size, hidden), dtype=np.float32)
+        c = np.zeros((batch_size, hidden), dtype=np.float32)
+        
+        for t in range(steps):
+            gates = input_gates[:, t] + h @ W_h_T           # one matmul per step
+            i_gate = _sigmoid(gates[:, :hidden])
+            f_gate = _sigmoid(gates[:, hidden:2 * hidden])
+            g_gate = np.tanh(gates[:, 2 * hidden:3 * hidden])
+            o_gate = _sigmoid(gates[:, 3 * hidden:])
+            
+            c_new = f_gate * c + i_gate * g_gate
+            h_new = o_gate * np.tanh(c_new)
+            
+            step_mask = mask[:, t:t + 1]
+            c = np.where(step_mask, c_new, c)
+            h = np.where(step_mask, h_new, h)
+        
+        # y(t) = σ(W_yh·h(t) + b_y), read at each student's target skill
+        outputs = _sigmoid(h @ weights.W_y.T + weights.b_y)
+        return outputs[np.arange(batch_size), targets].astype(np.float64)
+    
+    def _encode_batch(
+        self,
+        histories: List[List[Dict[str, any]]],
+        targets: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Encode histories as padded one-hot indices (B, T) plus a validity mask"""
+        num_skills = self.weights.num_skills
+        steps = max((len(h) for h in histories), default=0)
+        
+        inputs = np.zeros((len(histories), steps), dtype=np.int64)
+        mask = np.zeros((len(histories), steps), dtype=bool)
+        
+        for row, history in enumerate(histories):
+            n = len(history)
+            if n == 0:
+                continue
+            skills = np.fromiter(
+                (self._response_skill(r, targets[row]) for r in history), dtype=np.int64, count=n
+            )
+            correct = np.fromiter((bool(r['is_correct']) for r in history), dtype=np.int64, count=n)
+            inputs[row, :n] = skills + num_skills * correct
+            mask[row, :n] = True
+        
+        return inputs, mask
+    
+    def _response_skill(self, response: Dict[str, any], target: int) -> int:
+        """Encoded skill of one response (the history's target if unmapped)"""
+        skill = response.get('skill_index')
+        if skill is None and 'concept_id' in response:
+            skill = self.weights.skill_index(response['concept_id'])
+        return target if skill is None or skill < 0 else skill
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    """Numerically stable logistic function"""
+    return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+class DKTState:
+    """
+    Running DKT window for one (student, concept) pair
+    
+    Keeps the last `capacity` responses in a ring buffer together with the
+    sums analyze_pattern needs (correct count, response time, correct count
+    in the first half of the window), so each new response is O(1).
+    
+    version is the token of the persisted copy the window matches (set by
+    the writer); a cached window whose version differs from the stored one
+    is stale.
+    """
+    __slots__ = (
+        'capacity', 'correct', 'times', 'start', 'count',
+        'sum_correct', 'sum_time', 'first_half_correct', 'total_responses', 'version'
+    )
+    
+    def __init__(self, capacity: int = 10):
+        self.capacity = capacity
+        self.correct = bytearray(capacity)
+        self.times = array('d', bytes(8 * capacity))
+        self.start = 0                # ring index of the oldest response
+        self.count = 0                # responses currently in the window
+        self.sum_correct = 0
+        self.sum_time = 0.0
+        self.first_half_correct = 0   # correct answers in window[:count // 2]
+        self.total_responses = 0      # lifetime responses for the pair
+        self.version: Optional[str] = None
+    
+    def _at(self, position: int) -> int:
+        """Ring index of the window's position-th oldest response"""
+        return (self.start + position) % self.capacity
+    
+    def push(self, is_correct: bool, response_time: float):
+        """Add a response, dropping the oldest once the window is full"""
+        correct = 1 if is_correct else 0
+        
+        if self.count < self.capacity:
+            self.correct[self._at(self.count)] = correct
+            self.times[self._at(self.count)] = response_time
+            self.count += 1
+            # Window grew to an even length: the split point moves right by one
+            if self.count % 2 == 0:
+                self.first_half_correct += self.correct[self._at(self.count // 2 - 1)]
+        else:
+            mid = self.count // 2
+            oldest = self._at(0)
+            self.sum_correct -= self.correct[oldest]
+            self.sum_time -= self.times[oldest]
+            if mid > 0:
+                # Oldest leaves the first half; window[mid] shifts into it
+                self.first_half_correct += self.correct[self._at(mid)] - self.correct[oldest]
+            
+            self.correct[oldest] = correct
+            self.times[oldest] = response_time
+            self.start = (self.start + 1) % self.capacity
+            
+            if self.start == 0:
+                # Resync once per lap so float drift in the running sum stays bounded
+                self.sum_time = sum(self.times) - response_time
+        
+        self.sum_correct += correct
+        self.sum_time += response_time
+        self.total_responses += 1
+    
+    def as_history(self) -> List[Dict[str, any]]:
+        """Window as a response_history list (oldest first)"""
+        return [
+            {
+                'is_correct': bool(self.correct[self._at(i)]),
+                'response_time': self.times[self._at(i)]
+            }
+            for i in range(self.count)
+        ]
+    
+    def to_document(self) -> Dict[str, any]:
+        """Compact MongoDB representation (stored on the mastery document)"""
+        document = {
+            'correct': bytes(self.correct[self._at(i)] for i in range(self.count)),
+            'times': [self.times[self._at(i)] for i in range(self.count)],
+            'total_responses': self.total_responses
+        }
+        if self.version is not None:
+            document['version'] = self.version
+        return document
+    
+    @classmethod
+    def from_document(cls, document: Dict[str, any], capacity: int = 10) -> 'DKTState':
+        state = cls(capacity)
+        for correct, response_time in zip(document.get('correct', b''), document.get('times', [])):
+            state.push(bool(correct), response_time)
+        state.total_responses = document.get('total_responses', state.count)
+        state.version = document.get('version')
+        return state
+    
+    @classmethod
+    def from_history(cls, response_history: List[Dict[str, any]], capacity: int = 10) -> 'DKTState':
+        state = cls(capacity)
+        for r in response_history[-capacity:]:
+            state.push(r['is_correct'], r.get('response_time', 0.0))
+        state.total_responses = len(response_history)
+        return state
 
 # ============================================================================
 # LAYER 3: MEMORY-AWARE KNOWLEDGE TRACING (DKVMN) - Concept Relationships
 # ============================================================================
 
+class ConceptIndex:
+    """
+    Interns concept_id strings to dense integer indices
+    
+    Lets per-concept state live in flat NumPy arrays instead of dicts
+    keyed by strings.
+    """
+    __slots__ = ('_ids', '_index')
+    
+    def __init__(self):
+        self._ids: List[str] = []
+        self._index: Dict[str, int] = {}
+    
+    def intern(self, concept_id: str) -> int:
+        """Index of concept_id, assigning the next free index if new"""
+        idx = self._index.get(concept_id)
+        if idx is None:
+            idx = len(self._ids)
+            self._index[concept_id] = idx
+            self._ids.append(concept_id)
+        return idx
+    
+    def lookup(self, concept_id: str) -> int:
+        """Index of concept_id, or -1 if it was never interned"""
+        return self._index.get(concept_id, -1)
+    
+    def lookup_many(self, concept_ids: Sequence[str]) -> np.ndarray:
+        return np.fromiter(
+            (self._index.get(c, -1) for c in concept_ids),
+            dtype=np.int64,
+            count=len(concept_ids)
+        )
+    
+    def concept_id(self, idx: int) -> str:
+        return self._ids[idx]
+    
+    def __len__(self) -> int:
+        return len(self._ids)
+
+class DKVMNMemory:
+    """
+    Value memory M_v for one student
+    
+    float32 mastery per interned concept plus a mask of concepts that have
+    been written; a few KB even for thousands of concepts.
+    """
+    __slots__ = ('values', 'known')
+    
+    def __init__(self, capacity: int = 64):
+        self.values = np.full(capacity, 30.0, dtype=np.float32)
+        self.known = np.zeros(capacity, dtype=bool)
+    
+    def ensure_capacity(self, size: int):
+        """Grow (by doubling) so that indices < size are addressable"""
+        capacity = len(self.values)
+        if size <= capacity:
+            return
+        new_capacity = max(size, 2 * capacity)
+        values = np.full(new_capacity, 30.0, dtype=np.float32)
+        known = np.zeros(new_capacity, dtype=bool)
+        values[:capacity] = self.values
+        known[:capacity] = self.known
+        self.values, self.known = values, known
+    
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.known.nbytes
+
+class KeyMemory:
+    """
+    Key memory M_k: sparse concept-correlation weights
+    
+    Only pairs that were set are stored, as CSR in flattened form: int64
+    keys `row << 32 | col`, sorted (row-major), with float32 weights.
+    Every other pair reads as `default`, so memory grows with the linked
+    pairs rather than with concepts squared. New pairs are staged in a dict
+    and merged into the sorted arrays before the next lookup.
+    """
+    __slots__ = ('default', '_keys', '_weights', '_pending', '_lock')
+    
+    def __init__(self, default: float):
+        self.default = default
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._weights = np.zeros(0, dtype=np.float32)
+        self._pending: Dict[int, float] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, row: int, col: int) -> float:
+        return float(self.lookup(np.array([row]), np.array([col]))[0])
+    
+    def set(self, row: int, col: int, weight: float):
+        key = (row << 32) | col
+        with self._lock:
+            pos = self._position(key)
+            if pos >= 0:
+                self._weights[pos] = weight
+            else:
+                self._pending[key] = weight
+    
+    def setdefault(self, row: int, col: int, weight: float):
+        """Set the weight of a pair that has none yet"""
+        key = (row << 32) | col
+        with self._lock:
+            if self._position(key) < 0:
+                self._pending.setdefault(key, weight)
+    
+    def lookup(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """float32 weights of (rows[i], cols[i]) pairs"""
+        with self._lock:
+            self._merge()
+            keys, weights = self._keys, self._weights
+        result = np.full(len(rows), self.default, dtype=np.float32)
+        if len(keys) == 0 or len(rows) == 0:
+            return result
+        wanted = (np.asarray(rows, dtype=np.int64) << 32) | np.asarray(cols, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)
+        hit = keys[pos] == wanted
+        result[hit] = weights[pos[hit]]
+        return result
+    
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._pending)
+    
+    @property
+    def nbytes(self) -> int:
+        return self._keys.nbytes + self._weights.nbytes
+    
+    def _position(self, key: int) -> int:
+        """Index of a merged key, or -1 (caller holds self._lock)"""
+        pos = int(np.searchsorted(self._keys, key))
+        return pos if pos < len(self._keys) and self._keys[pos] == key else -1
+    
+    def _merge(self):
+        """Fold staged pairs into the sorted arrays (caller holds self._lock)"""
+        if not self._pending:
+            return
+        keys = np.concatenate([self._keys, np.fromiter(self._pending, dtype=np.int64, count=len(self._pending))])
+        weights = np.concatenate([
+            self._weights,
+            np.fromiter(self._pending.values(), dtype=np.float32, count=len(self._pending))
+        ])
+        order = np.argsort(keys, kind='stable')
+        self._keys, self._weights = keys[order], weights[order]
+        self._pending.clear()
+
 class DKVMNEngine:
     """
     Dynamic Key-Value Memory Network (Simplified)
@@ -179,83 +774,149 @@ class DKVMNEngine:
     w(t) = Softmax(k(t)·M_k)  -- Correlation weight
     r(t) = Σ w(t,i)·M_v(i)    -- Read operation
     M_v(i) = M_v(i) + w(t,i)·add(t)  -- Write operation
+    
+    Concepts are interned to integer indices. Key memory M_k holds sparse
+    concept correlations (KeyMemory, DEFAULT_CORRELATION for unlinked
+    pairs) and value memory M_v a float32 array (DKVMNMemory), so a read
+    is a masked weighted dot product:
+    r = (w ⊙ mask) · M_v / |mask| over the known related concepts.
     """
     
+    DEFAULT_CORRELATION = 0.3   # Unlinked concept pairs
+    LINKED_CORRELATION = 0.5    # Pairs linked by a write
+    
     def __init__(self, memory_size: int = 50):
         self.memory_size = memory_size
-        # Key memory: Concept relationships
-        self.key_memory = {}
-        # Value memory: Mastery states
-        self.value_memory = {}
+        self.concepts = ConceptIndex()
+        # Key memory: concept correlations (row = concept, col = related)
+        self.key_memory = KeyMemory(self.DEFAULT_CORRELATION)
+        # Value memory: mastery states (used when no per-student memory is passed)
+        self.value_memory = DKVMNMemory(memory_size)
+    
+    def intern_concept(self, concept_id: str) -> int:
+        """Index of a concept, interning it if new"""
+        return self.concepts.intern(concept_id)
     
-    def read_mastery(self, concept_id: str, related_concepts: List[str]) -> float:
+    def set_correlation(self, concept_a: str, concept_b: str, weight: float):
+        """Set the key-memory correlation weight of concept_b for reads of concept_a"""
+        a, b = self.intern_concept(concept_a), self.intern_concept(concept_b)
+        self.key_memory.set(a, b, weight)
+    
+    def read_mastery(
+        self,
+        concept_id: str,
+        related_concepts: List[str],
+        memory: Optional[DKVMNMemory] = None
+    ) -> float:
         """
         Read mastery considering related concepts
         
         BR3: Identifies what's mastered vs. what needs work
         """
-        if concept_id not in self.value_memory:
-            return 30.0  # Default initial mastery
+        return float(self.read_mastery_many([concept_id], [related_concepts], memory)[0])
+    
+    def read_mastery_many(
+        self,
+        concept_ids: List[str],
+        related_concepts: List[List[str]],
+        memory: Optional[DKVMNMemory] = None
+    ) -> np.ndarray:
+        """
+        Vectorized read_mastery for many concepts of one student
         
-        # Direct mastery
-        direct_mastery = self.value_memory[concept_id]
+        Returns: mastery per concept (0-100), shape (len(concept_ids),)
+        """
+        memory = memory or self.value_memory
+        memory.ensure_capacity(len(self.concepts))
         
-        # Weighted contribution from related concepts
-        related_mastery = []
-        for rel_concept in related_concepts:
-            if rel_concept in self.value_memory:
-                weight = self._calculate_correlation(concept_id, rel_concept)
-                related_mastery.append(self.value_memory[rel_concept] * weight)
+        targets = self.concepts.lookup_many(concept_ids)
+        result = np.full(len(concept_ids), 30.0)  # Default initial mastery
+        
+        found = targets >= 0
+        found[found] = memory.known[targets[found]]
+        if not found.any():
+            return result
+        
+        # Flatten (row, related concept) pairs, keeping only written concepts
+        rows = np.repeat(np.arange(len(concept_ids)), [len(r) for r in related_concepts])
+        related = self.concepts.lookup_many([c for rel in related_concepts for c in rel])
+        keep = found[rows] & (related >= 0)
+        keep[keep] = memory.known[related[keep]]
+        rows, related = rows[keep], related[keep]
         
-        if related_mastery:
-            # Combine direct and related mastery
-            return 0.7 * direct_mastery + 0.3 * np.mean(related_mastery)
+        # Weighted contribution from related concepts
+        weighted = (
+            self.key_memory.lookup(targets[rows], related).astype(np.float64) *
+            memory.values[related]
+        )
+        totals = np.bincount(rows, weights=weighted, minlength=len(concept_ids))
+        counts = np.bincount(rows, minlength=len(concept_ids))
         
-        return direct_mastery
+        direct = memory.values[targets[found]].astype(np.float64)
+        has_related = counts[found] > 0
+        result[found] = np.where(
+            has_related,
+            0.7 * direct + 0.3 * totals[found] / np.maximum(counts[found], 1),
+            direct
+        )
+        return result
     
     def write_mastery(
         self, 
         concept_id: str, 
         mastery_update: float,
-        related_concepts: List[str]
+        related_concepts: List[str],
+        memory: Optional[DKVMNMemory] = None
     ):
         """
         Update mastery and propagate to related concepts
         """
-        # Update primary concept
-        if concept_id not in self.value_memory:
-            self.value_memory[concept_id] = 30.0
+        memory = memory or self.value_memory
         
-        self.value_memory[concept_id] = mastery_update
+        # Update primary concept
+        idx = self.intern_concept(concept_id)
+        memory.ensure_capacity(len(self.concepts))
+        memory.values[idx] = mastery_update
+        memory.known[idx] = True
         
-        # Store relationship keys
+        # Store relationship keys (weights seeded from the prerequisite
+        # graph are kept)
         for rel_concept in related_concepts:
-            key = f"{concept_id}_{rel_concept}"
-            if key not in self.key_memory:
-                self.key_memory[key] = 0.5  # Default correlation
+            self.key_memory.setdefault(idx, self.intern_concept(rel_concept), self.LINKED_CORRELATION)
     
     def _calculate_correlation(self, concept_a: str, concept_b: str) -> float:
         """Calculate correlation weight between concepts"""
-        key = f"{concept_a}_{concept_b}"
-        return self.key_memory.get(key, 0.3)
+        a, b = self.concepts.lookup(concept_a), self.concepts.lookup(concept_b)
+        if a < 0 or b < 0:
+            return self.DEFAULT_CORRELATION
+        return self.key_memory.get(a, b)
     
-    def get_mastered_concepts(self, threshold: float = 85.0) -> List[str]:
+    def get_mastered_concepts(
+        self,
+        threshold: float = 85.0,
+        memory: Optional[DKVMNMemory] = None
+    ) -> List[str]:
         """
         BR3: Identify mastered concepts to skip
         """
-        return [
-            concept for concept, mastery in self.value_memory.items()
-            if mastery >= threshold
-        ]
+        memory = memory or self.value_memory
+        n = min(len(self.concepts), len(memory.values))
+        mask = memory.known[:n] & (memory.values[:n] >= threshold)
+        return [self.concepts.concept_id(i) for i in np.flatnonzero(mask)]
     
-    def get_weak_concepts(self, threshold: float = 60.0) -> List[str]:
+    def get_weak_concepts(
+        self,
+        threshold: float = 60.0,
+        memory: Optional[DKVMNMemory] = None
+    ) -> List[str]:
         """
         BR3: Identify weak concepts needing focus
         """
-        return [
-            concept for concept, mastery in self.value_memory.items()
-            if mastery < threshold
-        ]
+        memory = memory or self.value_memory
+        n = min(len(self.concepts), len(memory.values))
+        mask = memory.known[:n] & (memory.values[:n] < threshold)
+        return [self.concepts.concept_id(i) for i in np.flatnonzero(mask)]
+
 
 # ============================================================================
 # HYBRID MODEL ORCHESTRATOR
@@ -268,10 +929,42 @@ class HybridKnowledgeTracing:
     Solves BR1, BR2, BR3 comprehensively
     """
     
-    def __init__(self):
+    def __init__(
+        self,
+        dkt_weights_path: Optional[str] = None,
+        dkt_sequence_length: int = 10,
+        state_cache_size: int = 100000,
+        state_loader: Optional[Callable[[str, str], Optional[DKTState]]] = None
+    ):
         self.bkt = BKTEngine()
-        self.dkt = DKTEngine()
+        self.dkt = DKTEngine(sequence_length=dkt_sequence_length, weights_path=dkt_weights_path)
         self.dkvmn = DKVMNEngine()
+        # Incremental DKT windows per (student_id, concept_id)
+        self.dkt_states = LRUCache(state_cache_size)
+        # Loads persisted state on a cache miss (e.g. from MongoDB)
+        self.state_loader = state_loader
+    
+    def get_dkt_state(self, student_id: str, concept_id: str) -> DKTState:
+        """Cached DKT state for a pair, loading or creating it on a miss"""
+        key = (student_id, concept_id)
+        state = self.dkt_states.get(key)
+        
+        if state is None:
+            if self.state_loader:
+                state = self.state_loader(student_id, concept_id)
+            if state is None:
+                state = DKTState(self.dkt.sequence_length)
+            self.dkt_states.put(key, state)
+        
+        return state
+    
+    def invalidate_dkt_states(self, student_ids: Optional[Iterable[str]] = None):
+        """Drop cached DKT windows of some students (None = all), e.g. after a recalculation"""
+        if student_ids is None:
+            self.dkt_states.clear()
+            return
+        student_ids = set(student_ids)
+        self.dkt_states.discard_where(lambda key: key[0] in student_ids)
     
     def calculate_mastery(
         self,
@@ -280,22 +973,85 @@ class HybridKnowledgeTracing:
         is_correct: bool,
         response_time: float,
         current_mastery: float,
-        response_history: List[Dict],
-        related_concepts: List[str]
+        response_history: Optional[List[Dict]],
+        related_concepts: List[str],
+        bkt_params: Optional[BKTParameters] = None,
+        dkvmn_memory: Optional[DKVMNMemory] = None
     ) -> Dict[str, any]:
         """
         Calculate updated mastery using all three models
         
+        response_history: full client-supplied history, or None to use the
+                          incremental DKT state (the current response is
+                          appended to it)
+        bkt_params: fitted parameters for this concept, if available
+        dkvmn_memory: the student's own DKVMN value memory; defaults to the
+                      engine-wide memory
+        
         Returns comprehensive mastery assessment
         """
         # Layer 1: BKT update (interpretable)
-        bkt_mastery = self.bkt.update_mastery(current_mastery, is_correct)
+        bkt_mastery = self.bkt.update_mastery(current_mastery, is_correct, bkt_params)
         
         # Layer 2: DKT pattern analysis
-        dkt_analysis = self.dkt.analyze_pattern(response_history)
+        if response_history is None:
+            state = self.get_dkt_state(student_id, concept_id)
+            state.push(is_correct, response_time)
+            dkt_analysis = self.dkt.analyze_state(state, concept_id)
+        else:
+            dkt_analysis = self.dkt.analyze_pattern(response_history, concept_id)
         
+        return self._combine(
+            concept_id, bkt_mastery, dkt_analysis, related_concepts, dkvmn_memory
+        )
+    
+    def calculate_mastery_batch(
+        self,
+        student_ids: List[str],
+        concept_ids: List[str],
+        is_correct: np.ndarray,
+        response_times: np.ndarray,
+        current_mastery: np.ndarray,
+        related_concepts: List[List[str]],
+        bkt_params: Optional[Sequence[BKTParameters]] = None,
+        dkvmn_memories: Optional[List[DKVMNMemory]] = None
+    ) -> List[Dict[str, any]]:
+        """
+        calculate_mastery for many responses using incremental DKT state
+        
+        Rows must belong to distinct (student, concept) pairs, since each
+        row's current_mastery is the pair's mastery before the batch. The BKT
+        layer runs as one vectorized pass; DKT and DKVMN are applied row by
+        row in order, so results equal calling calculate_mastery per row.
+        """
+        bkt_mastery = self.bkt.update_mastery_batch(current_mastery, is_correct, bkt_params)
+        
+        results = []
+        for i, (student_id, concept_id) in enumerate(zip(student_ids, concept_ids)):
+            state = self.get_dkt_state(student_id, concept_id)
+            state.push(bool(is_correct[i]), float(response_times[i]))
+            
+            results.append(self._combine(
+                concept_id,
+                float(bkt_mastery[i]),
+                self.dkt.analyze_state(state, concept_id),
+                related_concepts[i],
+                dkvmn_memories[i] if dkvmn_memories else None
+            ))
+        
+        return results
+    
+    def _combine(
+        self,
+        concept_id: str,
+        bkt_mastery: float,
+        dkt_analysis: Dict[str, float],
+        related_concepts: List[str],
+        dkvmn_memory: Optional[DKVMNMemory]
+    ) -> Dict[str, any]:
+        """DKVMN read, weighted combination of the three layers, DKVMN write"""
         # Layer 3: DKVMN memory-aware adjustment
-        dkvmn_mastery = self.dkvmn.read_mastery(concept_id, related_concepts)
+        dkvmn_mastery = self.dkvmn.read_mastery(concept_id, related_concepts, dkvmn_memory)
         
         # Weighted combination (adjustable based on confidence)
         confidence = dkt_analysis['confidence']
@@ -306,7 +1062,7 @@ class HybridKnowledgeTracing:
         )
         
         # Update DKVMN memory
-        self.dkvmn.write_mastery(concept_id, final_mastery, related_concepts)
+        self.dkvmn.write_mastery(concept_id, final_mastery, related_concepts, dkvmn_memory)
         
         return {
             'mastery_score': round(final_mastery, 2),  # BR1: 0-100 scoring
@@ -0,0 +1,230 @@
+"""
+AMEP Prerequisite Graph
+Compiled concept prerequisite DAG for topological gating
+
+Solves: BR2 (Adaptive Practice) - a concept is only unlocked for practice at
+full priority once every concept it transitively depends on is mastered
+
+The graph is compiled once per catalog version:
+- CSR adjacency (row = concept, columns = its direct prerequisites) with
+  correlation weights (concept_prerequisites.correlation_weight)
+- Topological order (Kahn's algorithm, processed level by level)
+- Transitive closure as packed uint64 bitsets, one row per concept
+
+A student's weak concepts become one bitset, so "is this concept locked"
+is a bitwise AND against its closure row.
+"""
+
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ai_engine.knowledge_tracing import ConceptIndex, DKVMNEngine
+
+# Prerequisite mastery needed to unlock dependent concepts (same threshold
+# as the per-item prerequisite gate in AdaptivePracticeEngine)
+UNLOCK_THRESHOLD = 60.0
+
+class PrerequisiteGraph:
+    """
+    Concept prerequisite DAG with CSR adjacency and closure bitsets
+
+    Concepts on a prerequisite cycle (or depending on one) are reported
+    in `cyclic` and left out of `order`; their closure still covers
+    everything they reach, so a cycle stays locked until all of its
+    members are mastered.
+    """
+
+    def __init__(
+        self,
+        prerequisites: Dict[str, Sequence[str]],
+        weights: Optional[Dict[Tuple[str, str], float]] = None
+    ):
+        """
+        prerequisites: concept_id -> direct prerequisite concept_ids
+        weights: (concept_id, prerequisite_id) -> correlation weight
+                 (default DKVMNEngine.LINKED_CORRELATION)
+        """
+        weights = weights or {}
+        self.concepts = ConceptIndex()
+        for concept_id, prereqs in prerequisites.items():
+            self.concepts.intern(concept_id)
+            for prerequisite in prereqs:
+                self.concepts.intern(prerequisite)
+        n = len(self.concepts)
+
+        # CSR adjacency, duplicate edges collapsed
+        edges = {
+            (self.concepts.lookup(concept_id), self.concepts.lookup(prerequisite)):
+                weights.get((concept_id, prerequisite), DKVMNEngine.LINKED_CORRELATION)
+            for concept_id, prereqs in prerequisites.items()
+            for prerequisite in prereqs
+        }
+        pairs = np.array(sorted(edges), dtype=np.int64).reshape(-1, 2)
+        self.indices = pairs[:, 1].astype(np.int32)
+        self.weights = np.array([edges[tuple(pair)] for pair in pairs.tolist()], dtype=np.float32)
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pairs[:, 0], minlength=n), out=self.indptr[1:])
+
+        self.order, self.cyclic = self._topological_order()
+        self.closure = self._transitive_closure()
+
+    @classmethod
+    def from_concepts(cls, concepts: Iterable[Dict]) -> 'PrerequisiteGraph':
+        """Graph of concept documents (prerequisites, prerequisite_weights)"""
+        prerequisites, weights = {}, {}
+        for concept in concepts:
+            prerequisites[concept['_id']] = list(concept.get('prerequisites') or [])
+            for prerequisite, weight in (concept.get('prerequisite_weights') or {}).items():
+                weights[(concept['_id'], prerequisite)] = float(weight)
+        return cls(prerequisites, weights)
+
+    def __len__(self) -> int:
+        return len(self.concepts)
+
+    def prerequisites(self, concept_id: str) -> List[str]:
+        """Direct prerequisites of a concept"""
+        idx = self.concepts.lookup(concept_id)
+        if idx < 0:
+            return []
+        return [self.concepts.concept_id(p) for p in self.indices[self.indptr[idx]:self.indptr[idx + 1]]]
+
+    def ancestors(self, concept_id: str) -> List[str]:
+        """Every concept a concept transitively depends on, in index order"""
+        idx = self.concepts.lookup(concept_id)
+        if idx < 0:
+            return []
+        return [self.concepts.concept_id(i) for i in np.flatnonzero(self._unpack(self.closure[idx]))]
+
+    def topological_order(self) -> List[str]:
+        """Acyclic concepts, prerequisites before dependents"""
+        return [self.concepts.concept_id(i) for i in self.order]
+
+    # ------------------------------------------------------------------------
+    # Per-student masks
+    # ------------------------------------------------------------------------
+
+    def mastery_vector(self, student_mastery: Dict[str, float], default: float = 0.0) -> np.ndarray:
+        """Student mastery aligned with the graph's concept indices"""
+        return np.array(
+            [student_mastery.get(self.concepts.concept_id(i), default) for i in range(len(self))],
+            dtype=np.float64
+        )
+
+    def weak_bits(self, mastery: np.ndarray) -> np.ndarray:
+        """Packed bitset of concepts below UNLOCK_THRESHOLD (mastery_vector order)"""
+        return self._pack(mastery < UNLOCK_THRESHOLD)
+
+    def locked(self, mastery: np.ndarray) -> np.ndarray:
+        """
+        Concepts with a weak concept anywhere among their prerequisites
+
+        mastery: (C,) or (S, C) in mastery_vector order, unknown = 0
+        Returns: bool array of the same shape
+        """
+        weak = np.atleast_2d(self.weak_bits(np.atleast_2d(mastery)))
+        locked = np.empty((weak.shape[0], len(self)), dtype=bool)
+        for row, bits in enumerate(weak):
+            locked[row] = np.any(self.closure & bits, axis=1)
+        return locked.reshape(np.shape(mastery))
+
+    def unlocked(self, mastery: np.ndarray) -> np.ndarray:
+        return ~self.locked(mastery)
+
+    # ------------------------------------------------------------------------
+    # DKVMN
+    # ------------------------------------------------------------------------
+
+    def apply_correlations(self, dkvmn: DKVMNEngine):
+        """Seed DKVMN key memory with every prerequisite edge's correlation weight"""
+        rows = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        for row, prerequisite, weight in zip(rows, self.indices, self.weights):
+            dkvmn.set_correlation(
+                self.concepts.concept_id(int(row)),
+                self.concepts.concept_id(int(prerequisite)),
+                float(weight)
+            )
+
+    # ------------------------------------------------------------------------
+    # Compilation
+    # ------------------------------------------------------------------------
+
+    def _topological_order(self) -> Tuple[np.ndarray, List[str]]:
+        """Kahn's algorithm, one NumPy pass per level of the DAG"""
+        n = len(self)
+        remaining = np.diff(self.indptr)
+
+        # Transposed adjacency: prerequisite -> dependents
+        rows = np.repeat(np.arange(n), remaining)
+        by_prerequisite = np.argsort(self.indices, kind='stable')
+        dependents = rows[by_prerequisite]
+        dependents_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.indices, minlength=n), out=dependents_indptr[1:])
+
+        remaining = remaining.copy()
+        levels = []
+        frontier = np.flatnonzero(remaining == 0)
+        while len(frontier):
+            levels.append(frontier)
+            counts = dependents_indptr[frontier + 1] - dependents_indptr[frontier]
+            offsets = np.cumsum(counts) - counts
+            released = dependents[
+                np.arange(int(counts.sum())) + np.repeat(dependents_indptr[frontier] - offsets, counts)
+            ]
+            remaining -= np.bincount(released, minlength=n)
+            frontier = np.unique(released[remaining[released] == 0])
+
+        self._levels = levels
+        order = np.concatenate(levels) if levels else np.zeros(0, dtype=np.int64)
+        placed = np.zeros(n, dtype=bool)
+        placed[order] = True
+        return order, [self.concepts.concept_id(i) for i in np.flatnonzero(~placed)]
+
+    def _transitive_closure(self) -> np.ndarray:
+        """closure[c] = bitset of all transitive prerequisites of c"""
+        n = len(self)
+        nodes = np.arange(n)
+        own = np.zeros((n, max(1, (n + 63) // 64)), dtype=np.uint64)
+        own[nodes, nodes >> 6] = np.left_shift(np.uint64(1), (nodes & 63).astype(np.uint64))
+        closure = np.zeros_like(own)
+
+        def propagate(nodes: np.ndarray):
+            counts = self.indptr[nodes + 1] - self.indptr[nodes]
+            nodes = nodes[counts > 0]
+            counts = counts[counts > 0]
+            if len(nodes) == 0:
+                return
+            offsets = np.cumsum(counts) - counts
+            prerequisites = self.indices[
+                np.arange(int(counts.sum())) + np.repeat(self.indptr[nodes] - offsets, counts)
+            ]
+            closure[nodes] = np.bitwise_or.reduceat(
+                closure[prerequisites] | own[prerequisites], offsets, axis=0
+            )
+
+        # Every prerequisite of a level is complete before the level runs
+        for level in self._levels:
+            propagate(level)
+
+        # Cycles: iterate to a fixed point
+        cyclic = np.array([self.concepts.lookup(c) for c in self.cyclic], dtype=np.int64)
+        for _ in range(len(cyclic) + 1):
+            before = closure[cyclic].copy()
+            propagate(cyclic)
+            if np.array_equal(before, closure[cyclic]):
+                break
+
+        # A concept on a cycle reaches itself; it is not its own prerequisite
+        return closure & ~own
+
+    def _pack(self, mask: np.ndarray) -> np.ndarray:
+        """Bool (..., C) -> packed uint64 (..., words), bit i of word i // 64"""
+        n = mask.shape[-1]
+        words = max(1, (n + 63) // 64)
+        padded = np.zeros(mask.shape[:-1] + (words * 64,), dtype=bool)
+        padded[..., :n] = mask
+        return np.packbits(padded, axis=-1, bitorder='little').view('<u8').astype(np.uint64)
+
+    def _unpack(self, bits: np.ndarray) -> np.ndarray:
+        n = len(self)
+        unpacked = np.unpackbits(bits.astype('<u8').view(np.uint8), axis=-1, bitorder='little')
+        return unpacked[..., :n].astype(bool)
@@ -0,0 +1,85 @@
+"""
+AMEP Spaced Repetition
+Forgetting-aware review scheduling for mastered concepts
+
+Solves: BR3 (Efficiency of Practice) - _filter_by_mastery skips a concept
+once mastery reaches 85, so without reviews it never comes back
+
+Retention decays exponentially after the last assessment, R(t) = exp(-t / S).
+The stability S (days) doubles for every 5 mastery points above the skip
+threshold, and a review is due when R falls to the target retention:
+
+    due_at = last_assessed + S * ln(1 / target_retention)
+
+A due concept is practiced at the mastery expected at its due time
+(mastery * target_retention, capped below the skip threshold), which puts
+it in _filter_by_mastery's light-review band.
+"""
+
+import numpy as np
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# Mastery at which AdaptivePracticeEngine stops selecting a concept
+REVIEW_MASTERY = 85.0
+
+# Mastery points per doubling of stability
+STABILITY_DOUBLING = 5.0
+
+class ReviewScheduler:
+    """Next review time and review mastery per (student, concept)"""
+
+    def __init__(self, base_stability_days: float = 10.0, target_retention: float = 0.9):
+        """
+        base_stability_days: stability at exactly REVIEW_MASTERY
+        target_retention: predicted retention at which a review is due
+        """
+        if not 0.0 < target_retention < 1.0:
+            raise ValueError("target_retention must be between 0 and 1")
+        self.base_stability_days = base_stability_days
+        self.target_retention = target_retention
+
+    def stability(self, mastery: np.ndarray) -> np.ndarray:
+        """Memory stability in days"""
+        return self.base_stability_days * np.exp2(
+            (np.asarray(mastery, dtype=np.float64) - REVIEW_MASTERY) / STABILITY_DOUBLING
+        )
+
+    def interval_days(self, mastery: np.ndarray) -> np.ndarray:
+        """Days from the last assessment until a review is due"""
+        return self.stability(mastery) * np.log(1.0 / self.target_retention)
+
+    def retention(self, mastery: np.ndarray, elapsed_days: np.ndarray) -> np.ndarray:
+        """Predicted retention elapsed_days after the last assessment"""
+        return np.exp(-np.asarray(elapsed_days, dtype=np.float64) / self.stability(mastery))
+
+    def review_mastery(self, mastery: np.ndarray) -> np.ndarray:
+        """Mastery a due concept is practiced at (below REVIEW_MASTERY)"""
+        return np.minimum(
+            np.asarray(mastery, dtype=np.float64) * self.target_retention,
+            REVIEW_MASTERY - 1.0
+        )
+
+    def due_times(
+        self,
+        mastery: np.ndarray,
+        last_assessed: Sequence[datetime]
+    ) -> List[Optional[datetime]]:
+        """
+        Review due time of each pair, None for pairs below REVIEW_MASTERY
+        (they are still practiced and need no review)
+        """
+        mastery = np.asarray(mastery, dtype=np.float64)
+        assessed = np.array(last_assessed, dtype='datetime64[us]')
+        interval = (self.interval_days(mastery) * 86400e6).astype('timedelta64[us]')
+        return [
+            due_at if scheduled else None
+            for due_at, scheduled in zip((assessed + interval).tolist(), (mastery >= REVIEW_MASTERY).tolist())
+        ]
+
+    def due_concepts(self, schedule: Iterable[Dict]) -> Dict[str, float]:
+        """
+        Review schedule documents -> {concept_id: review mastery}, the
+        due_reviews argument of AdaptivePracticeEngine
+        """
+        return {entry['concept_id']: float(entry['review_mastery']) for entry in schedule}
@@ -1,9 +1,237 @@
 from flask import Blueprint, request, jsonify
-from datetime import datetime
+from dataclasses import asdict, fields
+from datetime import datetime, timedelta, timezone
+import atexit
+import itertools
+import threading
 import uuid
 
+import numpy as np
+from pymongo import ASCENDING, UpdateOne
+
+from config import Config
+from models.database import (
+    db, ENGAGEMENT_LOGS, DISENGAGEMENT_ALERTS,
+    bulk_write
+)
+from models.schemas import (
+    EngagementAnalysisRequest, EngagementBatchAnalysisRequest, EngagementBatchAnalysisResponse,
+    EngagementEventBatch, EngagementIngestResponse, ImplicitSignalsSchema,
+    ClassEngagementResponse
+)
+from models.engagement_log_writer import EngagementLogWriter
+from models.class_engagement import record_engagement, class_engagement_view, find_class_engagement
+from ai_engine.engagement_detection import (
+    EngagementDetectionEngine, ImplicitSignalBatch, ExplicitSignalBatch
+)
+from ai_engine.engagement_stream import StreamingDisengagementDetector
+from ai_engine.engagement_signals import ImplicitSignalMaterializer
+
 engagement_bp = Blueprint('engagement', __name__)
 
+# Engagement levels that raise a DISENGAGEMENT_ALERTS document
+_ALERT_LEVELS = {'AT_RISK', 'CRITICAL'}
+
+def _record_behavior_changes(changes):
+    """
+    Detector consumer: live behavior flips update the student's alert of
+    the day (live_behaviors); an AT_RISK/CRITICAL flip raises the alert
+    """
+    now = datetime.utcnow()
+    day = now.strftime('%Y-%m-%d')
+    operations = []
+    for change in changes:
+        field = f"live_behaviors.{change['type'].value}"
+        alert_id = f"{change['student_id']}_{day}"
+        if change['active'] and change['severity'] in _ALERT_LEVELS:
+            behavior = {
+                key: value for key, value in change.items()
+                if key not in ('student_id', 'active')
+            }
+            operations.append(UpdateOne(
+                {'_id': alert_id},
+                {
+                    '$set': {field: dict(behavior, type=change['type'].value), 'detected_at': now},
+                    '$setOnInsert': {
+                        'student_id': change['student_id'],
+                        'day': day,
+                        'severity': change['severity'],
+                        'acknowledged': False,
+                        'created_at': now
+                    }
+                },
+                upsert=True
+            ))
+        else:
+            operations.append(UpdateOne({'_id': alert_id}, {'$unset': {field: ''}}))
+    bulk_write(DISENGAGEMENT_ALERTS, operations)
+
+# Initialize engines
+engagement_engine = EngagementDetectionEngine()
+disengagement_detector = StreamingDisengagementDetector(
+    engagement_engine,
+    window_size=Config.ENGAGEMENT_STREAM_WINDOW,
+    on_change=_record_behavior_changes
+)
+
+# Engagement events are queued here and written to ENGAGEMENT_LOGS in batches
+event_writer = EngagementLogWriter(
+    capacity=Config.ENGAGEMENT_INGEST_QUEUE_SIZE,
+    flush_size=Config.ENGAGEMENT_INGEST_FLUSH_SIZE,
+    flush_interval=Config.ENGAGEMENT_INGEST_FLUSH_INTERVAL,
+    block_timeout=Config.ENGAGEMENT_INGEST_BLOCK_TIMEOUT,
+    write_retries=Config.ENGAGEMENT_INGEST_WRITE_RETRIES,
+    retry_backoff=Config.ENGAGEMENT_INGEST_RETRY_BACKOFF
+)
+atexit.register(event_writer.stop)
+
+# Event types the streaming detector consumes
+_DETECTOR_EVENTS = {'response', 'hint', 'login', 'logout'}
+
+def _feed_detector(events):
+    """Writer subscriber: written events update live behavior flags"""
+    disengagement_detector.process_many(
+        event for event in events
+        if event['event_type'] in _DETECTOR_EVENTS
+        and (event['event_type'] != 'response' or 'is_correct' in event)
+    )
+
+event_writer.subscribe(_feed_detector)
+
+# Rolling weekly ImplicitSignals, updated by every written batch
+signal_materializer = ImplicitSignalMaterializer(
+    window_days=Config.ENGAGEMENT_SIGNAL_WINDOW_DAYS,
+    reseed_after=Config.ENGAGEMENT_SIGNAL_RESEED_SECONDS or None
+)
+event_writer.subscribe(signal_materializer.process_many)
+
+# Periodic expiry of week-old activity and idle students
+_sweep_stop = threading.Event()
+
+def _sweep_loop():
+    while not _sweep_stop.wait(Config.ENGAGEMENT_SWEEP_INTERVAL):
+        try:
+            disengagement_detector.sweep()
+            signal_materializer.sweep()
+        except Exception as e:
+            print(f"✗ Engagement sweep failed: {e}")
+
+threading.Thread(target=_sweep_loop, name='engagement-sweep', daemon=True).start()
+atexit.register(_sweep_stop.set)
+
+def _seed_signal_windows(student_ids, now):
+    """
+    Replay the logged window of students whose history predates the
+    materializer (during its first window after a restart, or when the
+    seed is stale with ENGAGEMENT_SIGNAL_RESEED_SECONDS set)
+    
+    Students are replayed ENGAGEMENT_SIGNAL_SEED_CHUNK at a time from a
+    cursor in (student_id, timestamp) order, so only one student's events
+    are held in memory. The writer holds its batches during each chunk, so
+    a batch is either in the replay or delivered to the new window
+    afterwards, never both; it flushes again between chunks.
+    """
+    pending = [
+        student_id for student_id in dict.fromkeys(student_ids)
+        if signal_materializer.needs_history(student_id, now)
+    ]
+    if not pending:
+        return
+    
+    window_start = datetime.combine(now.date(), datetime.min.time()) - timedelta(
+        days=signal_materializer.window_days - 1
+    )
+    chunk_size = Config.ENGAGEMENT_SIGNAL_SEED_CHUNK
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        with event_writer.holding_delivery():
+            cursor = db[ENGAGEMENT_LOGS].find(
+                {'student_id': {'$in': chunk}, 'timestamp': {'$gte': window_start}},
+                {'_id': 0, 'created_at': 0}
+            ).sort([('student_id', ASCENDING), ('timestamp', ASCENDING)])
+            without_events = set(chunk)
+            for student_id, events in itertools.groupby(cursor, key=lambda event: event['student_id']):
+                signal_materializer.warm_start(student_id, list(events))
+                without_events.discard(student_id)
+            for student_id in without_events:
+                signal_materializer.warm_start(student_id, [])
+
+def _implicit_signals(student, now):
+    """Request signals, or the student's materialized week"""
+    if student.implicit_signals is not None:
+        return student.implicit_signals
+    _seed_signal_windows([student.student_id], now)
+    return signal_materializer.signals(student.student_id, now)
+
+def _implicit_signal_batch(students, now):
+    """Signal columns: request signals, or the materialized week of students sent without them"""
+    missing = [row for row, student in enumerate(students) if student.implicit_signals is None]
+    missing_ids = [students[row].student_id for row in missing]
+    _seed_signal_windows(missing_ids, now)
+    materialized = signal_materializer.signal_batch(missing_ids, now)
+    if len(missing) == len(students):
+        return materialized
+    
+    supplied = [row for row, student in enumerate(students) if student.implicit_signals is not None]
+    given = ImplicitSignalBatch.from_signals([students[row].implicit_signals for row in supplied])
+    columns = {}
+    for field in fields(ImplicitSignalBatch):
+        column = np.empty(len(students))
+        column[missing] = getattr(materialized, field.name)
+        column[supplied] = getattr(given, field.name)
+        columns[field.name] = column
+    return ImplicitSignalBatch(**columns)
+
+def _serialize_behaviors(behaviors):
+    return [dict(behavior, type=behavior['type'].value) for behavior in behaviors]
+
+def _analysis_response(student_id, result, behaviors):
+    return dict(result, student_id=student_id, behaviors=_serialize_behaviors(behaviors))
+
+def _recent_responses(student):
+    return [response.dict() for response in student.recent_responses]
+
+def _alert_operation(student_id, result, behaviors, now):
+    """
+    DISENGAGEMENT_ALERTS upsert for AT_RISK/CRITICAL results, else None
+    
+    One alert per student per (UTC) day: later analyses that day update it
+    with their result instead of adding another alert.
+    """
+    if result['engagement_level'] not in _ALERT_LEVELS:
+        return None
+    day = now.strftime('%Y-%m-%d')
+    return UpdateOne(
+        {'_id': f"{student_id}_{day}"},
+        {
+            '$set': {
+                'severity': result['engagement_level'],
+                'engagement_score': result['engagement_score'],
+                'behaviors': _serialize_behaviors(behaviors),
+                'recommendations': result['recommendations'],
+                'detected_at': now
+            },
+            '$setOnInsert': {
+                'student_id': student_id,
+                'day': day,
+                'acknowledged': False,
+                'created_at': now
+            }
+        },
+        upsert=True
+    )
+
+def _write_alerts(operations):
+    """Apply alert upserts; returns the number of new alerts"""
+    result = bulk_write(DISENGAGEMENT_ALERTS, operations)
+    return result.upserted_count if result else 0
+
+def _utc(timestamp):
+    """Naive UTC datetime, as stored everywhere else"""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
 # ============================================================================
 # ENGAGEMENT ROUTES (BR4, BR6)
 # ============================================================================
@@ -16,67 +244,220 @@ def analyze_engagement():
     Request body:
     {
         "student_id": "uuid",
-        "implicit_signals": {...},
+        "implicit_signals": {...},  (optional: materialized from events)
         "explicit_signals": {...},
         "recent_responses": [...]
     }
     """
     try:
-        data = request.json
+        data = EngagementAnalysisRequest(**request.json)
+        now = datetime.utcnow()
         
-        # In production, call engagement_engine methods
-        result = {
-            'engagement_score': 72.5,
-            'implicit_component': 68.3,
-            'explicit_component': 78.2,
-            'engagement_level': 'PASSIVE',
-            'behaviors_detected': 2,
-            'recommendations': [
-                'Monitor progress for next 3-5 days',
-                'Add time-lock to questions (quick guessing detected)'
-            ]
-        }
+        implicit = _implicit_signals(data, now)
+        behaviors = engagement_engine.detect_disengagement_behaviors(
+            data.student_id, _recent_responses(data), implicit
+        )
+        result = engagement_engine.calculate_engagement_score(
+            implicit, data.explicit_signals, behaviors
+        )
+        
+        alert = _alert_operation(data.student_id, result, behaviors, now)
+        if alert:
+            _write_alerts([alert])
+        record_engagement([dict(result, student_id=data.student_id, class_id=data.class_id)], now)
+        
+        return jsonify(_analysis_response(data.student_id, result, behaviors)), 200
+        
+    except ValueError as e:
+        return jsonify({
+            'error': 'Validation error',
+            'detail': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'error': 'Internal server error',
+            'detail': str(e)
+        }), 500
+
+@engagement_bp.route('/analyze/batch', methods=['POST'])
+def analyze_engagement_batch():
+    """
+    BR4: Analyze many students in one pass (e.g. a nightly school-wide job)
+    
+    POST /api/engagement/analyze/batch
+    
+    Request body:
+    {
+        "students": [{"student_id": "uuid", "explicit_signals": {...}, ...}, ...],
+        "persist_alerts": true
+    }
+    
+    Scores come from one columnar pass (calculate_engagement_scores); the
+    alerts of all AT_RISK/CRITICAL students are upserted with one bulk_write
+    (one alert per student per day), and class engagement snapshots get one
+    update per class.
+    """
+    try:
+        data = EngagementBatchAnalysisRequest(**request.json)
+        now = datetime.utcnow()
+        
+        implicit = _implicit_signal_batch(data.students, now)
+        behaviors = engagement_engine.detect_disengagement_behaviors_batch(
+            [_recent_responses(student) for student in data.students], implicit
+        )
+        results = engagement_engine.calculate_engagement_scores(
+            implicit,
+            ExplicitSignalBatch.from_signals([student.explicit_signals for student in data.students]),
+            behaviors
+        )
+        
+        alerts_created = 0
+        if data.persist_alerts:
+            alerts = {}
+            for student, result, student_behaviors in zip(data.students, results, behaviors):
+                alert = _alert_operation(student.student_id, result, student_behaviors, now)
+                if alert:
+                    alerts[student.student_id] = alert
+            alerts_created = _write_alerts(list(alerts.values()))
+        record_engagement([
+            dict(result, student_id=student.student_id, class_id=student.class_id)
+            for student, result in zip(data.students, results)
+        ], now)
+        
+        response = EngagementBatchAnalysisResponse(
+            results=[
+                _analysis_response(student.student_id, result, student_behaviors)
+                for student, result, student_behaviors in zip(data.students, results, behaviors)
+            ],
+            alerts_created=alerts_created
+        )
+        
+        return jsonify(response.dict()), 200
+        
+    except ValueError as e:
+        return jsonify({
+            'error': 'Validation error',
+            'detail': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'error': 'Internal server error',
+            'detail': str(e)
+        }), 500
+
+@engagement_bp.route('/events', methods=['POST'])
+def ingest_engagement_events():
+    """
+    BR4: Ingest a batch of implicit engagement events
+    
+    POST /api/engagement/events
+    
+    Request body:
+    {
+        "events": [{"student_id": "uuid", "event_type": "click", ...}, ...]
+    }
+    
+    Events are queued in memory and written to ENGAGEMENT_LOGS in batches
+    by a background writer. 202: all queued; 429: the queue was full and
+    the last `dropped` events were rejected (retry them later). Timestamps
+    later than the time received are clamped to it.
+    """
+    try:
+        data = EngagementEventBatch(**request.json)
+        received_at = datetime.utcnow()
+        
+        events = []
+        for event in data.events:
+            document = event.dict(exclude_none=True)
+            document['timestamp'] = (
+                min(_utc(event.timestamp), received_at) if event.timestamp else received_at
+            )
+            events.append(document)
+        
+        accepted, dropped = event_writer.submit(events)
+        response = EngagementIngestResponse(accepted=accepted, dropped=dropped)
         
-        return jsonify(result), 200
+        return jsonify(response.dict()), 429 if dropped else 202
+        
+    except ValueError as e:
+        return jsonify({
+            'error': 'Validation error',
+            'detail': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'error': 'Internal server error',
+            'detail': str(e)
+        }), 500
+
+@engagement_bp.route('/events/stats', methods=['GET'])
+def get_ingestion_stats():
+    """
+    BR4: Ingestion pipeline counters (queue depth, drops, writes)
+    
+    GET /api/engagement/events/stats
+    """
+    try:
+        stats = event_writer.stats()
+        stats['students_monitored'] = len(disengagement_detector)
+        stats['students_with_signals'] = len(signal_materializer)
+        return jsonify(stats), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@engagement_bp.route('/signals/<student_id>', methods=['GET'])
+def get_implicit_signals(student_id):
+    """
+    BR4: Weekly implicit signals materialized from engagement events
+    
+    GET /api/engagement/signals/<student_id>
+    
+    Returns the ImplicitSignals analyze_engagement expects, without
+    scanning the week of ENGAGEMENT_LOGS.
+    """
+    try:
+        now = datetime.utcnow()
+        _seed_signal_windows([student_id], now)
+        signals = signal_materializer.signals(student_id, now)
+        
+        response = ImplicitSignalsSchema(**asdict(signals)).dict()
+        response['student_id'] = student_id
+        response['window_days'] = signal_materializer.window_days
+        
+        return jsonify(response), 200
+        
+    except Exception as e:
+        return jsonify({
+            'error': 'Internal server error',
+            'detail': str(e)
+        }), 500
+
 @engagement_bp.route('/class/<class_id>', methods=['GET'])
 def get_class_engagement(class_id):
     """
     BR6: Get class-level engagement metrics for teacher dashboard
+    
+    GET /api/engagement/class/<class_id>
+    
+    Served from the class's materialized snapshot, kept current by every
+    analysis and rebuilt by jobs/class_engagement_snapshot.py.
     """
     try:
-        # Mock data - in production, aggregate from database
-        class_data = {
-            'class_id': class_id,
-            'class_engagement_index': 87,
-            'distribution': {
-                'ENGAGED': 20,
-                'PASSIVE': 6,
-                'MONITOR': 1,
-                'AT_RISK': 2,
-                'CRITICAL': 0
-            },
-            'alert_count': 2,
-            'students_needing_attention': [
-                {
-                    'student_id': 's1',
-                    'name': 'Student A',
-                    'engagement_score': 45,
-                    'engagement_level': 'AT_RISK',
-                    'recommendations': ['Schedule 1-on-1 within 48 hours']
-                }
-            ],
-            'trend': 'improving',
-            'engagement_rate': 89.7
-        }
+        snapshot = find_class_engagement(class_id)
         
-        return jsonify(class_data), 200
+        if not snapshot:
+            return jsonify({'error': 'Class engagement not found'}), 404
+        
+        response = ClassEngagementResponse(**class_engagement_view(snapshot, engagement_engine))
+        
+        return jsonify(response.dict()), 200
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return jsonify({
+            'error': 'Internal server error',
+            'detail': str(e)
+        }), 500
 
 # ============================================================================
 # LIVE POLLING ROUTES (BR4)
@@ -7,17 +7,28 @@ Location: backend/api/mastery_routes.py
 
 from flask import Blueprint, request, jsonify
 from datetime import datetime
+import atexit
+import multiprocessing
+import threading
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from bson import ObjectId
 
+from config import Config
+
 # Import MongoDB helper functions
 from models.database import (
     db,
     STUDENT_CONCEPT_MASTERY,
     STUDENT_RESPONSES,
-    CONCEPTS,
+    CONTENT_ITEMS,
+    PRACTICE_SESSIONS,
     find_one,
     find_many,
+    find_one_and_update,
     insert_one,
+    insert_many,
     update_one,
     aggregate
 )
@@ -26,21 +37,366 @@ from models.database import (
 from models.schemas import (
     MasteryCalculationRequest,
     MasteryCalculationResponse,
+    MasteryRecalculationRequest,
     PracticeSessionRequest,
     PracticeSessionResponse,
-    StudentResponseCreate
+    ClassPracticeSessionRequest,
+    ClassPracticeSessionResponse,
+    StudentResponseCreate,
+    ResponseScoreRequest,
+    ResponseScoreResponse
 )
 
+from models.memory_store import DKVMNMemoryStore
+from models.concept_catalog import concept_catalog
+from models.review_schedule import reschedule, due_reviews
+from utils.cache import TTLCache
+
 # Import AI engines
-from ai_engine.knowledge_tracing import HybridKnowledgeTracing
-from ai_engine.adaptive_practice import AdaptivePracticeEngine
+from ai_engine.knowledge_tracing import HybridKnowledgeTracing, DKTState
+from ai_engine.adaptive_practice import AdaptivePracticeEngine, ContentItem, ContentIndex
+from ai_engine.spaced_repetition import ReviewScheduler
+
+from jobs.mastery_recalculation import create_job, get_job, claim_job, run_recalculation
 
 # Create blueprint
 mastery_bp = Blueprint('mastery', __name__)
 
+# Short-lived per-student cache of recent response windows: {concept_id: [...]}
+_response_windows = TTLCache(
+    maxsize=Config.RESPONSE_WINDOW_CACHE_SIZE,
+    ttl=Config.RESPONSE_WINDOW_CACHE_TTL
+)
+
+# Latest generated session plan per student: (session_key, plan)
+_session_plans = TTLCache(
+    maxsize=Config.SESSION_PLAN_CACHE_SIZE,
+    ttl=Config.SESSION_PLAN_CACHE_TTL
+)
+
+# Content library index: (catalog version, built at, ContentIndex)
+_content_index_cache = (None, 0.0, None)
+_content_index_lock = threading.Lock()
+
+# Prerequisite graph whose weights are in kt_engine's DKVMN key memory
+_seeded_graph = None
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+def _load_recent_responses(student_id, concept_id):
+    """
+    Last DKT_SEQUENCE_LENGTH responses for a student-concept pair, oldest first
+    
+    Served by the (student_id, concept_id, submitted_at) index with a
+    two-field projection, so cost is bounded by the window size rather than
+    by how long the student has used the platform.
+    """
+    windows = _response_windows.get(student_id)
+    if windows is None:
+        windows = {}
+        _response_windows.put(student_id, windows)
+    
+    if concept_id not in windows:
+        recent = find_many(
+            STUDENT_RESPONSES,
+            {'student_id': student_id, 'concept_id': concept_id},
+            projection={'_id': 0, 'is_correct': 1, 'response_time': 1},
+            sort=[('submitted_at', -1)],
+            limit=Config.DKT_SEQUENCE_LENGTH
+        )
+        windows[concept_id] = recent[::-1]
+    
+    return windows[concept_id]
+
+def _load_dkt_state(student_id, concept_id, exclude_response_id=None):
+    """
+    DKT window for a pair on a cache miss
+    
+    Uses the state persisted on the mastery document, and falls back to
+    rebuilding it from the pair's most recent recorded responses.
+    exclude_response_id leaves out a recorded response that is about to
+    be applied (the cached windows cannot tell it apart, so it is read
+    from MongoDB).
+    """
+    capacity = kt_engine.dkt.sequence_length
+    record = find_one(
+        STUDENT_CONCEPT_MASTERY,
+        {'_id': f"{student_id}_{concept_id}"},
+        {'dkt_state': 1}
+    )
+    if record and record.get('dkt_state'):
+        return DKTState.from_document(record['dkt_state'], capacity)
+    
+    if exclude_response_id is None:
+        recent = _load_recent_responses(student_id, concept_id)
+    else:
+        recent = find_many(
+            STUDENT_RESPONSES,
+            {
+                'student_id': student_id,
+                'concept_id': concept_id,
+                '_id': {'$ne': exclude_response_id}
+            },
+            projection={'_id': 0, 'is_correct': 1, 'response_time': 1},
+            sort=[('submitted_at', -1)],
+            limit=capacity
+        )[::-1]
+    if recent:
+        return DKTState.from_history(recent, capacity)
+    return None
+
+def _revalidate_dkt_state(student_id, concept_id, stored_state):
+    """
+    Drop a pair's cached DKT window if the persisted one has another version
+    
+    stored_state: the pair's dkt_state document (None if never persisted);
+    a different version means another API process (or a recalculation)
+    has rewritten it since this process cached the window.
+    """
+    key = (student_id, concept_id)
+    cached = kt_engine.dkt_states.get(key)
+    if cached is not None and cached.version != (stored_state or {}).get('version'):
+        kt_engine.dkt_states.pop(key)
+
+def _dkt_state_document(student_id, concept_id):
+    """Pair's DKT window to persist, under a new version token"""
+    state = kt_engine.get_dkt_state(student_id, concept_id)
+    state.version = str(ObjectId())
+    return state.to_document()
+
+def _prerequisite_graph():
+    """
+    Compiled prerequisite DAG of the catalog
+    
+    DKVMN key memory is seeded with the graph's correlation weights
+    whenever a new graph is compiled.
+    """
+    global _seeded_graph
+    graph = concept_catalog.prerequisite_graph()
+    if graph is not _seeded_graph:
+        graph.apply_correlations(kt_engine.dkvmn)
+        _seeded_graph = graph
+    return graph
+
+def _concept_scoring_metadata(concept_id):
+    """
+    Fitted BKT parameters (written by jobs/bkt_refit.py) and prerequisites
+    
+    Returns: (BKTParameters or None, prerequisite concept_ids)
+    """
+    graph = _prerequisite_graph()
+    return concept_catalog.bkt_params(concept_id), graph.prerequisites(concept_id)
+
+def _mastery_document(student_id, concept_id, result):
+    """Fields $set on a student_concept_mastery document after scoring"""
+    return {
+        '_id': f"{student_id}_{concept_id}",
+        'student_id': student_id,
+        'concept_id': concept_id,
+        'mastery_score': result['mastery_score'],
+        'bkt_component': result['bkt_component'],
+        'dkt_component': result['dkt_component'],
+        'dkvmn_component': result['dkvmn_component'],
+        'confidence': result['confidence'],
+        'learning_velocity': result['learning_velocity'],
+        'last_assessed': datetime.utcnow()
+    }
+
+def _response_document(data):
+    """student_responses document for a submitted answer"""
+    return {
+        '_id': str(ObjectId()),
+        'student_id': data.student_id,
+        'item_id': data.item_id,
+        'concept_id': data.concept_id,
+        'is_correct': data.is_correct,
+        'response_time': data.response_time,
+        'hints_used': data.hints_used,
+        'attempts': data.attempts,
+        'response_text': data.response_text,
+        'submitted_at': datetime.utcnow()
+    }
+
+def _append_to_response_window(student_id, concept_id, is_correct, response_time):
+    """Keep a cached recent-response window current"""
+    windows = _response_windows.get(student_id)
+    if windows is not None and concept_id in windows:
+        windows[concept_id] = (windows[concept_id] + [{
+            'is_correct': is_correct,
+            'response_time': response_time
+        }])[-Config.DKT_SEQUENCE_LENGTH:]
+
+def _build_available_content(concepts):
+    """
+    Synthesized practice items for concepts with no stored content
+    
+    Three items per concept at the concept's difficulty level.
+    """
+    available_content = []
+    
+    for concept in concepts:
+        # Create sample content items for each concept
+        for i in range(3):
+            item = ContentItem(
+                item_id=f"{concept['_id']}_q{i}",
+                concept_id=concept['_id'],
+                difficulty=concept.get('difficulty_level', 0.5),
+                weight=concept.get('weight', 1.0),
+                estimated_time=5
+            )
+            available_content.append(item)
+    
+    return available_content
+
+def _load_content_items():
+    """Stored content items for known concepts, plus synthesized items for the rest"""
+    documents = find_many(
+        CONTENT_ITEMS,
+        {},
+        projection={
+            'concept_id': 1,
+            'difficulty': 1,
+            'weight': 1,
+            'estimated_time': 1,
+            'scaffolding_available': 1,
+            'prerequisites': 1
+        }
+    )
+    
+    items = []
+    covered = set()
+    for document in documents:
+        concept = concept_catalog.get(document['concept_id'])
+        if concept is None:
+            continue
+        items.append(ContentItem(
+            item_id=document['_id'],
+            concept_id=document['concept_id'],
+            difficulty=document['difficulty'],
+            weight=document.get('weight', concept['weight']),
+            estimated_time=document.get('estimated_time', 5),
+            scaffolding_available=document.get('scaffolding_available', True),
+            prerequisites=document.get('prerequisites') or []
+        ))
+        covered.add(document['concept_id'])
+    
+    items.extend(_build_available_content(
+        concept for concept in concept_catalog.all() if concept['_id'] not in covered
+    ))
+    return items
+
+def _content_index_stale(version, built_at, index):
+    return (
+        index is None
+        or version != concept_catalog.version
+        or time.monotonic() - built_at > Config.CONTENT_INDEX_TTL
+    )
+
+def _content_index():
+    """
+    Content index, rebuilt when the catalog changes or CONTENT_INDEX_TTL expires
+    
+    One thread rebuilds; the others keep serving the previous index
+    meanwhile (they only wait when there is none yet).
+    """
+    global _content_index_cache
+    version, built_at, index = _content_index_cache
+    if not _content_index_stale(version, built_at, index):
+        return index
+    
+    if not _content_index_lock.acquire(blocking=index is None):
+        return index
+    try:
+        version, built_at, index = _content_index_cache
+        if _content_index_stale(version, built_at, index):
+            version = concept_catalog.version
+            index = ContentIndex(_load_content_items(), _prerequisite_graph())
+            _content_index_cache = (version, time.monotonic(), index)
+        return index
+    finally:
+        _content_index_lock.release()
+
+def _cached_session_plan(student_id, session_key):
+    cached_key, plan = _session_plans.get(student_id, (None, None))
+    return plan if cached_key == session_key else None
+
+def _cache_session_plan(student_id, session_key, plan):
+    # Replaces the student's previous plan: its key no longer matches the
+    # student's current mastery snapshot
+    _session_plans.put(student_id, (session_key, plan))
+
+def _invalidate_session_plans(student_ids=None):
+    """
+    Drop cached session plans after mastery changes (None = every student)
+    
+    Keys already include the mastery snapshot, so this only frees plans
+    that can no longer be hit.
+    """
+    if student_ids is None:
+        _session_plans.clear()
+    else:
+        for student_id in student_ids:
+            _session_plans.pop(student_id)
+
 # Initialize engines
-kt_engine = HybridKnowledgeTracing()
-adaptive_engine = AdaptivePracticeEngine()
+kt_engine = HybridKnowledgeTracing(
+    dkt_weights_path=Config.DKT_WEIGHTS_PATH,
+    dkt_sequence_length=Config.DKT_SEQUENCE_LENGTH,
+    state_cache_size=Config.DKT_STATE_CACHE_SIZE,
+    state_loader=_load_dkt_state
+)
+adaptive_engine = AdaptivePracticeEngine(
+    packing_pool_size=Config.SESSION_PACKING_POOL_SIZE,
+    rng=np.random.default_rng(Config.SESSION_RNG_SEED)
+)
+review_scheduler = ReviewScheduler(
+    base_stability_days=Config.REVIEW_BASE_STABILITY_DAYS,
+    target_retention=Config.REVIEW_TARGET_RETENTION
+)
+
+# Per-student DKVMN memories, bounded and revalidated against MongoDB
+# (batched write-back only when DKVMN_WRITE_BACK is set)
+dkvmn_store = DKVMNMemoryStore(
+    kt_engine.dkvmn,
+    budget_bytes=Config.DKVMN_MEMORY_BUDGET_MB * 1024 * 1024,
+    ttl_seconds=Config.DKVMN_MEMORY_TTL,
+    write_batch_size=Config.DKVMN_WRITE_BATCH_SIZE,
+    write_back=Config.DKVMN_WRITE_BACK
+)
+atexit.register(dkvmn_store.flush)
+
+# Concepts are served from memory and kept current in the background
+concept_catalog.start()
+
+# Bulk recalculation jobs run in worker processes (as jobs/bkt_refit.py
+# fits), so scoring them does not hold this process's GIL; spawned rather
+# than forked, since the parent has MongoDB clients and threads running
+_recalculation_executor = ProcessPoolExecutor(
+    max_workers=Config.MASTERY_RECALC_WORKERS,
+    mp_context=multiprocessing.get_context('spawn')
+)
+atexit.register(_recalculation_executor.shutdown, wait=False, cancel_futures=True)
+_recalculation_futures = {}
+
+def _invalidate_recalculated(student_ids):
+    """Drop cached state of the students a job rewrote (None = all students)"""
+    dkvmn_store.invalidate(student_ids)
+    _invalidate_session_plans(student_ids)
+    kt_engine.invalidate_dkt_states(student_ids)
+
+def _submit_recalculation(job_id, student_ids):
+    """
+    Run a job in a worker process; failures are recorded on the job
+    document by run_recalculation. Cached state is dropped when it ends,
+    also after a failure (completed chunks were written).
+    """
+    for finished in [k for k, f in _recalculation_futures.items() if f.done()]:
+        del _recalculation_futures[finished]
+    future = _recalculation_executor.submit(run_recalculation, job_id)
+    future.add_done_callback(lambda _: _invalidate_recalculated(student_ids))
+    _recalculation_futures[job_id] = future
 
 # ============================================================================
 # MASTERY CALCULATION ROUTES (BR1)
@@ -57,7 +413,28 @@ def calculate_mastery():
         # Validate request data using Pydantic
         data = MasteryCalculationRequest(**request.json)
         
+        # A cached DKT window is only reused while it matches the stored one
+        state_key = (data.student_id, data.concept_id)
+        if data.response_history is None and state_key in kt_engine.dkt_states:
+            stored = find_one(
+                STUDENT_CONCEPT_MASTERY,
+                {'_id': f"{data.student_id}_{data.concept_id}"},
+                {'dkt_state.version': 1}
+            )
+            _revalidate_dkt_state(
+                data.student_id, data.concept_id, (stored or {}).get('dkt_state')
+            )
+        
+        # A response recorded by /response/submit is applied below; keep it
+        # out of a DKT window seeded from the recorded responses
+        if (data.response_history is None and data.response_id
+                and state_key not in kt_engine.dkt_states):
+            kt_engine.dkt_states.put(state_key, _load_dkt_state(
+                data.student_id, data.concept_id, exclude_response_id=data.response_id
+            ) or DKTState(kt_engine.dkt.sequence_length))
+        
         # Call the knowledge tracing engine
+        dkvmn_memory = dkvmn_store.get(data.student_id)
         result = kt_engine.calculate_mastery(
             student_id=data.student_id,
             concept_id=data.concept_id,
@@ -65,37 +442,40 @@ def calculate_mastery():
             response_time=data.response_time,
             current_mastery=data.current_mastery,
             response_history=data.response_history,
-            related_concepts=data.related_concepts
+            related_concepts=data.related_concepts,
+            bkt_params=_concept_scoring_metadata(data.concept_id)[0],
+            dkvmn_memory=dkvmn_memory
         )
+        dkvmn_store.mark_dirty(data.student_id, [data.concept_id], dkvmn_memory)
+        _invalidate_session_plans([data.student_id])
         
         # Add timestamp
         result['timestamp'] = datetime.utcnow()
         
         # Save to MongoDB
-        mastery_doc = {
-            '_id': f"{data.student_id}_{data.concept_id}",
-            'student_id': data.student_id,
-            'concept_id': data.concept_id,
-            'mastery_score': result['mastery_score'],
-            'bkt_component': result['bkt_component'],
-            'dkt_component': result['dkt_component'],
-            'dkvmn_component': result['dkvmn_component'],
-            'confidence': result['confidence'],
-            'learning_velocity': result['learning_velocity'],
-            'last_assessed': datetime.utcnow(),
-            'times_assessed': 1
-        }
+        mastery_doc = _mastery_document(data.student_id, data.concept_id, result)
         
-        # Update or insert
-        update_one(
+        # Persist the incremental DKT window next to the mastery score
+        if data.response_history is None:
+            mastery_doc['dkt_state'] = _dkt_state_document(data.student_id, data.concept_id)
+        
+        # Update or insert; the stored mastery it replaces decides whether
+        # the pair can be in the review queue
+        previous = find_one_and_update(
             STUDENT_CONCEPT_MASTERY,
             {'_id': mastery_doc['_id']},
             {
                 '$set': mastery_doc,
                 '$inc': {'times_assessed': 1}
             },
+            projection={'mastery_score': 1},
             upsert=True
         )
+        reschedule(
+            review_scheduler, data.student_id, data.concept_id,
+            result['mastery_score'], mastery_doc['last_assessed'],
+            previous['mastery_score'] if previous else None
+        )
         
         # Validate response
         response = MasteryCalculationResponse(**result)
@@ -114,47 +494,168 @@ def calculate_mastery():
         }), 500
 
 
+@mastery_bp.route('/recalculate', methods=['POST'])
+def recalculate_mastery():
+    """
+    BR1: Recalculate mastery for a class (student_ids) or all students
+    
+    POST /api/mastery/recalculate
+    
+    Runs in the background; poll the returned job for progress.
+    """
+    try:
+        data = MasteryRecalculationRequest(**(request.json or {}))
+        
+        job_id = create_job(data.student_ids)
+        _submit_recalculation(job_id, data.student_ids)
+        
+        return jsonify({
+            'job_id': job_id,
+            'status': 'queued'
+        }), 202
+        
+    except ValueError as e:
+        return jsonify({
+            'error': 'Validation error',
+            'detail': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'error': 'Internal server error',
+            'detail': str(e)
+        }), 500
+
+
+@mastery_bp.route('/recalculate/<job_id>', methods=['GET'])
+def get_recalculation_job(job_id):
+    """
+    BR1: Progress of a mastery recalculation job
+    
+    GET /api/mastery/recalculate/{job_id}
+    """
+    try:
+        job = get_job(job_id)
+        
+        if not job:
+            return jsonify({'error': 'Recalculation job not found'}), 404
+        
+        total = job.get('total_responses') or 0
+        processed = job.get('processed_responses', 0)
+        
+        return jsonify({
+            'job_id': job_id,
+            'status': job['status'],
+            'processed_responses': processed,
+            'total_responses': total,
+            'progress': round(min(processed / total, 1.0) * 100, 2) if total else 0,
+            'processed_students': job.get('processed_students', 0),
+            'pairs_written': job.get('pairs_written', 0),
+            'checkpoint': job.get('checkpoint'),
+            'error': job.get('error'),
+            'started_at': job.get('started_at').isoformat() if job.get('started_at') else None,
+            'completed_at': job.get('completed_at').isoformat() if job.get('completed_at') else None
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'error': 'Internal server error',
+            'detail': str(e)
+        }), 500
+
+
+@mastery_bp.route('/recalculate/<job_id>/resume', methods=['POST'])
+def resume_recalculation_job(job_id):
+    """
+    BR1: Resume an interrupted recalculation job from its checkpoint
+    
+    POST /api/mastery/recalculate/{job_id}/resume
+    """
+    try:
+        future = _recalculation_futures.get(job_id)
+        claimed = None if future and not future.done() else claim_job(job_id)
+        
+        if not claimed:
+            job = get_job(job_id)
+            if not job:
+                return jsonify({'error': 'Recalculation job not found'}), 404
+            return jsonify({
+                'error': 'Job cannot be resumed',
+                'detail': f"Job is {job['status']}"
+            }), 409
+        
+        _submit_recalculation(job_id, claimed['scope'].get('student_ids'))
+        
+        return jsonify({
+            'job_id': job_id,
+            'status': 'queued',
+            'checkpoint': claimed.get('checkpoint')
+        }), 202
+        
+    except Exception as e:
+        return jsonify({
+            'error': 'Internal server error',
+            'detail': str(e)
+        }), 500
+
+
 @mastery_bp.route('/student/<student_id>', methods=['GET'])
 def get_student_mastery(student_id):
     """
     BR1: Get all concept mastery scores for a student
     
     GET /api/mastery/student/{student_id}
+    
+    One aggregation: filters are pushed into $match (the subject filter as
+    a concept_id $in from the concept catalog) and overall mastery is
+    computed by $group; concept names come from the catalog.
     """
     try:
         # Get query parameters
         subject_area = request.args.get('subject_area')
         min_mastery = request.args.get('min_mastery', type=float)
         
-        # Build query
-        query = {'student_id': student_id}
+        # Only concepts that exist (and are in the subject) are listed
+        match = {
+            'student_id': student_id,
+            'concept_id': {'$in': (
+                concept_catalog.by_subject(subject_area) if subject_area
+                else concept_catalog.concept_ids()
+            )}
+        }
+        if min_mastery:
+            match['mastery_score'] = {'$gte': min_mastery}
         
-        # Get mastery records
-        mastery_records = find_many(STUDENT_CONCEPT_MASTERY, query)
+        result = aggregate(STUDENT_CONCEPT_MASTERY, [
+            {'$match': match},
+            {'$facet': {
+                'concepts': [{'$project': {
+                    '_id': 0,
+                    'concept_id': 1,
+                    'mastery_score': {'$ifNull': ['$mastery_score', 0]},
+                    'last_assessed': 1,
+                    'times_assessed': {'$ifNull': ['$times_assessed', 0]},
+                    'learning_velocity': {'$ifNull': ['$learning_velocity', 0]}
+                }}],
+                'overall': [{'$group': {
+                    '_id': None,
+                    'overall_mastery': {'$avg': {'$ifNull': ['$mastery_score', 0]}}
+                }}]
+            }}
+        ])[0]
         
-        # Get concept details and filter
-        concepts_data = []
-        for record in mastery_records:
-            concept = find_one(CONCEPTS, {'_id': record['concept_id']})
-            
-            if concept:
-                # Apply filters
-                if subject_area and concept.get('subject_area') != subject_area:
-                    continue
-                if min_mastery and record.get('mastery_score', 0) < min_mastery:
-                    continue
-                
-                concepts_data.append({
-                    'concept_id': record['concept_id'],
-                    'concept_name': concept.get('concept_name', 'Unknown'),
-                    'mastery_score': record.get('mastery_score', 0),
-                    'last_assessed': record.get('last_assessed').isoformat() if record.get('last_assessed') else None,
-                    'times_assessed': record.get('times_assessed', 0),
-                    'learning_velocity': record.get('learning_velocity', 0)
-                })
-        
-        # Calculate overall mastery
-        overall_mastery = sum(c['mastery_score'] for c in concepts_data) / len(concepts_data) if concepts_data else 0
+        concepts_data = [
+            {
+                'concept_id': record['concept_id'],
+                'concept_name': concept_catalog.name(record['concept_id'], 'Unknown'),
+                'mastery_score': record['mastery_score'],
+                'last_assessed': record.get('last_assessed').isoformat() if record.get('last_assessed') else None,
+                'times_assessed': record['times_assessed'],
+                'learning_velocity': record['learning_velocity']
+            }
+            for record in result['concepts']
+        ]
+        
+        overall_mastery = (result['overall'][0]['overall_mastery'] if result['overall'] else None) or 0
         
         return jsonify({
             'student_id': student_id,
@@ -178,7 +679,7 @@ def get_class_mastery_for_concept(concept_id, class_id):
     """
     try:
         # Get concept details
-        concept = find_one(CONCEPTS, {'_id': concept_id})
+        concept = concept_catalog.get(concept_id)
         
         if not concept:
             return jsonify({'error': 'Concept not found'}), 404
@@ -278,38 +779,38 @@ def generate_practice_session():
             for record in mastery_records
         }
         
-        # Get available content from MongoDB
-        # In production, you'd have a content_items collection
-        # For now, create mock content
-        from ai_engine.adaptive_practice import ContentItem
-        
-        concepts = find_many(CONCEPTS, {})
-        available_content = []
-        
-        for concept in concepts:
-            # Create sample content items for each concept
-            for i in range(3):
-                item = ContentItem(
-                    item_id=f"{concept['_id']}_q{i}",
-                    concept_id=concept['_id'],
-                    difficulty=concept.get('difficulty_level', 0.5),
-                    weight=concept.get('weight', 1.0),
-                    estimated_time=5
-                )
-                available_content.append(item)
-        
-        # Generate session using adaptive engine
-        session = adaptive_engine.generate_practice_session(
-            student_id=data.student_id,
-            student_mastery=student_mastery,
-            learning_velocity=learning_velocity,
-            available_content=available_content,
-            session_duration=data.session_duration
+        # Mastered concepts due for spaced review
+        reviews = review_scheduler.due_concepts(due_reviews([data.student_id])[data.student_id])
+        
+        # Identical requests (same mastery snapshot, content and duration)
+        # reuse the plan generated for the first one
+        content_index = _content_index()
+        session_key = adaptive_engine.session_key(
+            data.student_id,
+            student_mastery,
+            learning_velocity,
+            content_index.content_version(),
+            data.session_duration,
+            data.packing,
+            reviews
         )
+        session = _cached_session_plan(data.student_id, session_key)
         
-        # Save session to MongoDB (optional)
-        session_id = str(ObjectId())
-        session['session_id'] = session_id
+        if session is None:
+            # Generate session using adaptive engine; candidates come from the
+            # ZPD band of each concept in the content index
+            session = adaptive_engine.generate_practice_session(
+                student_id=data.student_id,
+                student_mastery=student_mastery,
+                learning_velocity=learning_velocity,
+                available_content=[],
+                session_duration=data.session_duration,
+                content_index=content_index,
+                packing=data.packing,
+                session_key=session_key,
+                due_reviews=reviews
+            )
+            _cache_session_plan(data.student_id, session_key, session)
         
         # Validate response
         response = PracticeSessionResponse(**session)
@@ -328,6 +829,140 @@ def generate_practice_session():
         }), 500
 
 
+@mastery_bp.route('/practice/generate/class', methods=['POST'])
+def generate_class_practice_sessions():
+    """
+    BR2, BR3: Generate adaptive practice sessions for a whole class
+    
+    POST /api/mastery/practice/generate/class
+    
+    Mastery for every student is read with one query, sessions are
+    generated against the shared content index and stored in one bulk insert.
+    """
+    try:
+        # Validate request
+        data = ClassPracticeSessionRequest(**request.json)
+        student_ids = list(dict.fromkeys(data.student_ids))
+        
+        # Current mastery of every student in one query
+        mastery_records = find_many(
+            STUDENT_CONCEPT_MASTERY,
+            {'student_id': {'$in': student_ids}},
+            {'student_id': 1, 'concept_id': 1, 'mastery_score': 1, 'learning_velocity': 1}
+        )
+        
+        student_mastery = {student_id: {} for student_id in student_ids}
+        learning_velocity = {student_id: {} for student_id in student_ids}
+        for record in mastery_records:
+            student_mastery[record['student_id']][record['concept_id']] = record['mastery_score']
+            learning_velocity[record['student_id']][record['concept_id']] = record.get('learning_velocity', 0)
+        
+        # Due spaced reviews of the whole class in one range query
+        reviews = due_reviews(student_ids)
+        
+        sessions = adaptive_engine.generate_class_sessions(
+            student_ids,
+            [student_mastery[student_id] for student_id in student_ids],
+            [learning_velocity[student_id] for student_id in student_ids],
+            content_index=_content_index(),
+            session_duration=data.session_duration,
+            packing=data.packing,
+            due_reviews=[review_scheduler.due_concepts(reviews[student_id]) for student_id in student_ids]
+        )
+        
+        documents = []
+        for session in sessions:
+            session['session_id'] = str(ObjectId())
+            documents.append({
+                '_id': session['session_id'],
+                'student_id': session['student_id'],
+                'class_id': data.class_id,
+                'assigned_by': data.assigned_by,
+                'session_duration': data.session_duration,
+                'packing': data.packing,
+                'content_items': session['content_items'],
+                'total_items': session['total_items'],
+                'estimated_duration': session['estimated_duration'],
+                'cognitive_load': session['cognitive_load'],
+                'load_status': session['load_status'],
+                'zpd_alignment': session['zpd_alignment'],
+                'status': 'assigned'
+            })
+        
+        insert_many(PRACTICE_SESSIONS, documents)
+        
+        # Validate response
+        response = ClassPracticeSessionResponse(
+            class_id=data.class_id,
+            sessions=[PracticeSessionResponse(**session) for session in sessions],
+            total_sessions=len(sessions)
+        )
+        
+        return jsonify(response.dict()), 201
+        
+    except ValueError as e:
+        return jsonify({
+            'error': 'Validation error',
+            'detail': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'error': 'Internal server error',
+            'detail': str(e)
+        }), 500
+
+
+@mastery_bp.route('/reviews/due', methods=['GET'])
+def get_due_reviews():
+    """
+    BR3: Mastered concepts due for spaced review
+    
+    GET /api/mastery/reviews/due?student_id=ID[&student_id=ID...][&before=ISO]
+    
+    One range query on the review schedule for a student or a class.
+    """
+    try:
+        student_ids = list(dict.fromkeys(request.args.getlist('student_id')))
+        if not student_ids:
+            raise ValueError("At least one student_id is required")
+        before = request.args.get('before')
+        now = datetime.fromisoformat(before) if before else datetime.utcnow()
+        
+        due = due_reviews(student_ids, now)
+        
+        return jsonify({
+            'as_of': now.isoformat(),
+            'students': [
+                {
+                    'student_id': student_id,
+                    'reviews': [
+                        {
+                            'concept_id': entry['concept_id'],
+                            'concept_name': concept_catalog.name(entry['concept_id'], 'Unknown'),
+                            'mastery_score': entry['mastery_score'],
+                            'review_mastery': round(entry['review_mastery'], 2),
+                            'due_at': entry['due_at'].isoformat()
+                        }
+                        for entry in due[student_id]
+                    ]
+                }
+                for student_id in student_ids
+            ],
+            'total_due': sum(len(entries) for entries in due.values())
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({
+            'error': 'Validation error',
+            'detail': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'error': 'Internal server error',
+            'detail': str(e)
+        }), 500
+
+
 @mastery_bp.route('/response/submit', methods=['POST'])
 def submit_student_response():
     """
@@ -339,22 +974,16 @@ def submit_student_response():
         # Validate request
         data = StudentResponseCreate(**request.json)
         
-        # Create response document
-        response_doc = {
-            '_id': str(ObjectId()),
-            'student_id': data.student_id,
-            'item_id': data.item_id,
-            'concept_id': data.concept_id,
-            'is_correct': data.is_correct,
-            'response_time': data.response_time,
-            'hints_used': data.hints_used,
-            'attempts': data.attempts,
-            'response_text': data.response_text,
-            'submitted_at': datetime.utcnow()
-        }
+        # Seed the DKT window before this response is recorded, so a
+        # following /calculate in this process does not count it twice
+        kt_engine.get_dkt_state(data.student_id, data.concept_id)
         
         # Insert into MongoDB
-        response_id = insert_one(STUDENT_RESPONSES, response_doc)
+        response_id = insert_one(STUDENT_RESPONSES, _response_document(data))
+        
+        _append_to_response_window(
+            data.student_id, data.concept_id, data.is_correct, data.response_time
+        )
         
         return jsonify({
             'response_id': response_id,
@@ -373,6 +1002,140 @@ def submit_student_response():
         }), 500
 
 
+@mastery_bp.route('/response/score', methods=['POST'])
+def submit_and_score_response():
+    """
+    BR1, BR2: Record a response, update mastery and pick the next item
+    
+    POST /api/mastery/response/score
+    
+    Replaces /response/submit followed by /calculate: current mastery and
+    the DKT window come from server-side state, so the client sends only
+    the answer.
+    """
+    try:
+        data = ResponseScoreRequest(**request.json)
+        pair_id = f"{data.student_id}_{data.concept_id}"
+        
+        # One read serves current mastery and next-item selection
+        mastery_records = find_many(
+            STUDENT_CONCEPT_MASTERY,
+            {'student_id': data.student_id},
+            projection={
+                'concept_id': 1,
+                'mastery_score': 1,
+                'learning_velocity': 1
+            }
+        )
+        record = next((r for r in mastery_records if r['_id'] == pair_id), None)
+        
+        # Seed the DKT window before this response is recorded, so the
+        # fallback window query cannot count it twice (a cached window is
+        # replaced if another process has rewritten the stored one). Only
+        # this pair's state is read, and only its version while cached; a
+        # stale cached window is reloaded by the engine's state loader.
+        state_key = (data.student_id, data.concept_id)
+        cached = state_key in kt_engine.dkt_states
+        stored = find_one(
+            STUDENT_CONCEPT_MASTERY,
+            {'_id': pair_id},
+            {'dkt_state.version' if cached else 'dkt_state': 1}
+        ) if record else None
+        stored_state = (stored or {}).get('dkt_state')
+        _revalidate_dkt_state(data.student_id, data.concept_id, stored_state)
+        if stored_state and not cached:
+            kt_engine.dkt_states.put(state_key, DKTState.from_document(
+                stored_state, kt_engine.dkt.sequence_length
+            ))
+        kt_engine.get_dkt_state(data.student_id, data.concept_id)
+        
+        bkt_params, prerequisites = _concept_scoring_metadata(data.concept_id)
+        current_mastery = (
+            record['mastery_score'] if record
+            else (bkt_params or kt_engine.bkt.params).p_l0 * 100.0
+        )
+        
+        dkvmn_memory = dkvmn_store.get(data.student_id)
+        result = kt_engine.calculate_mastery(
+            student_id=data.student_id,
+            concept_id=data.concept_id,
+            is_correct=data.is_correct,
+            response_time=data.response_time,
+            current_mastery=current_mastery,
+            response_history=None,
+            related_concepts=(
+                data.related_concepts if data.related_concepts is not None
+                else prerequisites
+            ),
+            bkt_params=bkt_params,
+            dkvmn_memory=dkvmn_memory
+        )
+        dkvmn_store.mark_dirty(data.student_id, [data.concept_id], dkvmn_memory)
+        _invalidate_session_plans([data.student_id])
+        result['timestamp'] = datetime.utcnow()
+        
+        # Persist: the response insert and one combined mastery upsert
+        response_id = insert_one(STUDENT_RESPONSES, _response_document(data))
+        
+        mastery_doc = _mastery_document(data.student_id, data.concept_id, result)
+        mastery_doc['dkt_state'] = _dkt_state_document(data.student_id, data.concept_id)
+        update_one(
+            STUDENT_CONCEPT_MASTERY,
+            {'_id': pair_id},
+            {
+                '$set': mastery_doc,
+                '$inc': {'times_assessed': 1}
+            },
+            upsert=True
+        )
+        reschedule(
+            review_scheduler, data.student_id, data.concept_id,
+            result['mastery_score'], mastery_doc['last_assessed'],
+            record['mastery_score'] if record else None
+        )
+        
+        _append_to_response_window(
+            data.student_id, data.concept_id, data.is_correct, data.response_time
+        )
+        
+        # Next item against the updated mastery
+        student_mastery = {r['concept_id']: r['mastery_score'] for r in mastery_records}
+        learning_velocity = {r['concept_id']: r.get('learning_velocity', 0) for r in mastery_records}
+        student_mastery[data.concept_id] = result['mastery_score']
+        learning_velocity[data.concept_id] = result['learning_velocity']
+        
+        next_item = adaptive_engine.select_next_item(
+            [],
+            student_mastery,
+            learning_velocity,
+            content_index=_content_index()
+        )
+        
+        response = ResponseScoreResponse(
+            response_id=response_id,
+            mastery=MasteryCalculationResponse(**result),
+            next_item={
+                'item_id': next_item.item_id,
+                'concept_id': next_item.concept_id,
+                'difficulty': next_item.difficulty,
+                'estimated_time': next_item.estimated_time
+            } if next_item else None
+        )
+        
+        return jsonify(response.dict()), 201
+        
+    except ValueError as e:
+        return jsonify({
+            'error': 'Validation error',
+            'detail': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'error': 'Internal server error',
+            'detail': str(e)
+        }), 500
+
+
 # ============================================================================
 # MASTERY HISTORY & TRENDS
 # ============================================================================
@@ -459,7 +1222,7 @@ def get_practice_recommendations(student_id):
             if mastery >= 85:
                 continue  # Skip mastered concepts
             
-            concept = find_one(CONCEPTS, {'_id': record['concept_id']})
+            concept = concept_catalog.get(record['concept_id'])
             
             if mastery >= 60:
                 recommendation = 'LIGHT_REVIEW'
@@ -0,0 +1,115 @@
+"""
+AMEP Session Generation Benchmark
+Shows practice-session generation scaling with candidate pool size and
+session duration
+
+Compares the selection loop of AdaptivePracticeEngine.select_next_content
+(running load sum, O(1) per candidate) with the previous loop, which
+recomputed the load of the whole projected selection for every candidate.
+
+Usage (from backend/):
+    python -m benchmarks.session_generation [--repeats N]
+
+Location: backend/benchmarks/session_generation.py
+"""
+
+import argparse
+import random
+import time
+from typing import Callable, Dict, List
+
+from ai_engine.adaptive_practice import AdaptivePracticeEngine, ContentItem
+
+POOL_SIZES = [1000, 4000, 16000, 64000]
+SESSION_DURATIONS = [30, 180, 720, 2880]  # minutes
+
+def make_library(n_items: int, n_concepts: int, seed: int = 7):
+    """Synthetic content library and a student with mastery gaps everywhere"""
+    rng = random.Random(seed)
+    concepts = [f"concept_{i}" for i in range(n_concepts)]
+    items = [
+        ContentItem(
+            item_id=f"item_{i}",
+            concept_id=rng.choice(concepts),
+            difficulty=rng.random(),
+            weight=rng.uniform(0.5, 1.5),
+            estimated_time=rng.randint(1, 3),
+            scaffolding_available=rng.random() < 0.5
+        )
+        for i in range(n_items)
+    ]
+    mastery = {c: rng.uniform(0, 59) for c in concepts}
+    velocity = {c: rng.uniform(-2, 2) for c in concepts}
+    return items, mastery, velocity
+
+def quadratic_selection(
+    engine: AdaptivePracticeEngine,
+    prioritized: List[ContentItem],
+    student_mastery: Dict[str, float],
+    session_time: int
+) -> List[ContentItem]:
+    """Previous selection loop: full load recomputation per candidate"""
+    selected, current_time = [], 0
+    for item in prioritized:
+        if current_time + item.estimated_time > session_time:
+            break
+        if engine.calculate_cognitive_load(selected + [item], student_mastery) <= engine.config.max_load:
+            selected.append(item)
+            current_time += item.estimated_time
+        elif item.scaffolding_available:
+            scaffolded = engine._scaffolded(item)
+            if engine.calculate_cognitive_load(selected + [scaffolded], student_mastery) <= engine.config.max_load:
+                selected.append(scaffolded)
+                current_time += scaffolded.estimated_time
+    return selected
+
+def best_of(fn: Callable[[], object], repeats: int) -> float:
+    """Fastest of `repeats` runs, in milliseconds"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def run(repeats: int = 3):
+    engine = AdaptivePracticeEngine()
+
+    print(f"{'pool':>7} {'minutes':>8} {'selected':>9} {'session ms':>11} "
+          f"{'select ms':>10} {'old select ms':>14} {'us/candidate':>13}")
+
+    for pool_size in POOL_SIZES:
+        # Enough concepts that the per-concept caps keep the whole pool eligible
+        items, mastery, velocity = make_library(pool_size, n_concepts=pool_size // 10)
+        prioritized = engine._prioritize_by_zpd(
+            engine._filter_by_mastery(items, mastery), mastery, velocity
+        )
+
+        for duration in SESSION_DURATIONS:
+            selected = engine.select_next_content(items, mastery, velocity, duration)
+
+            session_ms = best_of(
+                lambda: engine.generate_practice_session('bench', mastery, velocity, items, duration),
+                repeats
+            )
+            # Selection loop alone, on the already ranked candidates
+            select_ms = best_of(
+                lambda: engine._select_within_budget(prioritized, mastery, duration),
+                repeats
+            )
+            old_ms = best_of(
+                lambda: quadratic_selection(engine, prioritized, mastery, duration),
+                repeats
+            )
+
+            print(f"{pool_size:>7} {duration:>8} {len(selected):>9} {session_ms:>11.2f} "
+                  f"{select_ms:>10.2f} {old_ms:>14.2f} "
+                  f"{session_ms * 1000 / pool_size:>13.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark practice-session generation")
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per measurement (best is reported)')
+    args = parser.parse_args()
+
+    run(repeats=args.repeats)
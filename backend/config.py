@@ -116,14 +116,33 @@ class Config:
     BKT_GUESS_RATE = float(os.getenv('BKT_GUESS_RATE', 0.25))
     BKT_SLIP_RATE = float(os.getenv('BKT_SLIP_RATE', 0.1))
     
+    # Offline per-concept BKT fitting (jobs/bkt_refit.py)
+    BKT_FIT_MIN_RESPONSES = int(os.getenv('BKT_FIT_MIN_RESPONSES', 50))
+    BKT_FIT_WORKERS = int(os.getenv('BKT_FIT_WORKERS', 0))  # 0 = all cores
+    
     # Deep Knowledge Tracing parameters
     DKT_SEQUENCE_LENGTH = int(os.getenv('DKT_SEQUENCE_LENGTH', 10))
     DKT_HISTORY_WEIGHT = float(os.getenv('DKT_HISTORY_WEIGHT', 0.7))
     DKT_TREND_WEIGHT = float(os.getenv('DKT_TREND_WEIGHT', 0.3))
+    DKT_WEIGHTS_PATH = os.getenv('DKT_WEIGHTS_PATH')  # .npz LSTM weights + concept_ids (skill order); unset = pattern model
+    DKT_STATE_CACHE_SIZE = int(os.getenv('DKT_STATE_CACHE_SIZE', 100000))  # (student, concept) windows per process
+    RESPONSE_WINDOW_CACHE_SIZE = int(os.getenv('RESPONSE_WINDOW_CACHE_SIZE', 5000))  # students
+    RESPONSE_WINDOW_CACHE_TTL = int(os.getenv('RESPONSE_WINDOW_CACHE_TTL', 120))  # seconds
+    CONCEPT_CATALOG_POLL_INTERVAL = int(os.getenv('CONCEPT_CATALOG_POLL_INTERVAL', 30))  # seconds, without change streams
+    CONCEPT_CATALOG_RELOAD_INTERVAL = int(os.getenv('CONCEPT_CATALOG_RELOAD_INTERVAL', 3600))  # full reload when polling
     
     # DKVMN parameters
     DKVMN_MEMORY_SIZE = int(os.getenv('DKVMN_MEMORY_SIZE', 50))
     DKVMN_CORRELATION_THRESHOLD = float(os.getenv('DKVMN_CORRELATION_THRESHOLD', 0.3))
+    DKVMN_MEMORY_BUDGET_MB = int(os.getenv('DKVMN_MEMORY_BUDGET_MB', 64))  # resident per-student memories
+    DKVMN_MEMORY_TTL = int(os.getenv('DKVMN_MEMORY_TTL', 1800))  # seconds idle before eviction
+    DKVMN_WRITE_BATCH_SIZE = int(os.getenv('DKVMN_WRITE_BATCH_SIZE', 200))  # write-back mode
+    DKVMN_WRITE_BACK = os.getenv('DKVMN_WRITE_BACK', 'False') == 'True'  # only with a single API process
+    
+    # Bulk mastery recalculation (jobs/mastery_recalculation.py)
+    MASTERY_RECALC_BATCH_SIZE = int(os.getenv('MASTERY_RECALC_BATCH_SIZE', 20000))  # responses per chunk
+    MASTERY_RECALC_WORKERS = int(os.getenv('MASTERY_RECALC_WORKERS', 1))  # concurrent jobs per API process
+    MASTERY_RECALC_LEASE_SECONDS = int(os.getenv('MASTERY_RECALC_LEASE_SECONDS', 900))  # heartbeat age before a job can be resumed elsewhere
     
     # Mastery thresholds (BR3: Efficiency optimization)
     MASTERY_THRESHOLD_SKIP = float(os.getenv('MASTERY_THRESHOLD_SKIP', 85.0))
@@ -143,6 +162,23 @@ class Config:
     DIFFICULTY_ADJUSTMENT_GAMMA = float(os.getenv('DIFFICULTY_ADJUSTMENT_GAMMA', 0.1))
     DIFFICULTY_ADJUSTMENT_ALPHA = float(os.getenv('DIFFICULTY_ADJUSTMENT_ALPHA', 0.01))
     
+    # In-memory content index (rebuilt when concepts change or after the TTL)
+    CONTENT_INDEX_TTL = int(os.getenv('CONTENT_INDEX_TTL', 300))  # seconds
+    
+    # Top-ranked candidates packed exactly by the 'optimal' session packing
+    SESSION_PACKING_POOL_SIZE = int(os.getenv('SESSION_PACKING_POOL_SIZE', 64))
+    
+    # Session plans reused for identical requests (dropped when mastery changes)
+    SESSION_PLAN_CACHE_SIZE = int(os.getenv('SESSION_PLAN_CACHE_SIZE', 10000))  # students
+    SESSION_PLAN_CACHE_TTL = int(os.getenv('SESSION_PLAN_CACHE_TTL', 600))  # seconds
+
+    # Spaced repetition of mastered concepts (ai_engine/spaced_repetition.py)
+    REVIEW_BASE_STABILITY_DAYS = float(os.getenv('REVIEW_BASE_STABILITY_DAYS', 10.0))
+    REVIEW_TARGET_RETENTION = float(os.getenv('REVIEW_TARGET_RETENTION', 0.9))
+    
+    # Seed for session ID generation; set for reproducible runs (load tests)
+    SESSION_RNG_SEED = int(os.environ['SESSION_RNG_SEED']) if os.getenv('SESSION_RNG_SEED') else None
+
     # Session defaults
     DEFAULT_SESSION_DURATION = int(os.getenv('DEFAULT_SESSION_DURATION', 30))
     MAX_SESSION_DURATION = int(os.getenv('MAX_SESSION_DURATION', 180))
@@ -163,6 +199,30 @@ class Config:
     ENGAGEMENT_IMPLICIT_WEIGHT = float(os.getenv('ENGAGEMENT_IMPLICIT_WEIGHT', 0.6))
     ENGAGEMENT_EXPLICIT_WEIGHT = float(os.getenv('ENGAGEMENT_EXPLICIT_WEIGHT', 0.4))
     
+    # Engagement event ingestion (models/engagement_log_writer.py)
+    ENGAGEMENT_INGEST_QUEUE_SIZE = int(os.getenv('ENGAGEMENT_INGEST_QUEUE_SIZE', 100000))  # events held in memory
+    ENGAGEMENT_INGEST_FLUSH_SIZE = int(os.getenv('ENGAGEMENT_INGEST_FLUSH_SIZE', 5000))  # events per insert_many
+    ENGAGEMENT_INGEST_FLUSH_INTERVAL = float(os.getenv('ENGAGEMENT_INGEST_FLUSH_INTERVAL', 1.0))  # seconds
+    ENGAGEMENT_INGEST_BLOCK_TIMEOUT = float(os.getenv('ENGAGEMENT_INGEST_BLOCK_TIMEOUT', 0.0))  # seconds to wait when full
+    ENGAGEMENT_INGEST_WRITE_RETRIES = int(os.getenv('ENGAGEMENT_INGEST_WRITE_RETRIES', 3))  # per failed batch
+    ENGAGEMENT_INGEST_RETRY_BACKOFF = float(os.getenv('ENGAGEMENT_INGEST_RETRY_BACKOFF', 0.5))  # seconds, doubling
+    
+    # Streaming disengagement detection (ai_engine/engagement_stream.py)
+    ENGAGEMENT_STREAM_WINDOW = int(os.getenv('ENGAGEMENT_STREAM_WINDOW', 20))  # responses per student
+    ENGAGEMENT_SWEEP_INTERVAL = float(os.getenv('ENGAGEMENT_SWEEP_INTERVAL', 300))  # seconds between expiry sweeps
+    
+    # Rolling implicit signals (ai_engine/engagement_signals.py)
+    ENGAGEMENT_SIGNAL_WINDOW_DAYS = int(os.getenv('ENGAGEMENT_SIGNAL_WINDOW_DAYS', 7))
+    # Seconds before a window is replayed from ENGAGEMENT_LOGS again; set it when
+    # more than one API process ingests events (0 = single process)
+    ENGAGEMENT_SIGNAL_RESEED_SECONDS = float(os.getenv('ENGAGEMENT_SIGNAL_RESEED_SECONDS', 0))
+    ENGAGEMENT_SIGNAL_SEED_CHUNK = int(os.getenv('ENGAGEMENT_SIGNAL_SEED_CHUNK', 200))  # students replayed per delivery hold
+    
+    # Class engagement snapshots (models/class_engagement.py, jobs/class_engagement_snapshot.py)
+    CLASS_ENGAGEMENT_TOP_K = int(os.getenv('CLASS_ENGAGEMENT_TOP_K', 10))  # at-risk students shown
+    CLASS_ENGAGEMENT_TREND_DAYS = int(os.getenv('CLASS_ENGAGEMENT_TREND_DAYS', 7))  # trend baseline age
+    CLASS_ENGAGEMENT_HISTORY_DAYS = int(os.getenv('CLASS_ENGAGEMENT_HISTORY_DAYS', 90))  # snapshots retained
+    
     # Alert thresholds
     ENGAGEMENT_AT_RISK_THRESHOLD = float(os.getenv('ENGAGEMENT_AT_RISK_THRESHOLD', 50.0))
     ENGAGEMENT_CRITICAL_THRESHOLD = float(os.getenv('ENGAGEMENT_CRITICAL_THRESHOLD', 30.0))
@@ -0,0 +1,120 @@
+"""
+AMEP BKT Refit Job
+Offline per-concept BKT parameter fitting over the full response log
+
+Streams student_responses grouped by concept (and by student within a
+concept, in submission order), fits P(L0), P(T), P(G), P(S) for each concept
+across a process pool, and writes the result into the concept document as
+`bkt_params`.
+
+Usage (from backend/):
+    python -m jobs.bkt_refit [--workers N] [--min-responses N]
+
+Location: backend/jobs/bkt_refit.py
+"""
+
+import argparse
+import itertools
+from datetime import datetime
+from typing import Iterator, List, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+
+from config import Config
+from models.database import (
+    db,
+    CONCEPTS,
+    STUDENT_RESPONSES,
+    bulk_write
+)
+from ai_engine.bkt_fitting import fit_concepts_parallel
+
+# Concept documents updated per bulk_write
+WRITE_BATCH_SIZE = 500
+
+def stream_concept_sequences(
+    min_responses: int = Config.BKT_FIT_MIN_RESPONSES
+) -> Iterator[Tuple[str, List[List[bool]]]]:
+    """
+    Yield (concept_id, per-student correctness sequences) one concept at a time
+
+    Relies on the (concept_id, student_id, submitted_at) index so the sort
+    is served by the index and only one concept is held in memory.
+    Concepts with fewer than min_responses responses are skipped and keep
+    their current parameters.
+    """
+    cursor = db[STUDENT_RESPONSES].find(
+        {},
+        {'_id': 0, 'concept_id': 1, 'student_id': 1, 'is_correct': 1}
+    ).sort([
+        ('concept_id', ASCENDING),
+        ('student_id', ASCENDING),
+        ('submitted_at', ASCENDING)
+    ]).batch_size(10000)
+
+    for concept_id, concept_rows in itertools.groupby(cursor, key=lambda r: r['concept_id']):
+        sequences = [
+            [bool(r['is_correct']) for r in student_rows]
+            for _, student_rows in itertools.groupby(concept_rows, key=lambda r: r['student_id'])
+        ]
+
+        if sum(len(seq) for seq in sequences) >= min_responses:
+            yield concept_id, sequences
+
+def run_refit(
+    max_workers: int = Config.BKT_FIT_WORKERS,
+    min_responses: int = Config.BKT_FIT_MIN_RESPONSES
+) -> int:
+    """
+    Refit every concept with enough data and persist the parameters
+
+    Returns: number of concepts updated
+    """
+    operations = []
+    updated = 0
+
+    for result in fit_concepts_parallel(
+        stream_concept_sequences(min_responses),
+        max_workers=max_workers or None
+    ):
+        operations.append(UpdateOne(
+            {'_id': result.concept_id},
+            {'$set': {
+                'bkt_params': {
+                    'p_l0': result.params.p_l0,
+                    'p_t': result.params.p_t,
+                    'p_g': result.params.p_g,
+                    'p_s': result.params.p_s
+                },
+                'bkt_fit': {
+                    'log_likelihood': round(result.log_likelihood, 4),
+                    'n_students': result.n_students,
+                    'n_responses': result.n_responses,
+                    'fitted_at': datetime.utcnow()
+                },
+                'updated_at': datetime.utcnow()
+            }}
+        ))
+
+        if len(operations) >= WRITE_BATCH_SIZE:
+            bulk_write(CONCEPTS, operations)
+            updated += len(operations)
+            operations = []
+            print(f"✓ {updated} concepts refit")
+
+    bulk_write(CONCEPTS, operations)
+    updated += len(operations)
+
+    print(f"✓ BKT refit complete: {updated} concepts updated")
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refit per-concept BKT parameters")
+    parser.add_argument('--workers', type=int, default=Config.BKT_FIT_WORKERS,
+                        help='Worker processes (0 = all cores)')
+    parser.add_argument('--min-responses', type=int, default=Config.BKT_FIT_MIN_RESPONSES,
+                        help='Minimum responses required to fit a concept')
+    args = parser.parse_args()
+
+    run_refit(max_workers=args.workers, min_responses=args.min_responses)
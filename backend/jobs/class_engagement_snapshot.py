@@ -0,0 +1,246 @@
+"""
+AMEP Class Engagement Snapshot Job
+Rebuilds CLASS_ENGAGEMENT from the latest analysis of every student
+
+Run on a schedule (e.g. nightly, after the school-wide batch analysis):
+
+- Streams STUDENT_ENGAGEMENT in class_id order (class_id index) and
+  recomputes each class's score sum, level counters and at-risk list,
+  replacing the incrementally maintained values unless an analysis
+  updated the class meanwhile (those classes are rebuilt again)
+- Appends one CLASS_ENGAGEMENT_HISTORY snapshot per class and prunes
+  snapshots older than the retention period
+- Sets each class's trend baseline to its newest snapshot that is at
+  least `trend_days` old, so dashboard trends need no extra reads
+
+Usage (from backend/):
+    python -m jobs.class_engagement_snapshot [--top-k N] [--trend-days N]
+
+Location: backend/jobs/class_engagement_snapshot.py
+"""
+
+import argparse
+import itertools
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from config import Config
+from models.database import (
+    db,
+    STUDENT_ENGAGEMENT,
+    CLASS_ENGAGEMENT,
+    CLASS_ENGAGEMENT_HISTORY,
+    aggregate,
+    find_many,
+    insert_many,
+    update_many,
+    delete_many,
+    bulk_write
+)
+from models.class_engagement import ALERT_LEVELS, at_risk_entry
+from ai_engine.engagement_detection import ENGAGEMENT_LEVELS
+
+# Classes written per bulk_write call
+WRITE_BATCH_SIZE = 500
+
+# Rebuilds of a class that keeps being analyzed during the run
+REBUILD_PASSES = 3
+
+def trend_baselines(before: datetime) -> Dict[str, Dict]:
+    """Newest retained snapshot taken at or before `before`, per class"""
+    return {
+        row['_id']: row for row in aggregate(CLASS_ENGAGEMENT_HISTORY, [
+            {'$match': {'taken_at': {'$lte': before}}},
+            {'$sort': {'class_id': ASCENDING, 'taken_at': DESCENDING}},
+            {'$group': {
+                '_id': '$class_id',
+                'class_engagement_index': {'$first': '$class_engagement_index'},
+                'taken_at': {'$first': '$taken_at'}
+            }}
+        ])
+    }
+
+def build_snapshot(class_id: str, records: Iterable[Dict], top_k: int) -> Dict:
+    """CLASS_ENGAGEMENT fields of one class from its student records"""
+    student_count, score_sum = 0, 0.0
+    distribution = {level.value: 0 for level in ENGAGEMENT_LEVELS}
+    at_risk = []
+    for record in records:
+        student_count += 1
+        score_sum += record['engagement_score']
+        distribution[record['engagement_level']] += 1
+        if record['engagement_level'] in ALERT_LEVELS:
+            at_risk.append(at_risk_entry(record))
+    at_risk.sort(key=lambda entry: entry['engagement_score'])
+
+    return {
+        'class_id': class_id,
+        'student_count': student_count,
+        'score_sum': score_sum,
+        'distribution': distribution,
+        'at_risk': at_risk[:2 * top_k]
+    }
+
+def write_guarded(operations: List[UpdateOne], class_ids: List[str], now: datetime) -> List[str]:
+    """
+    Apply rebuilds guarded on each class's observed updated_at
+
+    Returns: the classes whose guard failed (an analysis updated them after
+    they were observed), left as they were
+    """
+    try:
+        result = bulk_write(CLASS_ENGAGEMENT, operations)
+        written = result.matched_count + result.upserted_count if result else 0
+    except BulkWriteError as e:
+        # A class created since it was observed: its upsert hit the _id
+        if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+            raise
+        written = -1
+    if written == len(operations):
+        return []
+    return [
+        document['_id'] for document in find_many(
+            CLASS_ENGAGEMENT,
+            {'_id': {'$in': class_ids}, 'updated_at': {'$ne': now}},
+            {'_id': 1}
+        )
+    ]
+
+def rebuild_classes(
+    class_ids: Optional[List[str]],
+    now: datetime,
+    baselines: Dict[str, Dict],
+    top_k: int
+) -> Tuple[int, List[str]]:
+    """
+    Rebuild and snapshot classes from STUDENT_ENGAGEMENT
+
+    class_ids: classes to rebuild (None = every class with analyzed students)
+
+    Each class's updated_at is observed before its students are read and
+    the rebuild only applies while it is unchanged, so an analysis' $inc
+    landing meanwhile is never overwritten.
+
+    Returns: (classes snapshotted, classes skipped because they changed)
+    """
+    observed = {
+        document['_id']: document.get('updated_at') for document in find_many(
+            CLASS_ENGAGEMENT,
+            {} if class_ids is None else {'_id': {'$in': class_ids}},
+            {'updated_at': 1}
+        )
+    }
+
+    cursor = db[STUDENT_ENGAGEMENT].find(
+        {'class_id': {'$ne': None} if class_ids is None else {'$in': class_ids}},
+        {'_id': 0, 'student_id': 1, 'class_id': 1, 'engagement_score': 1,
+         'engagement_level': 1, 'recommendations': 1}
+    ).sort([('class_id', ASCENDING)]).batch_size(10000)
+
+    operations: List[UpdateOne] = []
+    history: List[Dict] = []
+    snapshotted = 0
+    skipped: List[str] = []
+
+    def flush():
+        nonlocal snapshotted
+        batch_skipped = set(write_guarded(operations, [row['class_id'] for row in history], now))
+        written = [row for row in history if row['class_id'] not in batch_skipped]
+        if written:
+            insert_many(CLASS_ENGAGEMENT_HISTORY, written, ordered=False)
+        snapshotted += len(written)
+        skipped.extend(batch_skipped)
+        operations.clear()
+        history.clear()
+
+    for class_id, records in itertools.groupby(cursor, key=lambda r: r['class_id']):
+        snapshot = build_snapshot(class_id, records, top_k)
+        baseline = baselines.get(class_id)
+        snapshot.update(
+            baseline_index=baseline['class_engagement_index'] if baseline else None,
+            baseline_at=baseline['taken_at'] if baseline else None,
+            snapshot_at=now,
+            updated_at=now
+        )
+        operations.append(UpdateOne(
+            {'_id': class_id, 'updated_at': observed.get(class_id)},
+            {'$set': snapshot},
+            upsert=True
+        ))
+        history.append({
+            'class_id': class_id,
+            'class_engagement_index': round(snapshot['score_sum'] / snapshot['student_count'], 2),
+            'student_count': snapshot['student_count'],
+            'distribution': snapshot['distribution'],
+            'alert_count': sum(snapshot['distribution'][level] for level in ALERT_LEVELS),
+            'taken_at': now
+        })
+
+        if len(operations) >= WRITE_BATCH_SIZE:
+            flush()
+            print(f"✓ {snapshotted} classes snapshotted")
+
+    flush()
+    return snapshotted, skipped
+
+def run_snapshots(
+    top_k: int = Config.CLASS_ENGAGEMENT_TOP_K,
+    trend_days: int = Config.CLASS_ENGAGEMENT_TREND_DAYS,
+    history_days: int = Config.CLASS_ENGAGEMENT_HISTORY_DAYS
+) -> int:
+    """
+    Rebuild and snapshot every class with analyzed students
+
+    Classes analyzed during their rebuild are rebuilt again, up to
+    REBUILD_PASSES times in all; any still changing keep their incremental
+    values until the next run.
+
+    Returns: number of classes snapshotted
+    """
+    # Millisecond precision, as MongoDB stores it, so rebuilt classes are
+    # recognizable by updated_at == now
+    now = datetime.utcnow()
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    baselines = trend_baselines(now - timedelta(days=trend_days))
+
+    snapshotted, skipped = rebuild_classes(None, now, baselines, top_k)
+    for _ in range(REBUILD_PASSES - 1):
+        if not skipped:
+            break
+        rebuilt, skipped = rebuild_classes(skipped, now, baselines, top_k)
+        snapshotted += rebuilt
+    if skipped:
+        print(f"⚠ {len(skipped)} classes changed during every rebuild; left to the next run")
+
+    # Classes whose students all left (not rewritten or updated since the run started)
+    update_many(
+        CLASS_ENGAGEMENT,
+        {'updated_at': {'$lt': now}},
+        {'$set': {
+            'student_count': 0,
+            'score_sum': 0.0,
+            'distribution': {level.value: 0 for level in ENGAGEMENT_LEVELS},
+            'at_risk': [],
+            'snapshot_at': now
+        }}
+    )
+    delete_many(CLASS_ENGAGEMENT_HISTORY, {'taken_at': {'$lt': now - timedelta(days=history_days)}})
+
+    print(f"✓ Class engagement snapshot complete: {snapshotted} classes")
+    return snapshotted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild and snapshot class engagement")
+    parser.add_argument('--top-k', type=int, default=Config.CLASS_ENGAGEMENT_TOP_K,
+                        help='At-risk students shown per class')
+    parser.add_argument('--trend-days', type=int, default=Config.CLASS_ENGAGEMENT_TREND_DAYS,
+                        help='Age of the snapshot trends compare to')
+    parser.add_argument('--history-days', type=int, default=Config.CLASS_ENGAGEMENT_HISTORY_DAYS,
+                        help='Days of snapshots to retain')
+    args = parser.parse_args()
+
+    run_snapshots(top_k=args.top_k, trend_days=args.trend_days, history_days=args.history_days)
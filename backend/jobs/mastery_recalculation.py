@@ -0,0 +1,397 @@
+"""
+AMEP Mastery Recalculation Job
+Recomputes STUDENT_CONCEPT_MASTERY from the response log for a class or district
+
+Run after concept weights, prerequisites or BKT parameters change. Responses
+are streamed with a cursor in per-student submission order, which is the only
+order the models depend on (BKT and DKT state are per student-concept pair,
+DKVMN memory is per student). Rows are processed in chunks of whole students:
+
+- Within a chunk, rows are split into waves by their rank within the
+  student, so each wave holds at most one response per student and runs
+  as one HybridKnowledgeTracing.calculate_mastery_batch call
+- Results (mastery, DKVMN memory and the spaced-repetition review queue)
+  are written with unordered bulk_write upserts, then the job
+  document records progress and a checkpoint (last written student)
+- A job resumes after its checkpoint; re-running a chunk is idempotent
+- The job document carries a heartbeat (renewed with every checkpoint);
+  a job is only resumed by whoever claims it, and a queued or running job
+  can be claimed once its heartbeat is older than the lease
+
+Usage (from backend/):
+    python -m jobs.mastery_recalculation [--students ID [ID ...]] [--batch-size N]
+    python -m jobs.mastery_recalculation --resume JOB_ID
+
+Location: backend/jobs/mastery_recalculation.py
+"""
+
+import argparse
+import itertools
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+
+from config import Config
+from models.database import (
+    db,
+    STUDENT_CONCEPT_MASTERY,
+    STUDENT_RESPONSES,
+    DKVMN_MEMORY,
+    MASTERY_JOBS,
+    REVIEW_SCHEDULE,
+    find_one,
+    insert_one,
+    update_one,
+    find_one_and_update,
+    count_documents,
+    bulk_write
+)
+from models.memory_store import memory_operation
+from models.review_schedule import review_operations
+from models.concept_catalog import concept_catalog
+from ai_engine.knowledge_tracing import (
+    HybridKnowledgeTracing,
+    BKTParameters,
+    DKVMNMemory
+)
+from ai_engine.prerequisite_graph import PrerequisiteGraph
+from ai_engine.spaced_repetition import ReviewScheduler
+
+# Documents per bulk_write call
+WRITE_BATCH_SIZE = 1000
+
+# ============================================================================
+# JOB DOCUMENTS
+# ============================================================================
+
+def create_job(student_ids: Optional[List[str]] = None) -> str:
+    """
+    Register a recalculation job for the given students (None = all students)
+
+    Returns: job_id
+    """
+    query = _response_query(student_ids)
+    if student_ids is None:
+        total = db[STUDENT_RESPONSES].estimated_document_count()
+    else:
+        total = count_documents(STUDENT_RESPONSES, query)
+
+    return insert_one(MASTERY_JOBS, {
+        '_id': str(ObjectId()),
+        'status': 'queued',
+        'scope': {'student_ids': student_ids},
+        'total_responses': total,
+        'processed_responses': 0,
+        'processed_students': 0,
+        'pairs_written': 0,
+        'checkpoint': None,
+        'heartbeat_at': datetime.utcnow()
+    })
+
+def get_job(job_id: str) -> Optional[Dict]:
+    return find_one(MASTERY_JOBS, {'_id': job_id})
+
+def claim_job(
+    job_id: str,
+    lease_seconds: int = Config.MASTERY_RECALC_LEASE_SECONDS
+) -> Optional[Dict]:
+    """
+    Atomically take over a job for resuming: a failed job, or a queued or
+    running job whose heartbeat is older than the lease (its worker died)
+
+    Returns: the job document as it was before the claim, or None if the
+    job is completed or still owned by a live worker
+    """
+    now = datetime.utcnow()
+    return find_one_and_update(
+        MASTERY_JOBS,
+        {'_id': job_id, '$or': [
+            {'status': 'failed'},
+            {
+                'status': {'$in': ['queued', 'running']},
+                'heartbeat_at': {'$not': {'$gte': now - timedelta(seconds=lease_seconds)}}
+            }
+        ]},
+        {'$set': {'status': 'queued', 'heartbeat_at': now}}
+    )
+
+def _response_query(student_ids: Optional[List[str]], after_student: Optional[str] = None) -> Dict:
+    query = {}
+    if student_ids is not None:
+        query['student_id'] = {'$in': student_ids}
+    if after_student is not None:
+        query.setdefault('student_id', {})['$gt'] = after_student
+    return query
+
+# ============================================================================
+# STREAMING
+# ============================================================================
+
+def stream_student_chunks(
+    student_ids: Optional[List[str]],
+    after_student: Optional[str],
+    batch_size: int
+) -> Iterator[List[Dict]]:
+    """
+    Yield lists of response rows holding at least batch_size rows of whole students
+
+    Served by the (student_id, submitted_at, _id) index; a student is never
+    split across chunks, so every chunk boundary is a valid checkpoint.
+    """
+    cursor = db[STUDENT_RESPONSES].find(
+        _response_query(student_ids, after_student),
+        {
+            '_id': 0,
+            'student_id': 1,
+            'concept_id': 1,
+            'is_correct': 1,
+            'response_time': 1,
+            'submitted_at': 1
+        }
+    ).sort([
+        ('student_id', ASCENDING),
+        ('submitted_at', ASCENDING),
+        ('_id', ASCENDING)
+    ]).batch_size(10000)
+
+    chunk = []
+    for _, student_rows in itertools.groupby(cursor, key=lambda r: r['student_id']):
+        chunk.extend(student_rows)
+        if len(chunk) >= batch_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+# ============================================================================
+# RECALCULATION
+# ============================================================================
+
+def load_concept_metadata() -> Dict[str, Tuple[Optional[BKTParameters], List[str]]]:
+    """Fitted BKT parameters and prerequisites for every concept, read once per job"""
+    return {
+        concept_id: (
+            concept_catalog.bkt_params(concept_id),
+            concept_catalog.prerequisites(concept_id)
+        )
+        for concept_id in concept_catalog.concept_ids()
+    }
+
+def build_engine(graph: PrerequisiteGraph) -> HybridKnowledgeTracing:
+    """
+    Engine for a job run, starting from empty DKT state
+
+    Prerequisite correlations are seeded into the DKVMN key memory up front,
+    so a read does not depend on which student happened to write a concept
+    first.
+    """
+    engine = HybridKnowledgeTracing(
+        dkt_weights_path=Config.DKT_WEIGHTS_PATH,
+        dkt_sequence_length=Config.DKT_SEQUENCE_LENGTH
+    )
+    graph.apply_correlations(engine.dkvmn)
+    return engine
+
+def recalculate_chunk(
+    engine: HybridKnowledgeTracing,
+    rows: List[Dict],
+    concept_metadata: Dict[str, Tuple[Optional[BKTParameters], List[str]]],
+    job_id: str,
+    scheduler: Optional[ReviewScheduler] = None
+) -> Tuple[List[UpdateOne], List[UpdateOne], List]:
+    """
+    Replay a chunk of whole students from scratch
+
+    Returns: (STUDENT_CONCEPT_MASTERY upserts, DKVMN_MEMORY upserts,
+              REVIEW_SCHEDULE updates)
+    """
+    # Every pair in the chunk must stay resident until it is written
+    engine.dkt_states.clear()
+    engine.dkt_states.maxsize = max(engine.dkt_states.maxsize, len(rows))
+
+    # Rank of each row within its student (rows are grouped by student)
+    student_ids = [row['student_id'] for row in rows]
+    starts = np.flatnonzero(
+        np.r_[True, np.array(student_ids[1:]) != np.array(student_ids[:-1])]
+    )
+    ranks = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+
+    is_correct = np.array([bool(row['is_correct']) for row in rows])
+    response_times = np.array([float(row.get('response_time') or 0.0) for row in rows])
+
+    memories: Dict[str, DKVMNMemory] = {}
+    mastery: Dict[Tuple[str, str], float] = {}
+    latest: Dict[Tuple[str, str], Tuple[Dict, int, Dict]] = {}
+
+    # Row indices grouped by rank with one stable sort (submission order kept)
+    order = np.argsort(ranks, kind='stable')
+    waves = np.split(order, np.flatnonzero(np.diff(ranks[order])) + 1) if len(rows) else []
+
+    for wave in waves:
+        wave_students = [student_ids[i] for i in wave]
+        wave_concepts = [rows[i]['concept_id'] for i in wave]
+        metadata = [concept_metadata.get(c, (None, [])) for c in wave_concepts]
+        params = [m[0] or engine.bkt.params for m in metadata]
+
+        current = np.array([
+            mastery.get((s, c), p.p_l0 * 100.0)
+            for s, c, p in zip(wave_students, wave_concepts, params)
+        ])
+
+        results = engine.calculate_mastery_batch(
+            wave_students,
+            wave_concepts,
+            is_correct[wave],
+            response_times[wave],
+            current,
+            [m[1] for m in metadata],
+            bkt_params=params,
+            dkvmn_memories=[memories.setdefault(s, DKVMNMemory()) for s in wave_students]
+        )
+
+        for i, student_id, concept_id, result in zip(wave, wave_students, wave_concepts, results):
+            key = (student_id, concept_id)
+            mastery[key] = result['mastery_score']
+            count = latest[key][1] + 1 if key in latest else 1
+            latest[key] = (result, count, rows[i])
+
+    now = datetime.utcnow()
+    mastery_operations = []
+    for (student_id, concept_id), (result, count, row) in latest.items():
+        mastery_operations.append(UpdateOne(
+            {'_id': f"{student_id}_{concept_id}"},
+            {'$set': {
+                'student_id': student_id,
+                'concept_id': concept_id,
+                'mastery_score': result['mastery_score'],
+                'bkt_component': result['bkt_component'],
+                'dkt_component': result['dkt_component'],
+                'dkvmn_component': result['dkvmn_component'],
+                'confidence': result['confidence'],
+                'learning_velocity': result['learning_velocity'],
+                'last_assessed': row.get('submitted_at'),
+                'times_assessed': count,
+                'dkt_state': dict(
+                    engine.get_dkt_state(student_id, concept_id).to_document(),
+                    version=str(ObjectId())
+                ),
+                'recalculated_by': job_id,
+                'updated_at': now
+            }},
+            upsert=True
+        ))
+
+    memory_operations = [
+        memory_operation(engine.dkvmn, student_id, memory)
+        for student_id, memory in memories.items()
+    ]
+
+    review_updates = review_operations(
+        scheduler or ReviewScheduler(),
+        list(latest),
+        [result['mastery_score'] for result, _, _ in latest.values()],
+        [row.get('submitted_at') or now for _, _, row in latest.values()]
+    )
+
+    return mastery_operations, memory_operations, review_updates
+
+def _write_in_batches(collection_name: str, operations: List[UpdateOne]):
+    for start in range(0, len(operations), WRITE_BATCH_SIZE):
+        bulk_write(collection_name, operations[start:start + WRITE_BATCH_SIZE])
+
+def run_recalculation(
+    job_id: str,
+    batch_size: int = Config.MASTERY_RECALC_BATCH_SIZE
+) -> Dict:
+    """
+    Run (or resume) a recalculation job until it completes
+
+    Continues after the job's checkpoint. Progress and the checkpoint are
+    updated on the job document after every chunk has been written.
+
+    Returns: the final job document
+    """
+    job = get_job(job_id)
+    if not job:
+        raise ValueError(f"Unknown recalculation job: {job_id}")
+    if job['status'] == 'completed':
+        raise ValueError(f"Recalculation job {job_id} has already completed")
+
+    update_one(MASTERY_JOBS, {'_id': job_id}, {'$set': {
+        'status': 'running',
+        'started_at': job.get('started_at') or datetime.utcnow(),
+        'heartbeat_at': datetime.utcnow(),
+        'error': None
+    }})
+
+    try:
+        concept_metadata = load_concept_metadata()
+        engine = build_engine(concept_catalog.prerequisite_graph())
+        scheduler = ReviewScheduler(
+            base_stability_days=Config.REVIEW_BASE_STABILITY_DAYS,
+            target_retention=Config.REVIEW_TARGET_RETENTION
+        )
+
+        checkpoint = job.get('checkpoint') or {}
+        for rows in stream_student_chunks(
+            job['scope'].get('student_ids'),
+            checkpoint.get('student_id'),
+            batch_size
+        ):
+            mastery_operations, memory_operations, review_updates = recalculate_chunk(
+                engine, rows, concept_metadata, job_id, scheduler
+            )
+            _write_in_batches(STUDENT_CONCEPT_MASTERY, mastery_operations)
+            _write_in_batches(DKVMN_MEMORY, memory_operations)
+            _write_in_batches(REVIEW_SCHEDULE, review_updates)
+
+            update_one(MASTERY_JOBS, {'_id': job_id}, {
+                '$set': {
+                    'checkpoint': {'student_id': rows[-1]['student_id']},
+                    'heartbeat_at': datetime.utcnow()
+                },
+                '$inc': {
+                    'processed_responses': len(rows),
+                    'processed_students': len(memory_operations),
+                    'pairs_written': len(mastery_operations)
+                }
+            })
+    except Exception as e:
+        update_one(MASTERY_JOBS, {'_id': job_id}, {'$set': {
+            'status': 'failed',
+            'error': str(e)
+        }})
+        raise
+
+    update_one(MASTERY_JOBS, {'_id': job_id}, {'$set': {
+        'status': 'completed',
+        'completed_at': datetime.utcnow()
+    }})
+
+    job = get_job(job_id)
+    print(
+        f"✓ Mastery recalculation {job_id} complete: "
+        f"{job['processed_responses']} responses, {job['pairs_written']} pairs"
+    )
+    return job
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recalculate concept mastery from the response log")
+    parser.add_argument('--students', nargs='+', default=None,
+                        help='Student IDs to recalculate (default: all students)')
+    parser.add_argument('--resume', metavar='JOB_ID', default=None,
+                        help='Resume an interrupted job from its checkpoint')
+    parser.add_argument('--batch-size', type=int, default=Config.MASTERY_RECALC_BATCH_SIZE,
+                        help='Minimum responses per processing chunk')
+    args = parser.parse_args()
+
+    if args.resume and not claim_job(args.resume):
+        parser.exit(1, f"✗ Job {args.resume} is completed, unknown or still running\n")
+    job_id = args.resume or create_job(args.students)
+    print(f"→ Running mastery recalculation job {job_id}")
+    run_recalculation(job_id, batch_size=args.batch_size)
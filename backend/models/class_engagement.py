@@ -0,0 +1,173 @@
+"""
+AMEP Class Engagement Snapshots
+Materialized per-class engagement for the teacher dashboard
+
+CLASS_ENGAGEMENT holds one document per class with the running sum of
+student scores (class_engagement_index = score_sum / student_count),
+counters per EngagementLevel and the AT_RISK/CRITICAL students with the
+lowest scores. Every analysis updates it with $inc deltas against the
+student's previous STUDENT_ENGAGEMENT record, so a dashboard read is a
+single document fetch.
+
+Each student's previous record is read and replaced in one
+find_one_and_update, so concurrent analyses of a student chain their
+deltas instead of both subtracting the same record.
+
+The at-risk list keeps `2 * top_k` entries so students leaving it can be
+replaced; it is exact whenever a class has at most that many alerts, and
+jobs/class_engagement_snapshot.py rebuilds every class from
+STUDENT_ENGAGEMENT on a schedule.
+
+Location: backend/models/class_engagement.py
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from config import Config
+from models.database import (
+    STUDENT_ENGAGEMENT, CLASS_ENGAGEMENT,
+    find_one, find_one_and_update, bulk_write
+)
+from ai_engine.engagement_detection import ENGAGEMENT_LEVELS, EngagementDetectionEngine
+
+ALERT_LEVELS = ('AT_RISK', 'CRITICAL')
+
+def at_risk_entry(record: Dict) -> Dict:
+    return {
+        'student_id': record['student_id'],
+        'engagement_score': record['engagement_score'],
+        'engagement_level': record['engagement_level'],
+        'recommendations': record.get('recommendations', [])
+    }
+
+def class_engagement_operations(
+    previous: Dict[str, Dict],
+    current: List[Dict],
+    now: datetime,
+    top_k: int = Config.CLASS_ENGAGEMENT_TOP_K
+) -> List[UpdateOne]:
+    """
+    CLASS_ENGAGEMENT updates for changed student records
+
+    previous: student_id -> STUDENT_ENGAGEMENT record before the change
+    current: the new records (class_id None = not in a class)
+
+    Per class: one $inc of the deltas that also $pulls the changed
+    students from the at-risk list, then one $push of their new entries
+    (run ordered).
+    """
+    inc = defaultdict(lambda: defaultdict(float))
+    pulled = defaultdict(list)
+    pushed = defaultdict(list)
+
+    for record in current:
+        old = previous.get(record['student_id'])
+        if old and old.get('class_id'):
+            deltas = inc[old['class_id']]
+            deltas['student_count'] -= 1
+            deltas['score_sum'] -= old['engagement_score']
+            deltas[f"distribution.{old['engagement_level']}"] -= 1
+            pulled[old['class_id']].append(record['student_id'])
+        if record.get('class_id'):
+            deltas = inc[record['class_id']]
+            deltas['student_count'] += 1
+            deltas['score_sum'] += record['engagement_score']
+            deltas[f"distribution.{record['engagement_level']}"] += 1
+            if record['engagement_level'] in ALERT_LEVELS:
+                pushed[record['class_id']].append(at_risk_entry(record))
+
+    operations = []
+    for class_id, deltas in inc.items():
+        update = {
+            '$inc': {
+                field: int(value) if field != 'score_sum' else value
+                for field, value in deltas.items()
+            },
+            '$set': {'class_id': class_id, 'updated_at': now}
+        }
+        if pulled[class_id]:
+            update['$pull'] = {'at_risk': {'student_id': {'$in': pulled[class_id]}}}
+        operations.append(UpdateOne({'_id': class_id}, update, upsert=True))
+        if pushed[class_id]:
+            operations.append(UpdateOne({'_id': class_id}, {'$push': {'at_risk': {
+                '$each': pushed[class_id],
+                '$sort': {'engagement_score': 1},
+                '$slice': 2 * top_k
+            }}}))
+    return operations
+
+def record_engagement(
+    results: List[Dict],
+    now: Optional[datetime] = None,
+    top_k: int = Config.CLASS_ENGAGEMENT_TOP_K
+):
+    """
+    Store the latest analysis of each student and update their classes
+
+    results: {student_id, class_id (optional), engagement_score,
+              engagement_level, recommendations}; a missing class_id keeps
+              the student's previous class. A student listed more than once
+              is recorded once, with the last result.
+    """
+    now = now or datetime.utcnow()
+    latest = {result['student_id']: result for result in results}
+
+    previous, records = {}, []
+    for result in latest.values():
+        record = {
+            'student_id': result['student_id'],
+            'engagement_score': result['engagement_score'],
+            'engagement_level': result['engagement_level'],
+            'recommendations': result['recommendations'],
+            'analyzed_at': now
+        }
+        if result.get('class_id'):
+            record['class_id'] = result['class_id']
+        # The record this update replaced, read atomically with it
+        old = find_one_and_update(
+            STUDENT_ENGAGEMENT,
+            {'_id': result['student_id']},
+            {'$set': dict(record)},
+            projection={'class_id': 1, 'engagement_score': 1, 'engagement_level': 1},
+            upsert=True
+        )
+        if old:
+            previous[result['student_id']] = old
+        record.setdefault('class_id', (old or {}).get('class_id'))
+        records.append(record)
+
+    bulk_write(CLASS_ENGAGEMENT, class_engagement_operations(previous, records, now, top_k), ordered=True)
+
+def class_engagement_view(
+    snapshot: Dict,
+    engine: EngagementDetectionEngine,
+    top_k: int = Config.CLASS_ENGAGEMENT_TOP_K
+) -> Dict:
+    """Dashboard metrics of a CLASS_ENGAGEMENT document"""
+    student_count = max(0, snapshot.get('student_count', 0))
+    distribution = {
+        level.value: max(0, snapshot.get('distribution', {}).get(level.value, 0))
+        for level in ENGAGEMENT_LEVELS
+    }
+    class_index = snapshot.get('score_sum', 0.0) / student_count if student_count else 0.0
+
+    return {
+        'class_id': snapshot['class_id'],
+        'class_engagement_index': round(class_index, 2),
+        'distribution': distribution,
+        'alert_count': sum(distribution[level] for level in ALERT_LEVELS),
+        'students_needing_attention': snapshot.get('at_risk', [])[:top_k],
+        'trend': engine.engagement_trend(class_index, snapshot.get('baseline_index')),
+        'class_size': student_count,
+        'engagement_rate': round(
+            (distribution['ENGAGED'] + distribution['PASSIVE']) / student_count * 100, 1
+        ) if student_count else 0.0,
+        'updated_at': snapshot.get('updated_at')
+    }
+
+def find_class_engagement(class_id: str) -> Optional[Dict]:
+    return find_one(CLASS_ENGAGEMENT, {'_id': class_id})
@@ -0,0 +1,351 @@
+"""
+AMEP Concept Catalog
+Process-local, read-through copy of the concepts collection
+
+- Loaded once into compact columns keyed by interned concept indices
+- O(1) lookup by concept_id and by subject_area
+- Refreshed incrementally from a MongoDB change stream, or by polling
+  updated_at / created_at when change streams are unavailable (standalone
+  server); polling mode also reloads in full periodically to pick up deletes
+
+Location: backend/models/concept_catalog.py
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from pymongo.errors import OperationFailure, PyMongoError
+
+from config import Config
+from models.database import db, CONCEPTS
+from ai_engine.knowledge_tracing import BKTParameters, ConceptIndex
+from ai_engine.prerequisite_graph import PrerequisiteGraph
+
+# Fields kept from each concept document
+_PROJECTION = {
+    'concept_name': 1,
+    'subject_area': 1,
+    'difficulty_level': 1,
+    'weight': 1,
+    'prerequisites': 1,
+    'prerequisite_weights': 1,
+    'bkt_params': 1,
+    'created_at': 1,
+    'updated_at': 1
+}
+
+# Server error code for "change streams require a replica set"
+_CHANGE_STREAM_UNSUPPORTED = 40573
+
+class ConceptCatalog:
+    """
+    In-memory concept catalog with interned concept indices
+
+    Columns are indexed by the concept's interned index; a removed concept
+    keeps its index but is marked inactive. `version` increases on every
+    change so callers can cache values derived from the catalog.
+    """
+
+    def __init__(
+        self,
+        poll_interval: float = Config.CONCEPT_CATALOG_POLL_INTERVAL,
+        reload_interval: float = Config.CONCEPT_CATALOG_RELOAD_INTERVAL
+    ):
+        self.poll_interval = poll_interval
+        self.reload_interval = reload_interval
+        self.version = 0
+
+        self._index = ConceptIndex()
+        self._active = np.zeros(0, dtype=bool)
+        self._difficulty = np.zeros(0, dtype=np.float64)
+        self._weight = np.zeros(0, dtype=np.float64)
+        self._subject = np.zeros(0, dtype=np.int32)
+        self._names: List[Optional[str]] = []
+        self._prerequisites: List[tuple] = []
+        self._prerequisite_weights: List[Optional[Dict[str, float]]] = []
+        self._bkt_params: List[Optional[BKTParameters]] = []
+        self._graph: Optional[PrerequisiteGraph] = None
+        self._graph_version = -1
+
+        self._subjects: List[Optional[str]] = []
+        self._subject_codes: Dict[Optional[str], int] = {}
+        # subject code -> ordered set of concept indices
+        self._by_subject: Dict[int, Dict[int, None]] = {}
+
+        self._loaded = False
+        self._last_seen: Optional[datetime] = None
+        self._lock = threading.RLock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # ------------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------------
+
+    def get(self, concept_id: str) -> Optional[Dict[str, Any]]:
+        """Concept as a (projected) document, or None if unknown"""
+        self._ensure_loaded()
+        with self._lock:
+            idx = self._index.lookup(concept_id)
+            if idx < 0 or not self._active[idx]:
+                return None
+            return self._document(idx)
+
+    def __contains__(self, concept_id: str) -> bool:
+        self._ensure_loaded()
+        idx = self._index.lookup(concept_id)
+        return idx >= 0 and bool(self._active[idx])
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return int(self._active.sum())
+
+    def name(self, concept_id: str, default: Optional[str] = None) -> Optional[str]:
+        concept = self.get(concept_id)
+        return concept.get('concept_name', default) if concept else default
+
+    def prerequisites(self, concept_id: str) -> List[str]:
+        self._ensure_loaded()
+        with self._lock:
+            idx = self._index.lookup(concept_id)
+            if idx < 0 or not self._active[idx]:
+                return []
+            return [self._index.concept_id(p) for p in self._prerequisites[idx]]
+
+    def bkt_params(self, concept_id: str) -> Optional[BKTParameters]:
+        """Fitted BKT parameters (jobs/bkt_refit.py), or None"""
+        self._ensure_loaded()
+        with self._lock:
+            idx = self._index.lookup(concept_id)
+            if idx < 0 or not self._active[idx]:
+                return None
+            return self._bkt_params[idx]
+
+    def concept_ids(self) -> List[str]:
+        self._ensure_loaded()
+        with self._lock:
+            return [self._index.concept_id(i) for i in np.flatnonzero(self._active)]
+
+    def by_subject(self, subject_area: str) -> List[str]:
+        """concept_ids in a subject area"""
+        self._ensure_loaded()
+        with self._lock:
+            code = self._subject_codes.get(subject_area)
+            if code is None:
+                return []
+            return [self._index.concept_id(i) for i in self._by_subject[code]]
+
+    def prerequisite_graph(self) -> PrerequisiteGraph:
+        """Compiled prerequisite DAG of the active concepts, rebuilt per version"""
+        self._ensure_loaded()
+        with self._lock:
+            if self._graph_version != self.version:
+                active = np.flatnonzero(self._active)
+                prerequisites, weights = {}, {}
+                for idx in active:
+                    concept_id = self._index.concept_id(idx)
+                    prerequisites[concept_id] = [self._index.concept_id(p) for p in self._prerequisites[idx]]
+                    for prerequisite, weight in (self._prerequisite_weights[idx] or {}).items():
+                        weights[(concept_id, prerequisite)] = weight
+                self._graph = PrerequisiteGraph(prerequisites, weights)
+                self._graph_version = self.version
+            return self._graph
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Every active concept as a (projected) document"""
+        self._ensure_loaded()
+        with self._lock:
+            return [self._document(i) for i in np.flatnonzero(self._active)]
+
+    # ------------------------------------------------------------------------
+    # Loading and refresh
+    # ------------------------------------------------------------------------
+
+    def reload(self):
+        """Replace the catalog with a full read of the concepts collection"""
+        concepts = list(db[CONCEPTS].find({}, _PROJECTION))
+        with self._lock:
+            self._active[:] = False
+            self._by_subject = {code: {} for code in self._by_subject}
+            for concept in concepts:
+                self._upsert(concept)
+            self._loaded = True
+            self.version += 1
+
+    def start(self):
+        """Load now and keep the catalog current from a background thread"""
+        self._ensure_loaded()
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._refresh_loop, name='concept-catalog', daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.reload()
+
+    def _refresh_loop(self):
+        resume_token = None
+        while not self._stop.is_set():
+            try:
+                resume_token = self._watch(resume_token)
+            except OperationFailure as e:
+                if e.code == _CHANGE_STREAM_UNSUPPORTED:
+                    self._poll()
+                    return
+                resume_token = None
+                self._stop.wait(self.poll_interval)
+            except PyMongoError:
+                self._stop.wait(self.poll_interval)
+
+    def _watch(self, resume_token):
+        """Apply change events until stopped; returns the last resume token"""
+        with db[CONCEPTS].watch(
+            full_document='updateLookup',
+            resume_after=resume_token,
+            max_await_time_ms=1000
+        ) as stream:
+            # Changes made before the stream opened would otherwise be missed
+            if resume_token is None:
+                self.reload()
+
+            while stream.alive and not self._stop.is_set():
+                change = stream.try_next()
+                if change is not None:
+                    self._apply_change(change)
+                resume_token = stream.resume_token
+
+        return resume_token
+
+    def _apply_change(self, change: Dict):
+        operation = change['operationType']
+        with self._lock:
+            if operation in ('insert', 'update', 'replace'):
+                if change.get('fullDocument'):
+                    self._upsert(change['fullDocument'])
+                else:
+                    self._remove(change['documentKey']['_id'])
+            elif operation == 'delete':
+                self._remove(change['documentKey']['_id'])
+            else:
+                # drop / rename / invalidate
+                self.reload()
+            self.version += 1
+
+    def _poll(self):
+        """Fallback refresh: changed documents by timestamp, periodic full reload"""
+        last_reload = time.monotonic()
+        while not self._stop.wait(self.poll_interval):
+            try:
+                if time.monotonic() - last_reload >= self.reload_interval:
+                    self.reload()
+                    last_reload = time.monotonic()
+                    continue
+
+                since = self._last_seen or datetime.min
+                changed = list(db[CONCEPTS].find(
+                    {'$or': [
+                        {'updated_at': {'$gt': since}},
+                        {'created_at': {'$gt': since}}
+                    ]},
+                    _PROJECTION
+                ))
+                if changed:
+                    with self._lock:
+                        for concept in changed:
+                            self._upsert(concept)
+                        self.version += 1
+            except PyMongoError:
+                continue
+
+    # ------------------------------------------------------------------------
+    # Internals (callers hold self._lock)
+    # ------------------------------------------------------------------------
+
+    def _upsert(self, concept: Dict):
+        idx = self._intern(concept['_id'])
+
+        if self._active[idx]:
+            self._by_subject[int(self._subject[idx])].pop(idx, None)
+
+        subject = self._subject_code(concept.get('subject_area'))
+        self._active[idx] = True
+        self._subject[idx] = subject
+        difficulty, weight = concept.get('difficulty_level'), concept.get('weight')
+        self._difficulty[idx] = 0.5 if difficulty is None else difficulty
+        self._weight[idx] = 1.0 if weight is None else weight
+        self._names[idx] = concept.get('concept_name')
+        self._prerequisites[idx] = tuple(
+            self._intern(prerequisite) for prerequisite in concept.get('prerequisites') or []
+        )
+        weights = concept.get('prerequisite_weights')
+        self._prerequisite_weights[idx] = (
+            {prerequisite: float(weight) for prerequisite, weight in weights.items()} if weights else None
+        )
+        bkt_params = concept.get('bkt_params')
+        self._bkt_params[idx] = BKTParameters(**bkt_params) if bkt_params else None
+        self._by_subject[subject][idx] = None
+
+        for field in ('updated_at', 'created_at'):
+            seen = concept.get(field)
+            if isinstance(seen, datetime) and (self._last_seen is None or seen > self._last_seen):
+                self._last_seen = seen
+
+    def _remove(self, concept_id: str):
+        idx = self._index.lookup(concept_id)
+        if idx >= 0 and self._active[idx]:
+            self._active[idx] = False
+            self._by_subject[int(self._subject[idx])].pop(idx, None)
+
+    def _intern(self, concept_id: str) -> int:
+        idx = self._index.intern(concept_id)
+        if idx >= len(self._active):
+            capacity = max(64, 2 * len(self._active), idx + 1)
+            grow = capacity - len(self._active)
+            self._active = np.concatenate([self._active, np.zeros(grow, dtype=bool)])
+            self._difficulty = np.concatenate([self._difficulty, np.zeros(grow)])
+            self._weight = np.concatenate([self._weight, np.zeros(grow)])
+            self._subject = np.concatenate([self._subject, np.zeros(grow, dtype=np.int32)])
+            self._names.extend([None] * grow)
+            self._prerequisites.extend([()] * grow)
+            self._prerequisite_weights.extend([None] * grow)
+            self._bkt_params.extend([None] * grow)
+        return idx
+
+    def _subject_code(self, subject_area: Optional[str]) -> int:
+        code = self._subject_codes.get(subject_area)
+        if code is None:
+            code = len(self._subjects)
+            self._subjects.append(subject_area)
+            self._subject_codes[subject_area] = code
+            self._by_subject[code] = {}
+        return code
+
+    def _document(self, idx: int) -> Dict[str, Any]:
+        document = {
+            '_id': self._index.concept_id(idx),
+            'subject_area': self._subjects[int(self._subject[idx])],
+            'difficulty_level': float(self._difficulty[idx]),
+            'weight': float(self._weight[idx]),
+            'prerequisites': [self._index.concept_id(p) for p in self._prerequisites[idx]]
+        }
+        # Absent fields stay absent, as in the stored document
+        if self._names[idx] is not None:
+            document['concept_name'] = self._names[idx]
+        if self._prerequisite_weights[idx] is not None:
+            document['prerequisite_weights'] = dict(self._prerequisite_weights[idx])
+        if self._bkt_params[idx] is not None:
+            document['bkt_params'] = vars(self._bkt_params[idx]).copy()
+        return document
+
+# Shared per-process catalog; API processes call concept_catalog.start()
+concept_catalog = ConceptCatalog()
@@ -5,7 +5,7 @@ Using PyMongo and MongoEngine for MongoDB integration
 Location: backend/models/database.py
 """
 
-from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument
 from pymongo.errors import ConnectionFailure
 from datetime import datetime
 from bson import ObjectId
@@ -83,11 +83,19 @@ USERS = 'users'
 STUDENTS = 'students'
 TEACHERS = 'teachers'
 CONCEPTS = 'concepts'
+CONTENT_ITEMS = 'content_items'
 STUDENT_CONCEPT_MASTERY = 'student_concept_mastery'
 STUDENT_RESPONSES = 'student_responses'
+DKVMN_MEMORY = 'dkvmn_memory'
+PRACTICE_SESSIONS = 'practice_sessions'
+REVIEW_SCHEDULE = 'review_schedule'
+MASTERY_JOBS = 'mastery_jobs'
 ENGAGEMENT_SESSIONS = 'engagement_sessions'
 ENGAGEMENT_LOGS = 'engagement_logs'
 DISENGAGEMENT_ALERTS = 'disengagement_alerts'
+STUDENT_ENGAGEMENT = 'student_engagement'
+CLASS_ENGAGEMENT = 'class_engagement'
+CLASS_ENGAGEMENT_HISTORY = 'class_engagement_history'
 LIVE_POLLS = 'live_polls'
 POLL_RESPONSES = 'poll_responses'
 PROJECTS = 'projects'
@@ -134,6 +142,13 @@ def init_db(app=None):
     db[CONCEPTS].create_index([('difficulty_level', ASCENDING)])
     print(f"✓ {CONCEPTS} collection initialized")
     
+    # Content Items collection (BR2) - per-concept difficulty index
+    db[CONTENT_ITEMS].create_index([
+        ('concept_id', ASCENDING),
+        ('difficulty', ASCENDING)
+    ])
+    print(f"✓ {CONTENT_ITEMS} collection initialized")
+    
     # Student Concept Mastery collection (BR1)
     db[STUDENT_CONCEPT_MASTERY].create_index([
         ('student_id', ASCENDING),
@@ -148,8 +163,50 @@ def init_db(app=None):
     db[STUDENT_RESPONSES].create_index([('concept_id', ASCENDING)])
     db[STUDENT_RESPONSES].create_index([('submitted_at', DESCENDING)])
     db[STUDENT_RESPONSES].create_index([('session_id', ASCENDING)])
+    # Bounded "last N responses for a pair" window queries
+    db[STUDENT_RESPONSES].create_index([
+        ('student_id', ASCENDING),
+        ('concept_id', ASCENDING),
+        ('submitted_at', DESCENDING)
+    ])
+    # Per-concept replay order for offline BKT fitting
+    db[STUDENT_RESPONSES].create_index([
+        ('concept_id', ASCENDING),
+        ('student_id', ASCENDING),
+        ('submitted_at', ASCENDING)
+    ])
+    # Per-student replay order for bulk mastery recalculation
+    db[STUDENT_RESPONSES].create_index([
+        ('student_id', ASCENDING),
+        ('submitted_at', ASCENDING),
+        ('_id', ASCENDING)
+    ])
     print(f"✓ {STUDENT_RESPONSES} collection initialized")
     
+    # DKVMN per-student value memory (BR3)
+    print(f"✓ {DKVMN_MEMORY} collection initialized")
+    
+    # Assigned practice sessions (BR2)
+    db[PRACTICE_SESSIONS].create_index([
+        ('student_id', ASCENDING),
+        ('created_at', DESCENDING)
+    ])
+    db[PRACTICE_SESSIONS].create_index([('class_id', ASCENDING)])
+    print(f"✓ {PRACTICE_SESSIONS} collection initialized")
+    
+    # Spaced-repetition queue (BR3) - due reviews per student, and school-wide
+    db[REVIEW_SCHEDULE].create_index([
+        ('student_id', ASCENDING),
+        ('due_at', ASCENDING)
+    ])
+    db[REVIEW_SCHEDULE].create_index([('due_at', ASCENDING)])
+    print(f"✓ {REVIEW_SCHEDULE} collection initialized")
+    
+    # Bulk mastery recalculation jobs (BR1)
+    db[MASTERY_JOBS].create_index([('status', ASCENDING)])
+    db[MASTERY_JOBS].create_index([('created_at', DESCENDING)])
+    print(f"✓ {MASTERY_JOBS} collection initialized")
+    
     # Engagement Sessions collection (BR4)
     db[ENGAGEMENT_SESSIONS].create_index([('student_id', ASCENDING)])
     db[ENGAGEMENT_SESSIONS].create_index([('start_time', DESCENDING)])
@@ -159,6 +216,11 @@ def init_db(app=None):
     db[ENGAGEMENT_LOGS].create_index([('student_id', ASCENDING)])
     db[ENGAGEMENT_LOGS].create_index([('timestamp', DESCENDING)])
     db[ENGAGEMENT_LOGS].create_index([('event_type', ASCENDING)])
+    # Per-student event replay (signal materialization, detector warm-up)
+    db[ENGAGEMENT_LOGS].create_index([
+        ('student_id', ASCENDING),
+        ('timestamp', ASCENDING)
+    ])
     print(f"✓ {ENGAGEMENT_LOGS} collection initialized")
     
     # Disengagement Alerts collection (BR6)
@@ -167,6 +229,20 @@ def init_db(app=None):
     db[DISENGAGEMENT_ALERTS].create_index([('detected_at', DESCENDING)])
     print(f"✓ {DISENGAGEMENT_ALERTS} collection initialized")
     
+    # Latest engagement analysis per student (BR6)
+    db[STUDENT_ENGAGEMENT].create_index([('class_id', ASCENDING)])
+    print(f"✓ {STUDENT_ENGAGEMENT} collection initialized")
+    
+    # Class engagement snapshots (BR6) - one current document per class,
+    # scheduled snapshots retained for trends
+    db[CLASS_ENGAGEMENT_HISTORY].create_index([
+        ('class_id', ASCENDING),
+        ('taken_at', DESCENDING)
+    ])
+    db[CLASS_ENGAGEMENT_HISTORY].create_index([('taken_at', ASCENDING)])
+    print(f"✓ {CLASS_ENGAGEMENT} collection initialized")
+    print(f"✓ {CLASS_ENGAGEMENT_HISTORY} collection initialized")
+    
     # Live Polls collection (BR4)
     db[LIVE_POLLS].create_index([('teacher_id', ASCENDING)])
     db[LIVE_POLLS].create_index([('is_active', ASCENDING)])
@@ -260,15 +336,15 @@ def insert_one(collection_name, document):
     result = db[collection_name].insert_one(document)
     return str(result.inserted_id)
 
-def insert_many(collection_name, documents):
-    """Insert multiple documents"""
+def insert_many(collection_name, documents, ordered=True):
+    """Insert multiple documents (ordered=False: the server may write them in parallel)"""
     for doc in documents:
         if '_id' not in doc:
             doc['_id'] = str(ObjectId())
         if 'created_at' not in doc:
             doc['created_at'] = datetime.utcnow()
     
-    result = db[collection_name].insert_many(documents)
+    result = db[collection_name].insert_many(documents, ordered=ordered)
     return [str(id) for id in result.inserted_ids]
 
 def find_one(collection_name, query, projection=None):
@@ -298,6 +374,18 @@ def update_one(collection_name, query, update, upsert=False):
     result = db[collection_name].update_one(query, update, upsert=upsert)
     return result.modified_count
 
+def find_one_and_update(collection_name, query, update, projection=None, upsert=False):
+    """Update a single document and return it as it was before (None if new)"""
+    if 'updated_at' not in update.get('$set', {}):
+        if '$set' not in update:
+            update['$set'] = {}
+        update['$set']['updated_at'] = datetime.utcnow()
+    
+    return db[collection_name].find_one_and_update(
+        query, update, projection=projection, upsert=upsert,
+        return_document=ReturnDocument.BEFORE
+    )
+
 def update_many(collection_name, query, update):
     """Update multiple documents"""
     if 'updated_at' not in update.get('$set', {}):
@@ -328,6 +416,12 @@ def aggregate(collection_name, pipeline):
     """Perform aggregation"""
     return list(db[collection_name].aggregate(pipeline))
 
+def bulk_write(collection_name, operations, ordered=False):
+    """Execute a batch of write operations (UpdateOne, InsertOne, ...)"""
+    if not operations:
+        return None
+    return db[collection_name].bulk_write(operations, ordered=ordered)
+
 # ============================================================================
 # DOCUMENT SCHEMAS (for reference)
 # ============================================================================
@@ -366,6 +460,25 @@ Concept Document Schema:
     "difficulty_level": "float (0-1)",
     "weight": "float",
     "prerequisites": ["concept_id1", "concept_id2"],
+    "prerequisite_weights": {"concept_id1": "float (correlation weight, optional, default 0.5)"},
+    "bkt_params": {"p_l0": "float", "p_t": "float", "p_g": "float", "p_s": "float"},
+    "bkt_fit": {"log_likelihood": "float", "n_students": "int", "n_responses": "int", "fitted_at": "datetime"},
+    "created_at": "datetime"
+}
+
+Content Item Document Schema (BR2):
+{
+    "_id": "string",
+    "concept_id": "string",
+    "item_type": "question|video|reading|exercise",
+    "title": "string",
+    "content": "string",
+    "difficulty": "float (0-1)",
+    "estimated_time": "int (minutes)",
+    "scaffolding_available": "boolean",
+    "weight": "float (optional, defaults to the concept weight)",
+    "prerequisites": ["concept_id1", "concept_id2"],
+    "created_by": "string (teacher_id)",
     "created_at": "datetime"
 }
 
@@ -382,6 +495,139 @@ Student Concept Mastery Document Schema (BR1):
     "learning_velocity": "float",
     "last_assessed": "datetime",
     "times_assessed": "int",
+    "dkt_state": {
+        "correct": "binary (last DKT_SEQUENCE_LENGTH outcomes, oldest first)",
+        "times": ["float (response times, oldest first)"],
+        "total_responses": "int",
+        "version": "string (new token on every write; cached windows compare it)"
+    },
+    "recalculated_by": "string (mastery_jobs._id, set by bulk recalculation)",
+    "updated_at": "datetime"
+}
+
+DKVMN Memory Document Schema (BR3):
+{
+    "_id": "string (student_id)",
+    "version": "string (new token on every write; cached copies compare it)",
+    "concept_ids": ["concept_id1", "concept_id2"],
+    "mastery": ["float (0-100), aligned with concept_ids"],
+    "updated_at": "datetime"
+}
+
+Practice Session Document Schema (BR2):
+{
+    "_id": "string (session_id)",
+    "student_id": "string",
+    "class_id": "string (optional)",
+    "assigned_by": "string (teacher_id, optional)",
+    "session_duration": "int (minutes)",
+    "packing": "greedy|optimal",
+    "content_items": [{"item_id": "string", "concept_id": "string", "difficulty": "float", "estimated_time": "int"}],
+    "total_items": "int",
+    "estimated_duration": "int (minutes)",
+    "cognitive_load": "float",
+    "load_status": "string",
+    "zpd_alignment": "string",
+    "status": "assigned",
+    "created_at": "datetime"
+}
+
+Review Schedule Document Schema (BR3):
+{
+    "_id": "string (student_id_concept_id)",
+    "student_id": "string",
+    "concept_id": "string",
+    "mastery_score": "float (>= 85, at the last assessment)",
+    "review_mastery": "float (mastery the review is practiced at)",
+    "last_assessed": "datetime",
+    "due_at": "datetime",
+    "updated_at": "datetime"
+}
+
+Engagement Log Document Schema (BR4) - written in batches by EngagementLogWriter:
+{
+    "_id": "string",
+    "student_id": "string",
+    "event_type": "login|logout|click|response|hint|resource_access|time_on_task|task_start|task_complete|discussion_post",
+    "timestamp": "datetime",
+    "session_id": "string (optional)",
+    "duration": "float (minutes; logout = session length, time_on_task)",
+    "is_correct": "boolean (response)",
+    "response_time": "float (seconds, response)",
+    "hints_used": "int (response)",
+    "attempts": "int (response)",
+    "resource_id": "string (optional)",
+    "optional": "boolean (resource_access: optional material)",
+    "created_at": "datetime"
+}
+
+Disengagement Alert Document Schema (BR6) - one per student per day with an
+AT_RISK/CRITICAL analysis (the day's latest result) or live behavior:
+{
+    "_id": "string (student_id_YYYY-MM-DD)",
+    "student_id": "string",
+    "day": "string (YYYY-MM-DD, UTC)",
+    "severity": "AT_RISK|CRITICAL (engagement level, or the live behavior's that raised it)",
+    "engagement_score": "float (analyses only)",
+    "behaviors": [{"type": "quick_guess|...", "severity": "string", "description": "string", ...}],
+    "live_behaviors": {"<type>": {"severity": "AT_RISK", "previous_severity": "string", ...}},
+    "recommendations": ["string", ...],
+    "acknowledged": "boolean",
+    "detected_at": "datetime",
+    "created_at": "datetime"
+}
+
+Student Engagement Document Schema (BR6) - latest analysis per student:
+{
+    "_id": "string (student_id)",
+    "student_id": "string",
+    "class_id": "string (optional)",
+    "engagement_score": "float",
+    "engagement_level": "ENGAGED|PASSIVE|MONITOR|AT_RISK|CRITICAL",
+    "recommendations": ["string", ...],
+    "analyzed_at": "datetime"
+}
+
+Class Engagement Document Schema (BR6) - maintained incrementally, rebuilt
+by jobs/class_engagement_snapshot.py:
+{
+    "_id": "string (class_id)",
+    "class_id": "string",
+    "student_count": "int",
+    "score_sum": "float (class_engagement_index = score_sum / student_count)",
+    "distribution": {"ENGAGED": "int", "PASSIVE": "int", "MONITOR": "int", "AT_RISK": "int", "CRITICAL": "int"},
+    "at_risk": [{"student_id": "string", "engagement_score": "float", "engagement_level": "string", "recommendations": [...]}],
+    "baseline_index": "float (index of the retained snapshot the trend compares to, optional)",
+    "baseline_at": "datetime (optional)",
+    "snapshot_at": "datetime (last scheduled rebuild)",
+    "updated_at": "datetime"
+}
+
+Class Engagement History Document Schema (BR6) - one per class per scheduled run:
+{
+    "_id": "string",
+    "class_id": "string",
+    "class_engagement_index": "float",
+    "student_count": "int",
+    "distribution": {...},
+    "alert_count": "int",
+    "taken_at": "datetime"
+}
+
+Mastery Recalculation Job Document Schema (BR1):
+{
+    "_id": "string",
+    "status": "queued|running|completed|failed",
+    "scope": {"student_ids": ["student_id1", ...] or null (all students)},
+    "total_responses": "int",
+    "processed_responses": "int",
+    "processed_students": "int",
+    "pairs_written": "int",
+    "checkpoint": {"student_id": "string (last fully written student)"},
+    "error": "string (optional)",
+    "created_at": "datetime",
+    "started_at": "datetime",
+    "completed_at": "datetime",
     "updated_at": "datetime"
 }
 
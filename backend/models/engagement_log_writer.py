@@ -0,0 +1,260 @@
+"""
+AMEP Engagement Log Writer
+Bounded in-process queue in front of ENGAGEMENT_LOGS
+
+- Request threads only append events to the queue (no I/O)
+- A background thread writes them with unordered insert_many once
+  flush_size events are pending or the oldest has waited flush_interval
+- When the queue is full, submit waits up to block_timeout for space, then
+  drops the rest of the batch; drops are counted (backpressure is reported
+  to the client, which can retry the dropped tail)
+- A failed insert_many is retried with exponential backoff; if MongoDB is
+  still unavailable the batch goes back to the head of the queue while it
+  fits (so an outage turns into backpressure) and is only dropped when it
+  does not, or on shutdown. Events keep the _id of their first attempt, so
+  a retry skips the ones already written
+- Subscribers (e.g. the streaming disengagement detector) receive every
+  written batch on the writer thread; holding_delivery() keeps batches from
+  being written and delivered while a reader replays ENGAGEMENT_LOGS into
+  subscriber state, so the replay and live delivery never overlap
+
+Location: backend/models/engagement_log_writer.py
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from models.database import ENGAGEMENT_LOGS, insert_many
+
+class EngagementLogWriter:
+    """Batched, bounded write-behind queue for engagement events"""
+
+    def __init__(
+        self,
+        capacity: int = 100000,
+        flush_size: int = 5000,
+        flush_interval: float = 1.0,
+        block_timeout: float = 0.0,
+        write_retries: int = 3,
+        retry_backoff: float = 0.5,
+        collection_name: str = ENGAGEMENT_LOGS
+    ):
+        """
+        capacity: events held in memory before submit applies backpressure
+        flush_size: events per insert_many
+        flush_interval: seconds an event may wait for a full batch
+        block_timeout: seconds submit waits for space before dropping
+        write_retries: insert_many retries of a failed batch
+        retry_backoff: seconds before the first retry (doubling)
+        """
+        self.capacity = capacity
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.write_retries = write_retries
+        self.retry_backoff = retry_backoff
+        self.collection_name = collection_name
+
+        self._queue: deque = deque()
+        self._oldest_at = 0.0          # monotonic time the queue became non-empty
+        self._in_flight = 0            # taken by the writer, not yet written
+        self._subscribers: List[Callable[[List[Dict]], None]] = []
+        self._lock = threading.Lock()
+        self._delivery_lock = threading.Lock()  # held from insert to the last subscriber
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self._stats = {
+            'received': 0,
+            'accepted': 0,
+            'dropped': 0,
+            'written': 0,
+            'write_errors': 0,
+            'write_retries': 0,
+            'requeued': 0,
+            'flushes': 0,
+            'subscriber_errors': 0,
+            'max_queue_depth': 0
+        }
+
+    # ------------------------------------------------------------------------
+    # Producers
+    # ------------------------------------------------------------------------
+
+    def submit(self, events: List[Dict]) -> Tuple[int, int]:
+        """
+        Queue events in order
+
+        Returns: (accepted, dropped); the accepted events are a prefix of
+        `events`
+        """
+        self._ensure_started()
+        deadline = time.monotonic() + self.block_timeout
+        with self._lock:
+            self._stats['received'] += len(events)
+            space = self.capacity - len(self._queue)
+            while space < len(events) and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._not_full.wait(remaining)
+                space = self.capacity - len(self._queue)
+
+            accepted = max(0, min(space, len(events)))
+            if accepted:
+                if not self._queue:
+                    self._oldest_at = time.monotonic()
+                self._queue.extend(events[:accepted])
+                self._stats['accepted'] += accepted
+                self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], len(self._queue))
+                if len(self._queue) >= self.flush_size:
+                    self._not_empty.notify()
+            dropped = len(events) - accepted
+            self._stats['dropped'] += dropped
+        return accepted, dropped
+
+    def subscribe(self, callback: Callable[[List[Dict]], None]):
+        """Call `callback(events)` with every written batch, in queue order"""
+        self._subscribers.append(callback)
+
+    @contextmanager
+    def holding_delivery(self):
+        """
+        Block the writer between batches: inside, every batch in
+        ENGAGEMENT_LOGS has reached the subscribers and none is delivered
+        until the block exits (submit keeps queueing)
+        """
+        with self._delivery_lock:
+            yield
+
+    # ------------------------------------------------------------------------
+    # Lifecycle and stats
+    # ------------------------------------------------------------------------
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(
+                    target=self._run, name='engagement-log-writer', daemon=True
+                )
+                self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 10.0):
+        """Write everything still queued, then stop the writer (call on shutdown)"""
+        with self._lock:
+            thread = self._thread
+            self._stopping = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+        with self._lock:
+            self._thread = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(
+                self._stats,
+                queue_depth=len(self._queue),
+                in_flight=self._in_flight,
+                capacity=self.capacity,
+                running=self._thread is not None and self._thread.is_alive()
+            )
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self.start()
+
+    # ------------------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------------------
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._stopping and not self._due():
+                    timeout = None
+                    if self._queue:
+                        timeout = max(0.0, self._oldest_at + self.flush_interval - time.monotonic())
+                    self._not_empty.wait(timeout)
+                if self._stopping and not self._queue:
+                    return
+                batch = [self._queue.popleft() for _ in range(min(self.flush_size, len(self._queue)))]
+                self._oldest_at = time.monotonic()
+                self._in_flight = len(batch)
+                self._not_full.notify_all()
+
+            self._write(batch)
+
+    def _insert(self, batch: List[Dict]) -> Optional[int]:
+        """
+        insert_many with retries; returns the events written, or None if
+        MongoDB stayed unavailable
+        """
+        for attempt in range(self.write_retries + 1):
+            if attempt:
+                with self._lock:
+                    self._stats['write_retries'] += 1
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            try:
+                insert_many(self.collection_name, batch, ordered=False)
+                return len(batch)
+            except BulkWriteError as e:
+                # Rejected documents; on a retry, duplicate keys were
+                # written by an earlier attempt
+                written = e.details.get('nInserted', 0)
+                if attempt:
+                    written += sum(
+                        1 for error in e.details.get('writeErrors', [])
+                        if error.get('code') == 11000
+                    )
+                return written
+            except PyMongoError:
+                continue
+        return None
+
+    def _requeue(self, batch: List[Dict]) -> bool:
+        """Put a batch that could not be written back at the head of the queue, if it fits"""
+        with self._lock:
+            if self._stopping or len(self._queue) + len(batch) > self.capacity:
+                return False
+            self._queue.extendleft(reversed(batch))
+            self._oldest_at = time.monotonic()
+            self._in_flight = 0
+            self._stats['requeued'] += len(batch)
+            return True
+
+    def _due(self) -> bool:
+        return len(self._queue) >= self.flush_size or (
+            bool(self._queue) and time.monotonic() - self._oldest_at >= self.flush_interval
+        )
+
+    def _write(self, batch: List[Dict]):
+        with self._delivery_lock:
+            written = self._insert(batch)
+            if written is None:
+                if self._requeue(batch):
+                    return
+                written = 0
+            errors = len(batch) - written
+
+            with self._lock:
+                self._in_flight = 0
+                self._stats['written'] += written
+                self._stats['write_errors'] += errors
+                self._stats['flushes'] += 1
+
+            for callback in self._subscribers:
+                try:
+                    callback(batch)
+                except Exception:
+                    with self._lock:
+                        self._stats['subscriber_errors'] += 1
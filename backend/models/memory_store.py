@@ -0,0 +1,353 @@
+"""
+AMEP DKVMN Memory Store
+Per-student DKVMN value memories with a hard memory budget
+
+- LRU + idle-TTL eviction keeps resident memories within budget_bytes
+- Memories are lazy-loaded from MongoDB on a miss
+- Every write stamps the document with a new version token. By default
+  (several worker processes may serve the same student) updates are
+  written through, conditional on the version the memory was loaded at,
+  and a cached memory is reused only while its version still matches
+  MongoDB, which costs one _id lookup instead of a full load. A write that
+  lost a race reloads the stored memory, reapplies its concepts and
+  retries, so concurrent updates are never overwritten
+- With write_back=True (a single process serves mastery requests) dirty
+  memories are written back in unordered bulk batches; an evicted dirty
+  memory stays readable until its write completes, so a reload never sees
+  a stale document
+- MongoDB round trips run outside the cache lock
+
+Location: backend/models/memory_store.py
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from models.database import DKVMN_MEMORY, find_one, bulk_write
+from ai_engine.knowledge_tracing import DKVMNEngine, DKVMNMemory
+
+def memory_operation(
+    engine: DKVMNEngine,
+    student_id: str,
+    memory: DKVMNMemory,
+    version: Optional[str] = None,
+    match: Optional[Dict] = None
+) -> UpdateOne:
+    """
+    Upsert of a student's written concept masteries into DKVMN_MEMORY
+
+    version: token stamped on the document (default: a new one), which
+    tells cached copies in other processes that they are stale
+    match: extra filter conditions (e.g. the expected current version)
+    """
+    n = min(len(engine.concepts), len(memory.values))
+    written = memory.known[:n].nonzero()[0]
+    return UpdateOne(
+        {'_id': student_id, **(match or {})},
+        {'$set': {
+            'version': version or str(ObjectId()),
+            'concept_ids': [engine.concepts.concept_id(i) for i in written],
+            'mastery': memory.values[written].tolist(),
+            'updated_at': datetime.utcnow()
+        }},
+        upsert=True
+    )
+
+class _Entry:
+    __slots__ = ('memory', 'version', 'nbytes', 'last_access', 'dirty')
+
+    def __init__(self, memory: DKVMNMemory, version: Optional[str]):
+        self.memory = memory
+        self.version = version
+        self.nbytes = memory.nbytes
+        self.last_access = time.monotonic()
+        self.dirty = False
+
+class DKVMNMemoryStore:
+    """
+    Bounded cache of DKVMNMemory objects keyed by student_id
+
+    write_back=False (default) is safe with any number of worker processes:
+    writes go straight to MongoDB as compare-and-set on the stored version
+    and cached memories are revalidated against it. write_back=True
+    batches writes and trusts the cache; only use it when one process
+    serves mastery requests.
+    """
+
+    def __init__(
+        self,
+        engine: DKVMNEngine,
+        budget_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float = 1800,
+        write_batch_size: int = 200,
+        write_back: bool = False
+    ):
+        self.engine = engine
+        self.budget_bytes = budget_bytes
+        self.ttl_seconds = ttl_seconds
+        self.write_batch_size = write_batch_size
+        self.write_back = write_back
+
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._resident_bytes = 0
+        self._dirty_count = 0
+        self._pending_writes: List[UpdateOne] = []
+        # Evicted dirty entries whose write has not completed yet
+        self._unwritten: Dict[str, _Entry] = {}
+        self._lock = threading.RLock()
+        # Held across taking and writing pending operations, so batches
+        # reach MongoDB in the order they were taken (acquired before _lock)
+        self._write_lock = threading.Lock()
+
+    def get(self, student_id: str) -> DKVMNMemory:
+        """Memory for a student, loading it from MongoDB on a miss"""
+        with self._lock:
+            entry = self._entries.get(student_id)
+            version = entry.version if entry is not None else None
+
+        if entry is not None and not self.write_back:
+            # Another process may have written the student since it was cached
+            document = find_one(DKVMN_MEMORY, {'_id': student_id}, {'version': 1})
+            if (document or {}).get('version') != version:
+                entry = None
+
+        if entry is not None:
+            with self._lock:
+                if self._entries.get(student_id) is entry:
+                    entry.last_access = time.monotonic()
+                    self._entries.move_to_end(student_id)
+                    return entry.memory
+
+        with self._lock:
+            revived = self._unwritten.get(student_id)
+            if revived is not None and student_id not in self._entries:
+                # Evicted before its write-back completed: newer than MongoDB
+                revived.last_access = time.monotonic()
+                self._insert(student_id, revived)
+        if revived is not None:
+            self._flush_pending()
+            return revived.memory
+
+        memory, version = self._load(student_id)
+
+        with self._lock:
+            current = self._entries.get(student_id)
+            if current is not None and (self.write_back or current.version == version):
+                # Another thread loaded the same version meanwhile; keep its copy
+                return current.memory
+            if current is not None:
+                self._remove(student_id)
+            self._insert(student_id, _Entry(memory, version))
+        self._flush_pending()
+        return memory
+
+    def mark_dirty(
+        self,
+        student_id: str,
+        concept_ids: Iterable[str],
+        memory: Optional[DKVMNMemory] = None
+    ):
+        """
+        Record that a student's memory changed
+
+        concept_ids: the concepts the change wrote. Without write_back the
+        memory is written through as a compare-and-set on the version it
+        was loaded at; when another writer got there first, the stored
+        memory is reloaded, these concepts are copied onto it and the write
+        is retried. With write_back, cached memories are written in batches
+        (an uncached memory, which must then be passed in, is still written
+        through).
+        """
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is not None and self.write_back:
+                self._account(entry)
+                if not entry.dirty:
+                    entry.dirty = True
+                    self._dirty_count += 1
+                if self._dirty_count >= self.write_batch_size:
+                    self._write_back_dirty()
+                self._evict()
+            elif entry is None and memory is None:
+                return
+            expected = entry.version if entry is not None else None
+
+        if entry is not None and self.write_back:
+            self._flush_pending()
+            return
+        self._write_through(student_id, list(concept_ids), memory or entry.memory, entry, expected)
+
+    def flush(self):
+        """Write every dirty memory to MongoDB (call on shutdown)"""
+        with self._lock:
+            self._write_back_dirty()
+        self._flush_pending()
+
+    def invalidate(self, student_ids: Optional[Iterable[str]] = None):
+        """
+        Drop cached memories without writing them back
+
+        Used after memories were rewritten in MongoDB by another writer
+        (e.g. bulk recalculation); None drops every student.
+        """
+        with self._lock:
+            keys = list(self._entries) if student_ids is None else student_ids
+            for student_id in keys:
+                if student_id in self._entries:
+                    self._remove(student_id)
+
+    @property
+    def resident_bytes(self) -> int:
+        return self._resident_bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ------------------------------------------------------------------------
+    # Writes (callers do not hold self._lock)
+    # ------------------------------------------------------------------------
+
+    def _write_through(
+        self,
+        student_id: str,
+        concept_ids: List[str],
+        memory: DKVMNMemory,
+        entry: Optional[_Entry],
+        expected: Optional[str]
+    ):
+        """
+        Compare-and-set write of a memory loaded at version `expected`,
+        merging into newer stored versions until the write wins
+        """
+        if entry is None:
+            # Uncached: the version it was loaded at is unknown
+            memory, expected = self._merged(student_id, memory, concept_ids)
+
+        version = str(ObjectId())
+        while not self._compare_and_set(student_id, memory, expected, version):
+            memory, expected = self._merged(student_id, memory, concept_ids)
+
+        with self._lock:
+            if entry is not None and self._entries.get(student_id) is entry:
+                entry.memory, entry.version = memory, version
+                self._account(entry)
+                self._evict()
+        self._flush_pending()
+
+    def _compare_and_set(
+        self,
+        student_id: str,
+        memory: DKVMNMemory,
+        expected: Optional[str],
+        version: str
+    ) -> bool:
+        """Write `memory` if the stored version is still `expected` (None = new)"""
+        try:
+            result = bulk_write(DKVMN_MEMORY, [memory_operation(
+                self.engine, student_id, memory, version, match={'version': expected}
+            )])
+        except BulkWriteError as e:
+            # The upsert collided with a document at another version
+            if all(error.get('code') == 11000 for error in e.details.get('writeErrors', [])):
+                return False
+            raise
+        return result.matched_count + result.upserted_count > 0
+
+    def _merged(self, student_id: str, memory: DKVMNMemory, concept_ids: List[str]) -> tuple:
+        """(stored memory with `concept_ids` copied from `memory`, stored version)"""
+        stored, version = self._load(student_id)
+        indices = [self.engine.intern_concept(concept_id) for concept_id in concept_ids]
+        memory.ensure_capacity(len(self.engine.concepts))
+        stored.ensure_capacity(len(self.engine.concepts))
+        stored.values[indices] = memory.values[indices]
+        stored.known[indices] = memory.known[indices]
+        return stored, version
+
+    def _flush_pending(self):
+        """Write the operations taken under the lock (write-back mode)"""
+        if not self._pending_writes:
+            return
+        with self._write_lock:
+            with self._lock:
+                operations, self._pending_writes = self._pending_writes, []
+                unwritten = dict(self._unwritten)
+            if operations:
+                bulk_write(DKVMN_MEMORY, operations)
+            with self._lock:
+                for student_id, entry in unwritten.items():
+                    if self._unwritten.get(student_id) is entry:
+                        del self._unwritten[student_id]
+
+    # ------------------------------------------------------------------------
+    # Internals (callers hold self._lock)
+    # ------------------------------------------------------------------------
+
+    def _insert(self, student_id: str, entry: _Entry):
+        self._entries[student_id] = entry
+        self._resident_bytes += entry.nbytes
+        self._evict()
+
+    def _evict(self):
+        """
+        Drop idle entries, then least-recently-used ones until within budget
+
+        Dirty memories dropped here are queued for writing and kept in
+        _unwritten until written, so the next get() for them returns the
+        queued copy rather than loading a stale document.
+        """
+        now = time.monotonic()
+
+        while self._entries:
+            student_id, entry = next(iter(self._entries.items()))
+            expired = now - entry.last_access > self.ttl_seconds
+            if not expired and self._resident_bytes <= self.budget_bytes:
+                break
+            if entry.dirty:
+                self._pending_writes.append(self._to_operation(student_id, entry))
+                self._unwritten[student_id] = entry
+            self._remove(student_id)
+
+    def _remove(self, student_id: str):
+        entry = self._entries.pop(student_id)
+        self._resident_bytes -= entry.nbytes
+        if entry.dirty:
+            entry.dirty = False
+            self._dirty_count -= 1
+
+    def _account(self, entry: _Entry):
+        # The array may have grown since it was accounted
+        self._resident_bytes += entry.memory.nbytes - entry.nbytes
+        entry.nbytes = entry.memory.nbytes
+
+    def _write_back_dirty(self):
+        """Queue every dirty memory for _flush_pending"""
+        for student_id, entry in self._entries.items():
+            if entry.dirty:
+                self._pending_writes.append(self._to_operation(student_id, entry))
+                entry.dirty = False
+        self._dirty_count = 0
+
+    def _to_operation(self, student_id: str, entry: _Entry) -> UpdateOne:
+        entry.version = str(ObjectId())
+        return memory_operation(self.engine, student_id, entry.memory, entry.version)
+
+    def _load(self, student_id: str) -> tuple:
+        """(memory, stored version) of a student"""
+        document = find_one(DKVMN_MEMORY, {'_id': student_id})
+        memory = DKVMNMemory(max(len(self.engine.concepts), 1))
+        if not document:
+            return memory, None
+
+        concept_ids = document.get('concept_ids', [])
+        indices = [self.engine.intern_concept(concept_id) for concept_id in concept_ids]
+        memory.ensure_capacity(len(self.engine.concepts))
+        memory.values[indices] = document.get('mastery', [])
+        memory.known[indices] = True
+        return memory, document.get('version')
@@ -0,0 +1,101 @@
+"""
+AMEP Review Schedule
+Persisted spaced-repetition queue: one document per mastered (student, concept)
+
+REVIEW_SCHEDULE is a priority queue on due_at. The (student_id, due_at)
+index makes "what is due now" a range query for a student or a class
+($in over its students), and the due_at index serves school-wide sweeps.
+Pairs that drop below REVIEW_MASTERY leave the queue; they are back in
+regular practice.
+
+Location: backend/models/review_schedule.py
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+from pymongo import ASCENDING, DeleteOne, UpdateOne
+
+from models.database import REVIEW_SCHEDULE, find_many, bulk_write
+from ai_engine.spaced_repetition import REVIEW_MASTERY, ReviewScheduler
+
+def review_operations(
+    scheduler: ReviewScheduler,
+    pairs: Sequence[tuple],
+    mastery: Sequence[float],
+    last_assessed: Sequence[datetime],
+    previous_mastery: Optional[Sequence[Optional[float]]] = None
+) -> List[Union[UpdateOne, DeleteOne]]:
+    """
+    Queue updates after mastery changes for (student_id, concept_id) pairs
+
+    Mastered pairs are (re)scheduled from their last assessment, others
+    are removed from the queue. With previous_mastery (None = not scored
+    before), only pairs that were mastered can be queued, so the others
+    need no delete.
+    """
+    now = datetime.utcnow()
+    review_mastery = scheduler.review_mastery(mastery).tolist()
+    operations = []
+    if previous_mastery is None:
+        previous_mastery = [REVIEW_MASTERY] * len(pairs)
+    for (student_id, concept_id), score, assessed, due_at, review, previous in zip(
+        pairs, mastery, last_assessed, scheduler.due_times(mastery, last_assessed),
+        review_mastery, previous_mastery
+    ):
+        _id = f"{student_id}_{concept_id}"
+        if due_at is None:
+            if previous is not None and previous >= REVIEW_MASTERY:
+                operations.append(DeleteOne({'_id': _id}))
+            continue
+        operations.append(UpdateOne(
+            {'_id': _id},
+            {'$set': {
+                'student_id': student_id,
+                'concept_id': concept_id,
+                'mastery_score': float(score),
+                'review_mastery': review,
+                'last_assessed': assessed,
+                'due_at': due_at,
+                'updated_at': now
+            }},
+            upsert=True
+        ))
+    return operations
+
+def reschedule(
+    scheduler: ReviewScheduler,
+    student_id: str,
+    concept_id: str,
+    mastery: float,
+    last_assessed: datetime,
+    previous_mastery: Optional[float]
+):
+    """
+    Update one pair's place in the queue after it was scored
+
+    previous_mastery: mastery before this score (None = first score); a
+    pair that was and stays below REVIEW_MASTERY costs no write
+    """
+    bulk_write(REVIEW_SCHEDULE, review_operations(
+        scheduler, [(student_id, concept_id)], [mastery], [last_assessed], [previous_mastery]
+    ))
+
+def due_reviews(
+    student_ids: Iterable[str],
+    now: Optional[datetime] = None
+) -> Dict[str, List[Dict]]:
+    """Queue entries due at `now` per student, earliest first"""
+    student_ids = list(student_ids)
+    due = {student_id: [] for student_id in student_ids}
+    for entry in find_many(
+        REVIEW_SCHEDULE,
+        {
+            'student_id': {'$in': student_ids},
+            'due_at': {'$lte': now or datetime.utcnow()}
+        },
+        {'student_id': 1, 'concept_id': 1, 'mastery_score': 1, 'review_mastery': 1, 'due_at': 1},
+        sort=[('due_at', ASCENDING)]
+    ):
+        due[entry['student_id']].append(entry)
+    return due
@@ -118,7 +118,12 @@ class MasteryCalculationRequest(BaseModel):
     is_correct: bool
     response_time: float = Field(..., gt=0)  # seconds
     current_mastery: float = Field(..., ge=0.0, le=100.0)
-    response_history: List[Dict[str, Any]] = []
+    # Omit to use server-side history for the pair (incremental state,
+    # seeded from the last DKT_SEQUENCE_LENGTH recorded responses)
+    response_history: Optional[List[Dict[str, Any]]] = None
+    # response_id returned by /response/submit for this answer, so a cold
+    # DKT window is not seeded with the response being scored
+    response_id: Optional[str] = None
     related_concepts: List[str] = []
 
 class MasteryCalculationResponse(BaseModel):
@@ -133,6 +138,11 @@ class MasteryCalculationResponse(BaseModel):
     recommendation: str
     timestamp: datetime
 
+class MasteryRecalculationRequest(BaseModel):
+    """BR1: Request to recalculate mastery from the response log"""
+    # Students to recalculate (e.g. a class); omit for all students
+    student_ids: Optional[List[str]] = Field(default=None, min_length=1)
+
 class StudentMasteryResponse(BaseModel):
     """BR1: Student's mastery across all concepts"""
     student_id: str
@@ -144,6 +154,8 @@ class PracticeSessionRequest(BaseModel):
     student_id: str
     session_duration: int = Field(default=30, ge=5, le=180)  # minutes
     subject_area: Optional[str] = None
+    # greedy: ZPD-ranked walk; optimal: knapsack packing of the time budget
+    packing: str = Field(default='greedy', pattern='^(greedy|optimal)$')
 
 class ContentItemResponse(BaseModel):
     """BR2: Practice content item"""
@@ -163,6 +175,20 @@ class PracticeSessionResponse(BaseModel):
     load_status: str
     zpd_alignment: str
 
+class ClassPracticeSessionRequest(BaseModel):
+    """BR2: Request to generate practice sessions for a whole class"""
+    class_id: Optional[str] = None
+    student_ids: List[str] = Field(..., min_length=1, max_length=500)
+    session_duration: int = Field(default=30, ge=5, le=180)  # minutes
+    packing: str = Field(default='greedy', pattern='^(greedy|optimal)$')
+    assigned_by: Optional[str] = None  # teacher_id
+
+class ClassPracticeSessionResponse(BaseModel):
+    """BR2: Practice sessions generated for a class"""
+    class_id: Optional[str] = None
+    sessions: List[PracticeSessionResponse]
+    total_sessions: int
+
 class StudentResponseCreate(BaseModel):
     """Record student response to practice item"""
     student_id: str
@@ -174,6 +200,18 @@ class StudentResponseCreate(BaseModel):
     attempts: int = 1
     response_text: Optional[str] = None
 
+class ResponseScoreRequest(StudentResponseCreate):
+    """BR1, BR2: Record a response and score it in one round trip"""
+    response_time: float = Field(..., gt=0)  # seconds
+    # Defaults to the concept's prerequisites
+    related_concepts: Optional[List[str]] = None
+
+class ResponseScoreResponse(BaseModel):
+    """BR1, BR2: Recorded response, updated mastery and next item"""
+    response_id: str
+    mastery: MasteryCalculationResponse
+    next_item: Optional[ContentItemResponse] = None
+
 # ============================================================================
 # ENGAGEMENT SCHEMAS (BR4, BR6)
 # ============================================================================
@@ -197,12 +235,25 @@ class ExplicitSignalsSchema(BaseModel):
     participation_rate: float = Field(..., ge=0.0, le=1.0)
     quiz_accuracy: float = Field(..., ge=0.0, le=1.0)
 
+class RecentResponseSchema(BaseModel):
+    """BR4: One recent response for disengagement behavior detection"""
+    is_correct: bool
+    response_time: float = Field(default=float('inf'), ge=0)  # seconds; omitted = untimed
+    hints_used: int = Field(default=0, ge=0)
+    attempts: int = Field(default=1, ge=1)
+
 class EngagementAnalysisRequest(BaseModel):
     """BR4: Request to analyze student engagement"""
     student_id: str
-    implicit_signals: ImplicitSignalsSchema
+    class_id: Optional[str] = None  # default: the student's previous class
+    implicit_signals: Optional[ImplicitSignalsSchema] = None  # default: materialized from events
     explicit_signals: ExplicitSignalsSchema
-    recent_responses: List[Dict[str, Any]] = []
+    recent_responses: List[RecentResponseSchema] = []
+
+class EngagementBatchAnalysisRequest(BaseModel):
+    """BR4: Engagement analysis of many students in one pass"""
+    students: List[EngagementAnalysisRequest] = Field(..., min_length=1, max_length=50000)
+    persist_alerts: bool = True
 
 class DisengagementBehavior(BaseModel):
     """BR4: Detected disengagement behavior"""
@@ -221,6 +272,37 @@ class EngagementAnalysisResponse(BaseModel):
     behaviors_detected: int
     recommendations: List[str]
 
+class EngagementBatchAnalysisResponse(BaseModel):
+    """BR4: Per-student analyses, in request order"""
+    results: List[Dict[str, Any]]
+    alerts_created: int  # new alerts (a student already alerted today is updated)
+
+class EngagementEvent(BaseModel):
+    """BR4: One implicit engagement event (click, response, login, ...)"""
+    student_id: str
+    event_type: str = Field(
+        ...,
+        pattern='^(login|logout|click|response|hint|resource_access|time_on_task|task_start|task_complete|discussion_post)$'
+    )
+    timestamp: Optional[datetime] = None  # default (and latest accepted): time received
+    session_id: Optional[str] = None
+    duration: Optional[float] = Field(default=None, ge=0)  # minutes
+    is_correct: Optional[bool] = None
+    response_time: Optional[float] = Field(default=None, ge=0)  # seconds
+    hints_used: Optional[int] = Field(default=None, ge=0)
+    attempts: Optional[int] = Field(default=None, ge=1)
+    resource_id: Optional[str] = None
+    optional: Optional[bool] = None
+
+class EngagementEventBatch(BaseModel):
+    """BR4: Batched engagement events from one client"""
+    events: List[EngagementEvent] = Field(..., min_length=1, max_length=5000)
+
+class EngagementIngestResponse(BaseModel):
+    """BR4: Events queued for ENGAGEMENT_LOGS (dropped = rejected tail)"""
+    accepted: int
+    dropped: int
+
 class ClassEngagementResponse(BaseModel):
     """BR6: Class-level engagement metrics"""
     class_id: str
@@ -229,7 +311,9 @@ class ClassEngagementResponse(BaseModel):
     alert_count: int
     students_needing_attention: List[Dict[str, Any]]
     trend: str
+    class_size: int
     engagement_rate: float
+    updated_at: Optional[datetime] = None
 
 # ============================================================================
 # LIVE POLLING SCHEMAS (BR4)